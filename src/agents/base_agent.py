@@ -1,5 +1,19 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable
+from langchain_core.prompts import ChatPromptTemplate
+from resources.singleflight import SingleFlight
+from resources.profiler import span, run_in_span
+from resources.cancellation import CancellationToken
+
+#identical concurrent LLM calls (same model and rendered prompt) share one generation
+llm_calls = SingleFlight('singleflight.llm')
+
+#conversation context shared by every agent, placed before any role-specific text
+SHARED_CONTEXT_MESSAGE = """Previous conversation:
+{conversation_history}
+===
+
+Current student request: {user_input}"""
 
 """
 abstract base agent class inherited by other agents
@@ -22,22 +36,115 @@ class Agent(ABC):
         """Abstract method, builds agent's prompt from template"""
         pass
 
+    def build_shared_system_message(self) -> str:
+        """Role-independent guidelines that open every agent's prompt for the session's language"""
+        return f"""You are part of an AI tutoring system that teaches {self.language} to students. A tutor answers each student request.
+In multi-agent sessions a {self.language} expert and a teacher then review the tutor's response, and the tutor revises it using their feedback.
+
+GUIDELINES FOR EVERY ROLE:
+- Work in {self.language} ONLY. Do not provide code or concepts from other coding languages.
+- Be technically accurate and follow {self.language} best practices and conventions.
+- Keep the student's learning experience as the goal of every response.
+- Use the previous conversation to understand the student's skill level and what has already been discussed.
+- Keep code in clearly formatted code blocks.
+
+The conversation so far and the student's current request follow. Your role-specific instructions come after them."""
+
+    def build_shared_prompt(self, role_message: str, role_request: str) -> ChatPromptTemplate:
+        """
+        Build a prompt that starts with the text every agent shares.
+
+        The shared guidelines, language, conversation history and student
+        request come first and the role's instructions last, so the prompts
+        of one turn's agents begin with the same tokens and the model server
+        can reuse their prefill from one call to the next.
+
+        Args
+            role_message: the role's system instructions
+            role_request: the role's final request, may use the role's template variables
+
+        Returns
+            ChatPromptTemplate taking conversation_history and user_input plus the role's variables
+        """
+        return ChatPromptTemplate.from_messages([
+            ("system", self.build_shared_system_message()),
+            ("user", SHARED_CONTEXT_MESSAGE),
+            ("system", role_message),
+            ("user", role_request)
+        ])
+
     @abstractmethod
     def get_agent_name(self) -> str:
         """getter method used to return an agent's key for state reference"""
         pass
 
-    def __call__(self, agent_input: Dict[str, Any]) -> Dict[str, Any]:
-        """Call method"""
-        response = self._invoke_llm(agent_input)
+    def __call__(self, agent_input: Dict[str, Any], on_token: Optional[Callable[[str], None]] = None,
+                 cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        """
+        Call method
+
+        Args
+            agent_input: values for the agent's prompt
+            on_token: optional callback receiving the response as it is generated
+            cancel_token: optional token that aborts the generation between chunks
+        """
+        response = self._invoke_llm(agent_input, on_token = on_token, cancel_token = cancel_token)
 
         return {self.get_agent_name(): response}
     
-    def _invoke_llm(self, agent_input: Dict[str, Any]):
+    def select_prompt(self, agent_input: Dict[str, Any]):
+        """Choose the prompt template for this input, agents may override to vary it per turn"""
+        return self.prompt_template
+
+    def _invoke_llm(self, agent_input: Dict[str, Any], on_token: Optional[Callable[[str], None]] = None,
+                    cancel_token: Optional[CancellationToken] = None):
         """Helper method to invoke the LLM with provided input"""
-        #create the agent from the prompt template
-        chain = self.prompt_template | self.llm
+        #render the agent's prompt from the template
+        with span('render_prompt'):
+            prompt = self.select_prompt(agent_input).invoke(agent_input)
+            key = self._llm_call_key(prompt)
+        config = {'metadata': {'agent_name': self.get_agent_name()}}
+
+        #stream when the caller wants tokens or may cancel, so the generation can stop part way
+        if on_token is not None or cancel_token is not None:
+            return run_in_span('llm', self._stream_llm, key, prompt, config, on_token, cancel_token)
+
+        #return the invocation of the agent, shared with any identical call already in flight
+        return run_in_span('llm', llm_calls.do, key, lambda: self.llm.invoke(prompt, config = config))
+
+    def _stream_llm(self, key: tuple, prompt, config: Dict[str, Any], on_token: Optional[Callable[[str], None]],
+                    cancel_token: Optional[CancellationToken]) -> str:
+        """
+        Stream the LLM response chunk by chunk, returning the full text.
+
+        If the token is cancelled or on_token raises, the stream is closed
+        right away, which also ends the request to the model server.
+
+        Raises
+            OperationCancelled: if cancel_token is cancelled before the response is complete
+        """
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+
+        chunks = []
+        stream = llm_calls.stream(key, lambda: self.llm.stream(prompt, config = config),
+                                  cancelled = (lambda: cancel_token.cancelled) if cancel_token is not None else None)
+        try:
+            for chunk in stream:
+                chunks.append(chunk)
+                if on_token is not None:
+                    on_token(chunk)
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+            #a call shared with another turn stops early without an error when cancelled
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+        finally:
+            stream.close()
+        return ''.join(chunks)
 
-        #return the invocation of the agent
-        return chain.invoke(agent_input)
+    def _llm_call_key(self, prompt) -> tuple:
+        """Identify an LLM call by model and rendered prompt"""
+        model = getattr(self.llm, 'model', None) or type(self.llm).__name__
+        return (model, prompt.to_string())
     
\ No newline at end of file
@@ -1,4 +1,3 @@
-from langchain_core.prompts import ChatPromptTemplate
 from agents.base_agent import Agent
 
 class ExpertAgent(Agent):
@@ -17,7 +16,7 @@ PROVIDE FEEDBACK:
 Focus on technical accuracy, completeness, and {language} best practices.
 
 You will receive:
-- user_input: The student's request.
+- The previous conversation and the student's request.
 - tutor_response: The tutor's response to the student.
 
 IMPORTANT GUIDELINES:
@@ -26,13 +25,10 @@ IMPORTANT GUIDELINES:
 - Clarify any misunderstandings by the tutor for corrections when necessary.
 - If the tutor has provided code, ensure that code is well-structured and follows {language} best practices.
 - Keep your tone professional and use concise responses."""
-        return ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            ("user", """Tutor's Response: {tutor_response}
-Student's Request: {user_input}
-             
+        #the student's request is part of the shared context, only the tutor's response follows
+        return self.build_shared_prompt(system_message, """Tutor's Response: {tutor_response}
+
 Provide feedback to the tutor based on the tutor's response to the student's request.""")
-        ])
     
     def get_agent_name(self) -> str:
         return "expert_agent_result"
\ No newline at end of file
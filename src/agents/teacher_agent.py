@@ -1,4 +1,3 @@
-from langchain_core.prompts import ChatPromptTemplate
 from agents.base_agent import Agent
 
 class TeacherAgent(Agent):
@@ -13,7 +12,7 @@ Your role is:
 4. Provide feedback to the tutor based on the student's request and expert feedback to improve the tutor's response.
 
 You will receive:
-- user_input: Student's query.
+- The previous conversation and the student's query.
 - tutor_response: The tutor's response to the student's query.
 - expert_analysis: The technical foundation based on the tutor's response.
 
@@ -31,14 +30,11 @@ IMPORTANT GUIDELINES:
 - The tutor's objective is always to further the understanding and encourage the learning experience of the student.
 - Keep your tone professional and use concise responses."""
 
-        return ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            ("user", """Tutor's response: {tutor_response}
+        #the student's request is part of the shared context, only the other agents' responses follow
+        return self.build_shared_prompt(system_message, """Tutor's response: {tutor_response}
 Expert input: {expert_response}
-Student's Request: {user_input}
 
 Provide feedback to the tutor agent based on how the tutor responded to the student's request, as well as the expert's input.""")
-        ])
     
     def get_agent_name(self) -> str:
         return "teacher_agent_result"
\ No newline at end of file
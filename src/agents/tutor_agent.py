@@ -1,13 +1,42 @@
-from langchain_core.prompts import ChatPromptTemplate
+from typing import Dict, Any, Optional
 from agents.base_agent import Agent
+from resources.intent_router import default_router, INTENTS
 
 class TutorAgent(Agent):
-    def build_prompt(self):
+    def __init__(self, llm, mode_config: Optional[Dict[str, Any]] = None):
+        """Initialize the tutor, preparing the specialized prompts used by adaptive routing"""
+        super().__init__(llm, mode_config)
+
+        #adaptive sessions pick a focused mode prompt per turn with a local classifier
+        self.router = None
+        self.mode_prompts = {}
+        if self.mode_config.get('mode', 'adaptive') == 'adaptive' and self.mode_config.get('intent_routing', True):
+            self.router = default_router
+            self.mode_prompts = {mode: self.build_prompt(mode) for mode in INTENTS}
+
+    def route(self, user_input: str) -> Optional[str]:
+        """Classify a student message for adaptive routing, None when routing is off"""
+        if self.router is None:
+            return None
+        return self.router.route(user_input)
+
+    def select_prompt(self, agent_input: Dict[str, Any]):
+        """Route adaptive turns to the matching specialized prompt, reusing the turn's intent when already routed"""
+        if self.router is None:
+            return self.prompt_template
+
+        mode = agent_input.get('intent') or self.router.route(agent_input.get('user_input', ''))
+        return self.mode_prompts.get(mode, self.prompt_template)
+
+    def build_prompt(self, mode: Optional[str] = None):
         #get user's selected language, defaulting to python
         language = self.mode_config.get('language', 'Python')
 
+        #build the prompt for the session's mode unless another mode is requested
+        mode = mode or self.mode_config.get('mode')
+
         #debug tutoring mode, focused on debugging code snippets and providing feedback
-        if self.mode_config.get('mode') == 'debug':
+        if mode == 'debug':
             system_message = f"""You are a conversational AI {language} tutor capable of debugging {language} code. Your task is to understand the student's
 reasoning, debug provided code, and then provide encouraging feedback that benefits the student's learning experience.
 
@@ -39,7 +68,7 @@ IMPORTANT GUIDELINES:
 - If you are unsure about the student's intent, ask clarifiying questions.
 - Structure your response with clear headings and code blocks for readability."""
         #fundamental tutoring mode, focused on providing fundamental structures
-        elif self.mode_config.get('mode') == 'fundamentals':
+        elif mode == 'fundamentals':
             system_message = f"""You are a conversational AI {language} tutor capable of explaining the fundamentals of {language}. Your task 
 is to explain core {language} concepts clearly and build strong foundational understanding for a student.
 
@@ -76,7 +105,7 @@ IMPORTANT GUIDELINES:
 - Keep your tone patient and encouraging of the student's learning experience."""
 
         #examples tutoring mode, geared towards generating examples for a student to learn from
-        elif self.mode_config.get('mode') == 'examples':
+        elif mode == 'examples':
             system_message = f"""You are a conversational AI {language} tutor specializing in providing practical, well-explained {language} code examples.
 Your role is to demonstrate concepts through clear, executable, well-structured code that students can learn from and adapt.
 
@@ -117,7 +146,7 @@ IMPORTANT GUIDELINES:
 - Keep your tone patient and encouraging of the student's learning experience."""
 
         #exercise tutoring mode, best for creating exercises for a student to test/practice their knowledge
-        elif self.mode_config.get('mode') == 'exercise': 
+        elif mode == 'exercises':
             system_message = f"""You are a conversational AI {language} tutor specializing in creating meaningful practice exercises
 in {language}. Your focus is in generating appropriate challenges that reinforce a student's learning and build skills progressively.
 
@@ -169,7 +198,7 @@ IMPORTANT GUIDELINES:
 - Keep your tone patient, encouraging, and motivating."""
 
         #feedback mode, best for reviewing understanding to improve learning
-        elif self.mode_config.get('mode') == 'feedback':
+        elif mode == 'feedback':
             system_message = f"""You are a conversational AI {language} tutor. Your role is to provide thoughtful, balanced feedback
 to a student's understanding to promote learning and improvement.
 
@@ -246,15 +275,9 @@ IMPORTANT GUIDELINES:
 - Keep your tone patient, encouraging, and motivating."""
 
 
-        return ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            ("user", """Previous conversation: 
-{conversation_history}
-===             
-
-Current student request: {user_input}
-             
-Provide a helpful, direct response to the student's request. If the student refers to something previously discussed, build on that conversation""")])
+        #the mode's instructions go after the context shared with the other agents
+        return self.build_shared_prompt(system_message,
+            "Provide a helpful, direct response to the student's request. If the student refers to something previously discussed, build on that conversation")
     
     def get_agent_name(self) -> str:
         return "tutor_agent_result"
\ No newline at end of file
@@ -1,21 +1,118 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, send_file, make_response, Response, stream_with_context
 import os
 import json
-from datetime import datetime
+import time
 import secrets
+import tempfile
+import threading
+import functools
+from collections import OrderedDict
+from datetime import timedelta
 
 from langchain_community.llms import Ollama
 
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    #the WebSocket transport is optional, the REST routes work without it
+    Sock = None
+
+from orchestrations.factory import build_orchestration
 from orchestrations.single_orchestration import SingleOrchestration
-from orchestrations.multi_orchestration import MultiOrchestration
 from resources.parser import Parser
+from resources.cassette import Cassette, RecordingLLM, ReplayLLM
+from resources.exercise_bank import ExerciseBank
+from resources.batch_jobs import BatchJobManager
+from resources.metrics import metrics
+from resources.intent_router import default_router
+from resources.profiler import RequestProfiler, span
+from resources.vector_index import ConversationVectorIndex, select_history
+from resources.search_index import SearchIndex
+from resources.archive import ConversationArchive, TieredConversationStore
+from resources.export import export_conversations, to_ndjson
+from resources.turn_queue import TurnQueue
+from resources.cancellation import CancellationRegistry, OperationCancelled
+from resources.conversation_store import ConversationStore, SQLiteConversationStore, generate_conversation_id, is_valid_conversation_id
 
 #configurations
+CONVERSATIONS_DIR = os.environ.get('DDT_CONVERSATIONS_DIR', 'conversations')
+STORE_BACKEND = os.environ.get('DDT_STORE_BACKEND', 'sqlite') #"sqlite" or "json"
+os.makedirs(CONVERSATIONS_DIR, exist_ok = True)
+
+def load_secret_key():
+    """
+    Get the session signing key shared by every worker process.
+
+    Uses DDT_SECRET_KEY when set, otherwise a key persisted next to the
+    conversations so that all workers on this node sign cookies identically.
+    """
+    if os.environ.get('DDT_SECRET_KEY'):
+        return os.environ['DDT_SECRET_KEY']
+
+    key_path = os.path.join(CONVERSATIONS_DIR, '.secret_key')
+    if not os.path.exists(key_path):
+        #write the key under a temporary name first, so no worker ever reads a partly written key
+        fd, temp_path = tempfile.mkstemp(dir = CONVERSATIONS_DIR, prefix = '.secret_key.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(secrets.token_hex(16))
+            #only the first worker to link its key into place wins
+            os.link(temp_path, key_path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+
+    with open(key_path, 'r') as f:
+        return f.read().strip()
+
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)
+app.secret_key = load_secret_key()
+
+#shared conversation persistence, safe across threads and processes
+store = ConversationStore.from_config({
+    'backend': STORE_BACKEND,
+    'directory': CONVERSATIONS_DIR
+})
+
+#bring conversations saved by older versions into the database
+if isinstance(store, SQLiteConversationStore):
+    store.import_json_directory(CONVERSATIONS_DIR)
+
+#conversations idle for longer than this are compacted into compressed archive segments
+ARCHIVE_IDLE_DAYS = float(os.environ.get('DDT_ARCHIVE_IDLE_DAYS', '30'))
+ARCHIVE_INTERVAL = float(os.environ.get('DDT_ARCHIVE_INTERVAL', '3600')) #seconds between compactions, 0 disables
+archive = ConversationArchive(os.path.join(CONVERSATIONS_DIR, 'archive'))
+store = TieredConversationStore(store, archive)
+
+#per-conversation embeddings of past messages, kept up to date as messages are appended
+vector_index = ConversationVectorIndex(os.path.join(CONVERSATIONS_DIR, 'vectors'))
+store.add_listener(vector_index.add_messages)
+
+#full-text index over every message, fed by the same appends
+SEARCH_INDEX_PATH = os.path.join(CONVERSATIONS_DIR, 'search.db')
+search_index_created = not os.path.exists(SEARCH_INDEX_PATH)
+search_index = SearchIndex(SEARCH_INDEX_PATH)
+store.add_listener(search_index.add_messages)
+
+#index conversations saved before search existed without delaying startup
+if search_index_created:
+    threading.Thread(target = search_index.rebuild, args = (store,), daemon = True).start()
+
+def compact_conversations():
+    """Periodically move idle conversations to the archive"""
+    while True:
+        time.sleep(ARCHIVE_INTERVAL)
+        try:
+            archived = store.compact(timedelta(days = ARCHIVE_IDLE_DAYS), on_archived = vector_index.delete)
+            if archived:
+                print(f"Archived {len(archived)} idle conversations")
+        except Exception as e:
+            print(f"Error compacting conversations: {e}")
 
-CONVERSATIONS_DIR = 'conversations'
-os.makedirs(CONVERSATIONS_DIR, exist_ok = True)
+if ARCHIVE_INTERVAL > 0:
+    threading.Thread(target = compact_conversations, daemon = True).start()
 
 #User options
 LANGUAGES = ["Python", "Java", "C++", "Go", "C"]
@@ -29,92 +126,241 @@ MODES = {
     "feedback": "Feedback (Review your code)"
 }
 
+#number of results returned per page of a search
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+#number of messages returned per page when loading a conversation
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+
 #Configuration for Ollama
 OLLAMA_MODEL = "llama3.2:3b"
-OLLAMA_BASE_URL = "http://localhost:11434"
+OLLAMA_BASE_URL = os.environ.get("DDT_OLLAMA_BASE_URL", "http://localhost:11434")
+
+#record every LLM call into a cassette, or replay one instead of calling Ollama
+CASSETTE_RECORD_PATH = os.environ.get('DDT_CASSETTE_RECORD')
+CASSETTE_REPLAY_PATH = os.environ.get('DDT_CASSETTE_REPLAY')
+CASSETTE_LATENCY_SCALE = float(os.environ.get('DDT_CASSETTE_LATENCY_SCALE', '1.0'))
+recording_cassette = Cassette(CASSETTE_RECORD_PATH) if CASSETTE_RECORD_PATH else None
 
 #global parser instance
 parser = Parser()
 
-#store orchestrators per session
-orchestrators = {}
+#adaptive mode routes each turn to a specialized prompt, using a trained model when one exists
+INTENT_ROUTER_MODEL = os.environ.get('DDT_INTENT_ROUTER_MODEL', os.path.join(CONVERSATIONS_DIR, 'intent_router.npz'))
+if os.path.exists(INTENT_ROUTER_MODEL):
+    default_router.load(INTENT_ROUTER_MODEL)
+
+#opt-in request profiling: send "X-DDT-Profile: 1" or set a sampling rate
+request_profiler = RequestProfiler(
+    os.environ.get('DDT_PROFILE_DIR', 'profiles'),
+    sample_rate=float(os.environ.get('DDT_PROFILE_SAMPLE_RATE', '0')),
+    max_profiles=int(os.environ.get('DDT_PROFILE_MAX', '100'))
+)
+
+def profiled(route):
+    """Decorator profiling a route when the request asks for it or is sampled"""
+    @functools.wraps(route)
+    def wrapper(*args, **kwargs):
+        with request_profiler.profile(route.__name__, request_profiler.should_profile(request.headers)) as profile:
+            response = make_response(route(*args, **kwargs))
+
+        #tell the client which profile file belongs to its request
+        if profile is not None:
+            response.headers['X-DDT-Profile-Id'] = profile.profile_id
+        return response
+    return wrapper
+
+#process-local cache of orchestrators, rebuilt from the stored config on a miss
+ORCHESTRATOR_CACHE_SIZE = 256
+orchestrators = OrderedDict()
+orchestrators_lock = threading.Lock()
 
 def get_llm():
     """Initialize and return the Ollama LLM instance"""
-    return Ollama(
+    if CASSETTE_REPLAY_PATH:
+        return ReplayLLM(cassette_path=CASSETTE_REPLAY_PATH, latency_scale=CASSETTE_LATENCY_SCALE)
+
+    llm = Ollama(
         model=OLLAMA_MODEL,
         base_url=OLLAMA_BASE_URL,
         temperature=0.7
     )
 
+    if recording_cassette:
+        return RecordingLLM(llm=llm, cassette=recording_cassette)
+
+    return llm
+
+#interactive turns that call the LLM wait in line for one of a limited number of slots per worker
+turn_queue = TurnQueue(int(os.environ.get('DDT_MAX_CONCURRENT_TURNS', '4')))
+
+#pre-generated exercises for exercises mode, refilled in the background when low
+#refills take the same slots as live turns, so they never add to the load on Ollama
+exercise_bank = ExerciseBank(os.path.join(CONVERSATIONS_DIR, 'exercise_bank.db'), llm_factory=get_llm,
+                             llm_slot=turn_queue.slot)
+
+#bulk jobs (e.g. grading a class's submissions) share a worker pool and a cap on concurrent LLM calls
+BATCH_JOBS_DIR = os.environ.get('DDT_BATCH_JOBS_DIR', 'batch_jobs')
+batch_jobs = BatchJobManager(
+    BATCH_JOBS_DIR,
+    orchestration_factory=lambda config: build_orchestration(get_llm(), config),
+    max_workers=int(os.environ.get('DDT_BATCH_WORKERS', '8')),
+    llm_concurrency=int(os.environ.get('DDT_BATCH_LLM_CONCURRENCY', '2'))
+)
+
+#continue jobs interrupted by a restart
+batch_jobs.resume_interrupted()
+
+#running turns per conversation, so students leaving or starting over stop their pending answers
+cancellations = CancellationRegistry(os.path.join(CONVERSATIONS_DIR, 'cancellations'))
+
 def create_orchestrator(config, session_id):
     """Create the desired orchestration based on user configuration"""
     #Initialize LLM
     llm = get_llm()
     
-    #initialize the mode configuration
-    mode_config = {
-        'language': config.get('language', 'Python'),
-        'mode': config.get('mode', 'adaptive')
-    }
-
-    log_config = {
-        'log_config': {
-            'enabled': False  #set to true to debug
-        }
-    }
-    
     #create orchestrator based on user selection
-    orchestration_type = config.get('orchestration_type', 'single')
+    orchestrator = build_orchestration(llm, config, log_enabled=False) #set to true to debug
     
-    if orchestration_type == 'multi-agent':
-        orchestrator = MultiOrchestration(
-            llm=llm,
-            mode_config=mode_config,
-            log_config=log_config,
-            revision_enabled=True  #enable tutor revision: tutor considers other agent input during multi-agent orchestration
-        )
-    else:
-        orchestrator = SingleOrchestration(
-            llm=llm,
-            mode_config=mode_config,
-            log_config=log_config
-        )
-    
-    #store the orchestrator for this session
-    orchestrators[session_id] = orchestrator
+    #cache the orchestrator for this session, evicting the least recently used
+    with orchestrators_lock:
+        orchestrators[session_id] = orchestrator
+        orchestrators.move_to_end(session_id)
+        while len(orchestrators) > ORCHESTRATOR_CACHE_SIZE:
+            orchestrators.popitem(last = False)
     
     return orchestrator
 
 def get_orchestrator(session_id):
-    """Retrieve existing orchestrator for a session"""
-    return orchestrators.get(session_id)
+    """
+    Retrieve the orchestrator for a session.
+
+    The cache is only an optimization: on a miss (another worker created the
+    session, or this process restarted) the orchestrator is rebuilt from the
+    config persisted with the conversation.
+
+    Returns
+        Orchestrator, or None if the conversation does not exist
+    """
+    with orchestrators_lock:
+        orchestrator = orchestrators.get(session_id)
+        if orchestrator is not None:
+            orchestrators.move_to_end(session_id)
+            return orchestrator
+
+    config = store.get_config(session_id)
+    if config is None:
+        return None
+
+    return create_orchestrator(config, session_id)
 
 def format_conversation_history(messages):
+    """Format conversation history for the LLM context"""
+    return parser.format_conversation_history(messages)
+
+def build_conversation_history(conversation_id, user_message, current_seq):
     """
-    Format conversation history for the LLM context
-    
-    Args:
-        messages: List of message dicts with 'role' and 'content'
-        
-    Returns:
-        Formatted string with conversation history
+    Select the history sent to the agent for a new message.
+
+    Args
+        conversation_id: conversation the message belongs to
+        user_message: the student's new message, used to find relevant older turns
+        current_seq: sequence number of the new message, which is left out
+
+    Returns
+        Latest messages plus the older messages most similar to the new one, in order
+    """
+    return select_history(store, vector_index, conversation_id, user_message, current_seq)
+
+def run_chat_turn(conversation_id, orchestrator, user_message, on_event=None, cancel_token=None):
     """
-    if not messages:
-        return ""
+    Answer one student message, saving both sides of the turn.
+
+    Shared by the REST and WebSocket transports.
+
+    Args
+        conversation_id: conversation the message belongs to
+        orchestrator: the conversation's orchestration
+        user_message: the student's message
+        on_event: optional callback receiving 'queued', 'stage' and 'token' events
+        cancel_token: stops the turn, waiting or generating, when cancelled
+
+    Returns
+        The tutor's response
+
+    Raises
+        OperationCancelled: if the turn is cancelled before the response is complete
+    """
+    #add a new user message
+    user_entry = {
+        'role': 'user',
+        'content': user_message
+    }
     
-    #format the conversation history for agent consumption
-    history_parts = []
-    for msg in messages:
-        role = msg.get('role', 'unknown')
-        content = msg.get('content', '')
+    #save after adding user message to prevent loss of progress
+    with span('persist'):
+        saved = append_messages(conversation_id, [user_entry])
+
+    #get the recent and relevant conversation history (excluding the current message) for the agent
+    with span('history'):
+        try:
+            history = build_conversation_history(conversation_id, user_message, saved['start_seq'])
+        except Exception as e:
+            print(f"Error loading conversation history: {e}")
+            history = []
+    conversation_context = format_conversation_history(history)
+    result_state = {}
+
+    try:
+        #build state with user message and conversation history
+        state = {
+            'user_input': user_message,
+            'conversation_history': conversation_context
+        }
         
-        if role == 'user':
-            history_parts.append(f"Student: {content}")
-        elif role == 'tutor':
-            history_parts.append(f"Tutor: {content}")
-    
-    return "\n\n".join(history_parts)
+        #serve plain exercise requests from the pre-generated bank, novel ones fall through;
+        #multi-agent sessions always get their exercises reviewed by the other agents
+        llm_response = None
+        if orchestrator.mode_config.get('mode') == 'exercises' and isinstance(orchestrator, SingleOrchestration):
+            llm_response = exercise_bank.serve(orchestrator.mode_config.get('language', 'Python'), user_message)
+
+        if llm_response is None:
+            #wait for a free slot, then execute the selected orchestration
+            on_position = (lambda position: on_event({'type': 'queued', 'position': position})) if on_event else None
+            with turn_queue.slot(on_position=on_position, cancel_token=cancel_token):
+                with span('run_workflow'):
+                    result_state = orchestrator.run_workflow(user_message, context=conversation_context,
+                                                             on_event=on_event, cancel_token=cancel_token)
+            
+            #Parse final answer
+            with span('parse'):
+                llm_response = parser.extract_final_response(result_state)
+        
+    except OperationCancelled:
+        #the student stopped the turn, nothing is saved for it
+        raise
+    except Exception as e:
+        #handle errors during agent interaction
+        llm_response = f"I apologize, but I encountered an error processing your request: {str(e)}"
+        print(f"Error in workflow: {str(e)}")
+
+    #add LLM response to messages
+    tutor_entry = {
+        'role': 'tutor',
+        'content': llm_response
+    }
+
+    #keep how long each agent stage took with the turn, for analytics exports
+    if result_state.get('stage_timings'):
+        tutor_entry['stage_timings'] = result_state['stage_timings']
+
+    #save conversation session
+    with span('persist'):
+        append_messages(conversation_id, [tutor_entry])
+
+    return llm_response
 
 @app.route('/')
 def index():
@@ -127,19 +373,18 @@ def index():
 @app.route('/chat')
 def chat():
     """Chat webpage"""
-    if 'config' not in session:
+    conversation_id = session.get('conversation_id')
+    config = store.get_config(conversation_id) if conversation_id else None
+
+    if config is None:
         return render_template('index.html',
                            languages = LANGUAGES,
                            orchestrations = ORCHESTRATIONS,
                            modes = MODES)
-    
-    config = session['config']
-    conversation_id = session.get('conversation_id')
 
-    #load messages if the user is returning
-    messages = []
-    if conversation_id:
-        messages = load_conversation(conversation_id)
+    #load the most recent messages if the user is returning, older pages are fetched on scroll
+    page = store.load_messages(conversation_id, MESSAGE_PAGE_SIZE)
+    messages = page['messages'] if page else []
 
     return render_template('chat.html', 
                         config=config,
@@ -158,13 +403,16 @@ def configure():
         'mode': data.get('mode', 'adaptive')
     }
 
-    #create a new conversation id for user
-    conversation_id = datetime.now().strftime("%Y%m%d_%H%M")
+    #nobody will read answers still being generated for the previous session
+    previous_id = session.get('conversation_id')
+    if previous_id and is_valid_conversation_id(previous_id):
+        cancellations.cancel(previous_id, 'new session started')
+
+    #create a new sortable, unique conversation id for user
+    conversation_id = generate_conversation_id()
 
-    #store session information
-    session['config'] = config
+    #the session only points at the conversation, all state lives in the store
     session['conversation_id'] = conversation_id
-    session['messages'] = []
 
     #create orchestrator for the current session
     try:
@@ -181,15 +429,12 @@ def configure():
     return jsonify({'success': True, 'conversation_id': conversation_id})
 
 @app.route('/api/send_message', methods = ['POST'])
+@profiled
 def send_message():
     """User sends a message and receives a response"""
     data = request.json
     user_message = data.get('message', '')
 
-    #ensure messages field exists in session
-    if 'messages' not in session:
-        session['messages'] = []
-    
     #get conversation ID
     conversation_id = session.get('conversation_id')
     if not conversation_id:
@@ -198,88 +443,145 @@ def send_message():
             'error': 'No active conversation. Please start a new session.'
         }), 400
 
-    #add a new user message
-    session['messages'].append({
-        'role': 'user',
-        'content': user_message
-    })
-    
-    #save after adding user message to prevent loss of progress
-    save_conversation(conversation_id, session['messages'], session['config'])
+    #get orchestration type for this session, rebuilding it from the stored config if needed
+    try:
+        orchestrator = get_orchestrator(conversation_id)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to get orchestrator: {str(e)}'
+        }), 500
 
-    #get orchestration type for this session
-    orchestrator = get_orchestrator(conversation_id)
-    
     if not orchestrator:
-        #attempt to create orchestrator if it is not found
-        config = session.get('config', {})
+        return jsonify({
+            'success': False,
+            'error': 'Conversation not found. Please start a new session.'
+        }), 404
+
+    #the turn stops early if the student cancels, leaves the page or starts a new session
+    with cancellations.track(conversation_id) as cancel_token:
         try:
-            orchestrator = create_orchestrator(config, conversation_id)
-        except Exception as e:
+            llm_response = run_chat_turn(conversation_id, orchestrator, user_message, cancel_token=cancel_token)
+        except OperationCancelled:
             return jsonify({
                 'success': False,
-                'error': f'Failed to get orchestrator: {str(e)}'
-            }), 500
-
-    #get conversation history (excluding the current message) for the agent
-    history = session['messages'][:-1]
-    conversation_context = format_conversation_history(history)
-
-    try:
-        #build state with user message and conversation history
-        state = {
-            'user_input': user_message,
-            'conversation_history': conversation_context
-        }
-        
-        #execute the selected orchestration
-        result_state = orchestrator.run_workflow(user_message, context=conversation_context)
-        
-        #Parse final answer
-        llm_response = parser.extract_final_response(result_state)
-        
-    except Exception as e:
-        #handle errors during agent interaction
-        llm_response = f"I apologize, but I encountered an error processing your request: {str(e)}"
-        print(f"Error in workflow: {str(e)}")
-
-    #add LLM response to messages
-    session['messages'].append({
-        'role': 'tutor',
-        'content': llm_response
-    })
-
-    #save conversation session
-    save_conversation(session['conversation_id'], session['messages'], session['config'])
+                'cancelled': True,
+                'error': 'The response was cancelled.'
+            }), 409
 
     return jsonify({
         'success': True,
         'response': llm_response
     })
 
+@app.route('/api/cancel', methods = ['POST'])
+def cancel_message():
+    """Stop the answer being generated for the session's conversation, e.g. when the page is closed"""
+    conversation_id = session.get('conversation_id')
+    if not conversation_id or not is_valid_conversation_id(conversation_id):
+        return jsonify({'success': False, 'error': 'No active conversation.'}), 400
+
+    cancellations.cancel(conversation_id, 'cancelled by the student')
+    metrics.increment('cancellation.requests')
+    return jsonify({'success': True})
+
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/ws/chat')
+    def chat_socket(ws):
+        """
+        Persistent chat connection for the session's current conversation.
+
+        The client sends {"type": "send", "message": ...} and {"type": "cancel"}.
+        The server pushes "queued" (position in line), "stage", "token" (tutor
+        text as it is generated; a revision stage starts the answer over),
+        "done" (the final response), "cancelled" and "error" events.
+        """
+        conversation_id = session.get('conversation_id')
+        send_lock = threading.Lock()
+        turn = {'running': False, 'token': None}
+
+        def push(event):
+            with send_lock:
+                ws.send(json.dumps(event))
+
+        def push_final(event):
+            #the client may already be gone when a turn ends
+            try:
+                push(event)
+            except ConnectionClosed:
+                pass
+
+        def run_turn(orchestrator, user_message, cancel_token):
+            def on_event(event):
+                try:
+                    push(event)
+                except ConnectionClosed:
+                    cancel_token.cancel('connection closed')
+
+            try:
+                with cancellations.track(conversation_id, cancel_token):
+                    response = run_chat_turn(conversation_id, orchestrator, user_message,
+                                             on_event=on_event, cancel_token=cancel_token)
+                final = {'type': 'done', 'response': response}
+            except OperationCancelled:
+                metrics.increment('websocket.cancelled_turns')
+                final = {'type': 'cancelled'}
+            except Exception as e:
+                print(f"Error in WebSocket turn: {e}")
+                final = {'type': 'error', 'error': str(e)}
+
+            #the client may send its next message as soon as it sees the final event
+            turn['running'] = False
+            push_final(final)
+
+        if not conversation_id:
+            push({'type': 'error', 'error': 'No active conversation. Please start a new session.'})
+            return
+
+        metrics.increment('websocket.connections')
+        try:
+            while True:
+                try:
+                    data = json.loads(ws.receive())
+                except ValueError:
+                    push({'type': 'error', 'error': 'Messages must be JSON'})
+                    continue
+                if data.get('type') == 'cancel':
+                    if turn['running']:
+                        turn['token'].cancel('cancelled by the student')
+                elif data.get('type') == 'send':
+                    if turn['running']:
+                        push({'type': 'error', 'error': 'A response is already being generated'})
+                        continue
+
+                    try:
+                        orchestrator = get_orchestrator(conversation_id)
+                    except Exception as e:
+                        push({'type': 'error', 'error': f'Failed to get orchestrator: {str(e)}'})
+                        continue
+                    if not orchestrator:
+                        push({'type': 'error', 'error': 'Conversation not found. Please start a new session.'})
+                        continue
+
+                    turn['token'] = cancellations.token(conversation_id)
+                    turn['running'] = True
+                    threading.Thread(
+                        target=run_turn, args=(orchestrator, data.get('message', ''), turn['token']), daemon=True).start()
+        except ConnectionClosed:
+            pass
+        finally:
+            #a closed tab should not keep the model busy
+            if turn['token'] is not None:
+                turn['token'].cancel('connection closed')
+
 @app.route('/api/conversations')
 def list_conversations():
     """Get list of all conversations for user"""
-    conversations = []
+    #retrieve any conversations from the store
+    conversations = store.list_conversations()
 
-    #retrieve any conversations from conversations dir
-    for filename in os.listdir(CONVERSATIONS_DIR):
-        if filename.endswith('.json'):
-            filepath = os.path.join(CONVERSATIONS_DIR, filename)
-            #open previous conversation
-            try:
-                with open(filepath, 'r') as f:
-                    #load previous conversation and append to conversation data
-                    data = json.load(f)
-                    conversations.append({
-                        'id': data['id'],
-                        'config': data['config'],
-                        'message_count': len(data['messages']),
-                        'update_time': data.get('update_time', '')
-                    })
-            except Exception as e:
-                print(f"Error loading conversation {filename}: {e}")
-                continue
     #sort conversations by most recent update time
     conversations.sort(key = lambda x: x['update_time'], reverse = True)
 
@@ -288,63 +590,213 @@ def list_conversations():
 @app.route('/api/load_conversation/<conversation_id>')
 def load_conversation_route(conversation_id):
     """Load a selected conversation for a user"""
-    filepath = os.path.join(CONVERSATIONS_DIR, f"{conversation_id}.json")
+    #reject ids that cannot name a stored conversation
+    if not is_valid_conversation_id(conversation_id):
+        return jsonify({'success': False, 'error': 'Conversation not found'}), 404
 
-    #ensure that the file exists
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, 'r') as f:
-                data = json.load(f)
-            
-            session['conversation_id'] = conversation_id
-            session['config'] = data['config']
-            session['messages'] = data['messages']
-            
-            #recreate the selected orchestration for the user
-            try:
-                create_orchestrator(data['config'], conversation_id)
-            except Exception as e:
-                print(f"Warning: Could not recreate orchestrator: {str(e)}")
+    #ensure that the conversation exists, reading only its most recent page of messages
+    try:
+        config = store.get_config(conversation_id)
+        page = store.load_messages(conversation_id, get_page_limit()) if config is not None else None
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error loading conversation: {str(e)}'}), 500
+
+    if page:
+        session['conversation_id'] = conversation_id
 
-            return jsonify({'success': True, 'data': data})
+        #recreate the selected orchestration for the user
+        try:
+            get_orchestrator(conversation_id)
         except Exception as e:
-            return jsonify({'success': False, 'error': f'Error loading conversation: {str(e)}'}), 500
+            print(f"Warning: Could not recreate orchestrator: {str(e)}")
+
+        data = {
+            'id': conversation_id,
+            'config': config,
+            'messages': page['messages'],
+            'message_count': page['message_count'],
+            'next_cursor': page['next_cursor']
+        }
+        return jsonify({'success': True, 'data': data})
     
-    #return an error if filepath not found
+    #return an error if the conversation is not found
     return jsonify({'success': False, 'error': 'Conversation not found'}), 404
 
-def save_conversation(conversation_id, messages, config):
-    """Helper method to save conversation to a file"""
-    filepath = os.path.join(CONVERSATIONS_DIR, f"{conversation_id}.json")
-
-    data = {
-        'id': conversation_id,
-        'messages': messages,
-        'config': config,
-        'update_time': datetime.now().isoformat()
+@app.route('/api/load_conversation/<conversation_id>/messages')
+def load_messages_route(conversation_id):
+    """Load an older page of messages, ending before the 'before' cursor"""
+    if not is_valid_conversation_id(conversation_id):
+        return jsonify({'success': False, 'error': 'Conversation not found'}), 404
+
+    before = request.args.get('before', type = int)
+
+    try:
+        page = store.load_messages(conversation_id, get_page_limit(), before = before)
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error loading messages: {str(e)}'}), 500
+
+    if page is None:
+        return jsonify({'success': False, 'error': 'Conversation not found'}), 404
+
+    return jsonify({'success': True, 'data': page})
+
+def get_page_limit():
+    """Read the requested page size from the query string, within allowed bounds"""
+    limit = request.args.get('limit', MESSAGE_PAGE_SIZE, type = int)
+    return max(1, min(limit, MAX_MESSAGE_PAGE_SIZE))
+
+@app.route('/api/search')
+def search_messages():
+    """Search every conversation's messages, optionally filtered by language, mode, orchestration or role"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'error': 'No search query provided'}), 400
+
+    limit = max(1, min(request.args.get('limit', SEARCH_PAGE_SIZE, type = int), MAX_SEARCH_PAGE_SIZE))
+    offset = max(0, request.args.get('offset', 0, type = int))
+    filters = {name: request.args.get(name) for name in ('language', 'mode', 'orchestration', 'role')}
+
+    try:
+        data = search_index.search(query, filters, limit = limit, offset = offset)
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error searching conversations: {str(e)}'}), 500
+
+    return jsonify({'success': True, 'data': data})
+
+@app.route('/api/export')
+def export_route():
+    """
+    Stream stored conversations as NDJSON, one conversation per line.
+
+    Filters on 'since'/'until' (ISO dates), 'language', 'mode' and 'orchestration'.
+    Resume an interrupted export by passing the id of the last line received as 'after'.
+    """
+    filters = {name: request.args.get(name) for name in ('since', 'until', 'language', 'mode', 'orchestration')}
+    after = request.args.get('after')
+    limit = request.args.get('limit', type = int)
+
+    if after is not None and not is_valid_conversation_id(after):
+        return jsonify({'success': False, 'error': 'Invalid export cursor'}), 400
+
+    records = export_conversations(store, filters, after = after, limit = limit)
+    return Response(stream_with_context(to_ndjson(records)), mimetype = 'application/x-ndjson')
+
+@app.route('/api/archive/stats')
+def get_archive_stats():
+    """Get the number of archived conversations and the space saved by compressing them"""
+    try:
+        return jsonify({'success': True, 'data': archive.stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error reading archive stats: {str(e)}'}), 500
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Get this worker's counters and timings"""
+    return jsonify(metrics.snapshot())
+
+@app.route('/api/batch_jobs', methods = ['POST'])
+def create_batch_job():
+    """Start a batch job running many code submissions through one configuration"""
+    data = request.json or {}
+    submissions = data.get('submissions', [])
+
+    if not isinstance(submissions, list) or not submissions:
+        return jsonify({'success': False, 'error': 'No submissions provided'}), 400
+
+    #create config: Defaults = Python, single, feedback mode
+    config = {
+        'language': data.get('language', 'Python'),
+        'orchestration_type': data.get('orchestration_type', 'single'),
+        'mode': data.get('mode', 'feedback'),
+        'instructions': data.get('instructions', '')
     }
 
-    #dump conversation data into defined file
     try:
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        job_id = batch_jobs.create_job(config, submissions)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Failed to start batch job: {str(e)}'}), 500
+
+    return jsonify({'success': True, 'job_id': job_id})
+
+@app.route('/api/batch_jobs')
+def list_batch_jobs():
+    """Get list of all batch jobs"""
+    return jsonify(batch_jobs.list_jobs())
+
+@app.route('/api/batch_jobs/<job_id>')
+def get_batch_job(job_id):
+    """Get the progress of a batch job"""
+    if not is_valid_conversation_id(job_id):
+        return jsonify({'success': False, 'error': 'Batch job not found'}), 404
+
+    job = batch_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Batch job not found'}), 404
+
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/api/batch_jobs/<job_id>/results')
+def get_batch_job_results(job_id):
+    """Download the JSONL results written so far"""
+    if not is_valid_conversation_id(job_id) or batch_jobs.get_job(job_id) is None:
+        return jsonify({'success': False, 'error': 'Batch job not found'}), 404
+
+    path = os.path.abspath(batch_jobs.results_path(job_id))
+    if not os.path.exists(path):
+        return app.response_class('', mimetype = 'application/x-ndjson')
+
+    return send_file(path, mimetype = 'application/x-ndjson')
+
+@app.route('/api/batch_jobs/<job_id>/cancel', methods = ['POST'])
+def cancel_batch_job(job_id):
+    """Stop a batch job, keeping the results written so far"""
+    if not is_valid_conversation_id(job_id) or not batch_jobs.cancel(job_id):
+        return jsonify({'success': False, 'error': 'Batch job not found'}), 404
+
+    return jsonify({'success': True})
+
+@app.route('/api/batch_jobs/<job_id>/resume', methods = ['POST'])
+def resume_batch_job(job_id):
+    """Continue a cancelled or interrupted batch job from its last result"""
+    if not is_valid_conversation_id(job_id) or batch_jobs.get_job(job_id) is None:
+        return jsonify({'success': False, 'error': 'Batch job not found'}), 404
+
+    try:
+        started = batch_jobs.resume(job_id)
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Failed to resume batch job: {str(e)}'}), 500
+
+    if not started:
+        return jsonify({'success': False, 'error': 'Batch job is already running'}), 409
+
+    return jsonify({'success': True})
+
+def save_conversation(conversation_id, messages, config):
+    """Helper method to save conversation to the store"""
+    try:
+        store.save(conversation_id, messages, config)
     except Exception as e:
         print(f"Error saving conversation: {e}")
 
+def append_messages(conversation_id, messages):
+    """Helper method to append messages to a stored conversation under its lock"""
+    try:
+        return store.append_messages(conversation_id, messages)
+    except Exception as e:
+        print(f"Error saving conversation: {e}")
+        return {'start_seq': len(load_conversation(conversation_id))}
+
 def load_conversation(conversation_id):
-    """Load conversation from file"""
-    filepath = os.path.join(CONVERSATIONS_DIR, f"{conversation_id}.json")
-    
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, 'r') as f:
-                data = json.load(f)
-                return data.get('messages', [])
-        except Exception as e:
-            print(f"Error loading conversation messages: {e}")
-            return []
-    
-    return []
+    """Load conversation from the store"""
+    try:
+        data = store.load(conversation_id)
+    except Exception as e:
+        print(f"Error loading conversation messages: {e}")
+        return []
+
+    return data.get('messages', []) if data else []
 
 if __name__ == '__main__':
     app.run(debug = False, port = 5000)
\ No newline at end of file
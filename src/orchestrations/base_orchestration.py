@@ -1,7 +1,11 @@
-from typing import Dict, Any, Union, Optional, Tuple
+import time
+from typing import Dict, Any, Union, Optional, Tuple, Callable, List
 from abc import ABC, abstractmethod
 from resources.logger import Logger
 from resources.parser import Parser
+from resources.profiler import run_in_span
+from resources.metrics import metrics
+from resources.cancellation import CancellationToken, OperationCancelled
 
 from agents.expert_agent import ExpertAgent
 from agents.teacher_agent import TeacherAgent
@@ -35,6 +39,9 @@ class Orchestration(ABC):
         #initialize agents in the workflow
         self.agents = self.initialize_agents()
 
+        #agents whose responses are shown to the student, streamed token by token when requested
+        self.streamed_agents = ('tutor_agent',)
+
     @abstractmethod
     def initialize_agents(self) -> Dict[str, Any]:
         """
@@ -49,18 +56,62 @@ class Orchestration(ABC):
         """Executes the workflow"""
         pass
 
+    @abstractmethod
+    def planned_stages(self) -> List[str]:
+        """Names of the stages run_workflow goes through, in order"""
+        pass
+
     @abstractmethod
     def get_agent_input(self, agent_name:str, state: Dict[str, Any]) -> Dict[str, Any]:
         """Gets the input for specific agent based on workflow position"""
         pass
 
-    def run_agent(self, agent_name: str, state: Dict[str, Any], **kwargs) -> Dict[str, Any]:
-        """Method to run an agent"""
+    def run_agent(self, agent_name: str, state: Dict[str, Any],
+                  on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+                  cancel_token: Optional[CancellationToken] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Method to run an agent
+
+        Args
+            agent_name: key of the agent to run
+            state: workflow state, updated with the agent's result
+            on_event: optional callback receiving 'stage' events, and 'token' events
+                      for agents in streamed_agents
+            cancel_token: optional token; once cancelled, the running generation is
+                          aborted and no further stages start
+
+        Raises
+            OperationCancelled: if cancel_token was cancelled
+        """
+        stage = f"{agent_name}:{state['stage']}" if 'stage' in state else agent_name
+
+        #do not start a stage nobody is waiting for
+        if cancel_token is not None and cancel_token.cancelled:
+            self._record_cancellation(state, stage, None)
+            raise OperationCancelled(cancel_token.reason)
+
         #retrieve the agent input
         agent_input = self.get_agent_input(agent_name, state)
 
-        #execute agent and retrieve raw response
-        agent_response = self.agents[agent_name](agent_input)
+        on_token = None
+        if on_event is not None:
+            on_event({'type': 'stage', 'stage': stage})
+            if agent_name in self.streamed_agents:
+                on_token = lambda text: on_event({'type': 'token', 'stage': stage, 'text': text})
+
+        #execute agent and retrieve raw response, as a named stage in request profiles
+        start = time.perf_counter()
+        try:
+            agent_response = run_in_span(stage, self.agents[agent_name], agent_input,
+                                         on_token = on_token, cancel_token = cancel_token)
+        except OperationCancelled:
+            self._record_cancellation(state, stage, time.perf_counter() - start)
+            raise
+
+        #seconds spent in each stage, kept with the turn for later analysis
+        elapsed = time.perf_counter() - start
+        state.setdefault('stage_timings', {})[stage] = elapsed
+        metrics.observe(f"orchestration.stage.{stage}", elapsed)
 
         #log if enabled
         self._log_agent(agent_name, agent_input, agent_response)
@@ -71,6 +122,30 @@ class Orchestration(ABC):
 
         return state
     
+    def _record_cancellation(self, state: Dict[str, Any], stage: str, elapsed: Optional[float]):
+        """
+        Count the stages a cancellation skipped and estimate the generation time it saved.
+
+        Args
+            state: workflow state, holding the timings of the stages that finished
+            stage: the stage that was aborted, or that was about to start
+            elapsed: seconds the aborted stage had run, None if it never started
+        """
+        finished = state.get('stage_timings', {})
+        skipped = [name for name in self.planned_stages() if name not in finished and name != stage]
+        if elapsed is None:
+            skipped.append(stage)
+
+        #estimate with the average duration each stage has had in this process
+        reclaimed = sum(metrics.mean(f"orchestration.stage.{name}") or 0.0 for name in skipped)
+        if elapsed is not None:
+            reclaimed += max(0.0, (metrics.mean(f"orchestration.stage.{stage}") or 0.0) - elapsed)
+            metrics.increment('cancellation.aborted_generations')
+
+        metrics.increment('cancellation.cancelled_workflows')
+        metrics.increment('cancellation.skipped_stages', len(skipped))
+        metrics.increment('cancellation.reclaimed_seconds', reclaimed)
+
     def _log_agent(self, agent_name: str, agent_input: Dict[str, Any], agent_response: Dict[str, Any]):
         """Log an agent's input and output if the logging is enabled"""
         if self.logger:
@@ -0,0 +1,43 @@
+from typing import Dict, Any
+from orchestrations.base_orchestration import Orchestration
+from orchestrations.single_orchestration import SingleOrchestration
+from orchestrations.multi_orchestration import MultiOrchestration
+
+def build_orchestration(llm, config: Dict[str, Any], log_enabled: bool = False) -> Orchestration:
+    """
+    Build the orchestration described by a session configuration.
+
+    Args
+        llm: language model shared by the orchestration's agents
+        config: dict with 'language', 'mode' and 'orchestration_type' keys
+        log_enabled: print each agent's execution, for debugging
+
+    Returns
+        SingleOrchestration or MultiOrchestration object
+    """
+    #initialize the mode configuration
+    mode_config = {
+        'language': config.get('language', 'Python'),
+        'mode': config.get('mode', 'adaptive')
+    }
+
+    log_config = {
+        'log_config': {
+            'enabled': log_enabled
+        }
+    }
+
+    #create orchestrator based on user selection
+    if config.get('orchestration_type', 'single') == 'multi-agent':
+        return MultiOrchestration(
+            llm=llm,
+            mode_config=mode_config,
+            log_config=log_config,
+            revision_enabled=True  #enable tutor revision: tutor considers other agent input during multi-agent orchestration
+        )
+
+    return SingleOrchestration(
+        llm=llm,
+        mode_config=mode_config,
+        log_config=log_config
+    )
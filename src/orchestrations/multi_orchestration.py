@@ -1,5 +1,6 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable, List
 from orchestrations.base_orchestration import Orchestration
+from resources.cancellation import CancellationToken
 
 from agents.expert_agent import ExpertAgent
 from agents.teacher_agent import TeacherAgent
@@ -21,8 +22,10 @@ class MultiOrchestration(Orchestration):
             'teacher_agent': TeacherAgent(self.llm, mode_config = self.mode_config)
         }
     
-    def run_workflow(self, user_input: str, context: Optional[str] = None) -> Dict[str, Any]:
-        """Override the workflow method"""
+    def run_workflow(self, user_input: str, context: Optional[str] = None,
+                     on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+                     cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        """Override the workflow method, see run_agent for on_event and cancel_token"""
         #initialize the state
         state = {
             'user_input': user_input,
@@ -31,23 +34,35 @@ class MultiOrchestration(Orchestration):
 
         if context:
             state['conversation_history'] = context
+
+        #route adaptive turns once, the tutor's initial and revision stages share the intent
+        intent = self.agents['tutor_agent'].route(user_input)
+        if intent is not None:
+            state['intent'] = intent
         
         #run the tutor agent
-        state = self.run_agent('tutor_agent', state)
+        state = self.run_agent('tutor_agent', state, on_event = on_event, cancel_token = cancel_token)
         
         #run the expert agent given the tutor's analysis
-        state = self.run_agent('expert_agent', state)
+        state = self.run_agent('expert_agent', state, on_event = on_event, cancel_token = cancel_token)
 
         #run the teacher agent provided other agent analyses
-        state = self.run_agent('teacher_agent', state)
+        state = self.run_agent('teacher_agent', state, on_event = on_event, cancel_token = cancel_token)
 
         #optional stage for tutor revision using teacher feedback
         if self.revision:
             state['stage'] = 'revision'
-            state = self.run_agent('tutor_agent', state)
+            state = self.run_agent('tutor_agent', state, on_event = on_event, cancel_token = cancel_token)
 
         return state
     
+    def planned_stages(self) -> List[str]:
+        """Stages of the multi-agent workflow"""
+        stages = ['tutor_agent:initial', 'expert_agent:initial', 'teacher_agent:initial']
+        if self.revision:
+            stages.append('tutor_agent:revision')
+        return stages
+
     def get_agent_input(self, agent_name: str, state: Dict[str, Any]) -> Dict[str, Any]:
         """Gets the agent input for specific agent based on workflow position"""
         #declare base input
@@ -88,6 +103,10 @@ class MultiOrchestration(Orchestration):
         """Prepare input for the tutor agent"""
         stage = state.get('stage', 'initial')
 
+        #the intent routed for this turn picks the same specialized prompt at every stage
+        if 'intent' in state:
+            base_input['intent'] = state['intent']
+
         #handle initial stage after user input
         if stage == 'initial':
             return base_input
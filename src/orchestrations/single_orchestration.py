@@ -1,6 +1,7 @@
-from typing import Dict, Any, Union
+from typing import Dict, Any, Union, Optional, Callable, List
 from orchestrations.base_orchestration import Orchestration
 from agents.tutor_agent import TutorAgent
+from resources.cancellation import CancellationToken
 
 class SingleOrchestration(Orchestration):
     def initialize_agents(self):
@@ -9,7 +10,9 @@ class SingleOrchestration(Orchestration):
             'tutor_agent': TutorAgent(self.llm, mode_config = self.mode_config)
         }
     
-    def run_workflow(self, user_input: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+    def run_workflow(self, user_input: str, context: Dict[str, Any] = None,
+                     on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+                     cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
         """Implements the run workflow method for the single-agent workflow"""
         state = {
             'user_input': user_input
@@ -19,10 +22,14 @@ class SingleOrchestration(Orchestration):
             state['conversation_history'] = context
 
         #run the tutor agent
-        state = self.run_agent('tutor_agent', state)
+        state = self.run_agent('tutor_agent', state, on_event = on_event, cancel_token = cancel_token)
 
         return state
     
+    def planned_stages(self) -> List[str]:
+        """The single tutor stage"""
+        return ['tutor_agent']
+
     def get_agent_input(self, agent_name, state):
         """Override get agent input to return only the user-input for the tutor agent"""
         agent_input = {
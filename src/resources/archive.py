@@ -0,0 +1,496 @@
+import os
+import json
+import heapq
+import zlib
+import struct
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Callable, Iterator
+
+from resources.conversation_store import ConversationStore, ConflictError, enable_wal
+from resources.metrics import metrics
+
+try:
+    import fcntl
+except ImportError:
+    #file locks are not available on Windows, fall back to thread locks only
+    fcntl = None
+
+#every record starts with its compressed length and the crc32 of the compressed bytes
+RECORD_HEADER = struct.Struct('>II')
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parse a stored ISO timestamp as local time.
+
+    Returns
+        The naive local datetime, or None for an empty or invalid value
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo = None)
+    return parsed
+
+
+class ConversationArchive:
+    def __init__(self, directory: str, max_segment_bytes: int = 64 * 1024 * 1024, reclaim_dead_share: float = 0.5):
+        """
+        Cold storage for conversations nobody is using any more.
+
+        Conversations are written as zlib-compressed JSON records to append-only
+        segment files. A SQLite index maps each conversation to its segment and
+        offset, and keeps its config and summary so listing archived
+        conversations never decompresses them. Records of restored or deleted
+        conversations stay in their segment until reclaim copies the live
+        records out of mostly dead segments and deletes them.
+
+        Args
+            directory: folder holding the segment files and index
+            max_segment_bytes: size at which a new segment file is started
+            reclaim_dead_share: share of a segment's bytes that must be dead before reclaim rewrites it
+        """
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.reclaim_dead_share = reclaim_dead_share
+        os.makedirs(directory, exist_ok = True)
+
+        #sqlite connections may not be shared across threads
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS archived (
+                    id TEXT PRIMARY KEY,
+                    segment TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    raw_bytes INTEGER NOT NULL,
+                    config TEXT NOT NULL,
+                    update_time TEXT NOT NULL,
+                    message_count INTEGER NOT NULL,
+                    archive_time TEXT NOT NULL
+                )""")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the index connection owned by the current thread"""
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            #autocommit mode, transactions are opened explicitly
+            conn = sqlite3.connect(os.path.join(self.directory, 'index.db'), timeout = 30, isolation_level = None)
+            conn.row_factory = sqlite3.Row
+            enable_wal(conn)
+            self._local.connection = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements in a write transaction on the index"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    @contextmanager
+    def _segment_lock(self):
+        """Hold exclusive access to the segment files across threads and processes"""
+        with self._write_lock:
+            if fcntl is None:
+                yield
+                return
+
+            with open(os.path.join(self.directory, 'segments.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _segments(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.directory) if name.startswith('segment-') and name.endswith('.dat'))
+
+    def _active_segment(self) -> str:
+        """Name of the segment new records go to, starting a new one when the last is full"""
+        segments = self._segments()
+        if segments:
+            last = segments[-1]
+            if os.path.getsize(os.path.join(self.directory, last)) < self.max_segment_bytes:
+                return last
+            number = int(last[len('segment-'):-len('.dat')]) + 1
+        else:
+            number = 1
+        return f"segment-{number:06d}.dat"
+
+    def _write_records(self, records: List[bytes]) -> List[tuple]:
+        """
+        Append records to the active segments. Must hold the segment lock.
+
+        Returns
+            (segment, offset) of each record
+        """
+        positions = []
+        f = None
+        try:
+            for record in records:
+                segment = self._active_segment()
+                if f is None or f.name != os.path.join(self.directory, segment):
+                    if f is not None:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        f.close()
+                    f = open(os.path.join(self.directory, segment), 'ab')
+                positions.append((segment, f.tell()))
+                f.write(record)
+                #the next _active_segment call checks the size on disk
+                f.flush()
+            if f is not None:
+                os.fsync(f.fileno())
+        finally:
+            if f is not None:
+                f.close()
+        return positions
+
+    def add(self, data: Dict[str, Any]):
+        """
+        Archive a conversation, replacing any earlier archived copy.
+
+        Args
+            data: full conversation dict as returned by ConversationStore.load
+        """
+        raw = json.dumps(data).encode('utf-8')
+        compressed = zlib.compress(raw, 9)
+        record = RECORD_HEADER.pack(len(compressed), zlib.crc32(compressed)) + compressed
+
+        #the index is updated under the segment lock too, so reclaim never misses a record being added
+        with self._segment_lock():
+            [(segment, offset)] = self._write_records([record])
+
+            with self._transaction() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO archived (id, segment, offset, length, raw_bytes, config, update_time, '
+                    'message_count, archive_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (data['id'], segment, offset, len(record), len(raw),
+                     json.dumps(data.get('config', {})), data.get('update_time', datetime.now().isoformat()),
+                     len(data.get('messages', [])), datetime.now().isoformat()))
+
+    def _row(self, conversation_id: str) -> Optional[sqlite3.Row]:
+        return self._connection().execute('SELECT * FROM archived WHERE id = ?', (conversation_id,)).fetchone()
+
+    def contains(self, conversation_id: str) -> bool:
+        """Whether a conversation is archived"""
+        return self._row(conversation_id) is not None
+
+    def load(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read an archived conversation back.
+
+        Returns
+            Conversation dict, or None if it is not archived
+        """
+        row = self._row(conversation_id)
+        if row is None:
+            return None
+
+        try:
+            record = self._read_record(row)
+        except FileNotFoundError:
+            #the segment was reclaimed after the row was read, the record has moved
+            row = self._row(conversation_id)
+            if row is None:
+                return None
+            record = self._read_record(row)
+
+        length, checksum = RECORD_HEADER.unpack_from(record)
+        compressed = record[RECORD_HEADER.size:RECORD_HEADER.size + length]
+        if len(compressed) != length or zlib.crc32(compressed) != checksum:
+            raise ValueError(f"Archived conversation {conversation_id} is corrupt")
+
+        metrics.increment('archive.loads')
+        return json.loads(zlib.decompress(compressed).decode('utf-8'))
+
+    def _read_record(self, row: sqlite3.Row) -> bytes:
+        with open(os.path.join(self.directory, row['segment']), 'rb') as f:
+            f.seek(row['offset'])
+            return f.read(row['length'])
+
+    def get_config(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Get an archived conversation's config without decompressing it"""
+        row = self._row(conversation_id)
+        return json.loads(row['config']) if row else None
+
+    def remove(self, conversation_id: str):
+        """Forget an archived conversation; its record stays in the segment until it is reclaimed"""
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM archived WHERE id = ?', (conversation_id,))
+
+    def reclaim(self) -> int:
+        """
+        Rewrite segments that are mostly dead records.
+
+        The live records of every full segment whose dead share is above
+        reclaim_dead_share are copied to the active segment, the index is
+        pointed at the copies and the old segment is deleted. A crash part
+        way leaves extra dead copies, never a missing record.
+
+        Returns
+            Bytes freed on disk
+        """
+        freed = 0
+        with self._segment_lock():
+            live = dict(self._connection().execute(
+                'SELECT segment, SUM(length) FROM archived GROUP BY segment').fetchall())
+            active = self._active_segment()
+
+            for segment in self._segments():
+                path = os.path.join(self.directory, segment)
+                size = os.path.getsize(path)
+                if segment == active or size == 0 or 1 - live.get(segment, 0) / size <= self.reclaim_dead_share:
+                    continue
+
+                rows = self._connection().execute(
+                    'SELECT id, segment, offset, length FROM archived WHERE segment = ?', (segment,)).fetchall()
+                positions = self._write_records([self._read_record(row) for row in rows])
+
+                with self._transaction() as conn:
+                    for row, (new_segment, new_offset) in zip(rows, positions):
+                        #a conversation removed meanwhile keeps its row deleted
+                        conn.execute('UPDATE archived SET segment = ?, offset = ? WHERE id = ? AND segment = ? AND offset = ?',
+                                     (new_segment, new_offset, row['id'], segment, row['offset']))
+
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    #a reader still has it open (Windows); it is fully dead now and goes next time
+                    print(f"Error removing archive segment {segment}: {e}")
+                    continue
+                freed += size - sum(row['length'] for row in rows)
+
+        metrics.increment('archive.reclaimed_bytes', freed)
+        return freed
+
+    def list_conversations(self) -> List[Dict[str, Any]]:
+        """Summaries of the archived conversations, from the index"""
+        rows = self._connection().execute(
+            'SELECT id, config, message_count, update_time FROM archived').fetchall()
+
+        return [{
+            'id': row['id'],
+            'config': json.loads(row['config']),
+            'message_count': row['message_count'],
+            'update_time': row['update_time'],
+            'archived': True
+        } for row in rows]
+
+    def iter_summaries(self, after: Optional[str] = None, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Iterate over archived conversation summaries in id order, one page of rows at a time"""
+        while True:
+            rows = self._connection().execute(
+                'SELECT id, config, message_count, update_time FROM archived WHERE id > ? ORDER BY id LIMIT ?',
+                (after or '', page_size)).fetchall()
+
+            for row in rows:
+                yield {
+                    'id': row['id'],
+                    'config': json.loads(row['config']),
+                    'message_count': row['message_count'],
+                    'update_time': row['update_time'],
+                    'archived': True
+                }
+
+            if len(rows) < page_size:
+                return
+            after = rows[-1]['id']
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Space used by the archive.
+
+        Returns
+            Dict with the number of archived conversations and segments, their size
+            as uncompressed JSON (raw_bytes), the size of their live compressed
+            records (stored_bytes), the size of the segment files on disk and the
+            bytes saved by compression
+        """
+        row = self._connection().execute(
+            'SELECT COUNT(*) AS conversations, COALESCE(SUM(raw_bytes), 0) AS raw_bytes, '
+            'COALESCE(SUM(length), 0) AS stored_bytes FROM archived').fetchone()
+        segments = self._segments()
+        segment_bytes = sum(os.path.getsize(os.path.join(self.directory, name)) for name in segments)
+
+        return {
+            'conversations': row['conversations'],
+            'segments': len(segments),
+            'raw_bytes': row['raw_bytes'],
+            'stored_bytes': row['stored_bytes'],
+            'segment_bytes': segment_bytes,
+            'saved_bytes': row['raw_bytes'] - row['stored_bytes'],
+            'compression_ratio': row['raw_bytes'] / row['stored_bytes'] if row['stored_bytes'] else None
+        }
+
+
+class TieredConversationStore(ConversationStore):
+    def __init__(self, hot: ConversationStore, archive: ConversationArchive):
+        """
+        Conversation store that moves idle conversations to a compressed archive.
+
+        Reads fall through to the archive when a conversation is not in the hot
+        store, so archived conversations load like any other. Appending to an
+        archived conversation moves it back to the hot store first.
+
+        Args
+            hot: store holding active conversations
+            archive: where idle conversations are compacted to
+        """
+        super().__init__()
+        self.hot = hot
+        self.archive = archive
+
+    def add_listener(self, listener: Callable[[str, List[Dict[str, Any]], Dict[str, Any]], None]):
+        """Register an append listener with the hot store, where every append happens"""
+        self.hot.add_listener(listener)
+
+    def _restore(self, conversation_id: str):
+        """Move an archived conversation back to the hot store"""
+        data = self.archive.load(conversation_id)
+        if data is None:
+            return
+
+        try:
+            self.hot.save(conversation_id, data['messages'], data['config'], expected_version = 0)
+        except ConflictError:
+            #another worker restored it first
+            pass
+        self.archive.remove(conversation_id)
+        metrics.increment('archive.restores')
+
+    def load(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        data = self.hot.load(conversation_id)
+        if data is None:
+            data = self.archive.load(conversation_id)
+        return data
+
+    def save(self, conversation_id: str, messages: List[Dict[str, Any]], config: Dict[str, Any],
+             expected_version: Optional[int] = None) -> Dict[str, Any]:
+        data = self.hot.save(conversation_id, messages, config, expected_version = expected_version)
+        if self.archive.contains(conversation_id):
+            self.archive.remove(conversation_id)
+        return data
+
+    def append_messages(self, conversation_id: str, messages: List[Dict[str, Any]],
+                        config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if self.hot.get_config(conversation_id) is None and self.archive.contains(conversation_id):
+            self._restore(conversation_id)
+        return self.hot.append_messages(conversation_id, messages, config)
+
+    def delete(self, conversation_id: str, expected_version: Optional[int] = None) -> bool:
+        deleted = self.hot.delete(conversation_id, expected_version = expected_version)
+        if self.archive.contains(conversation_id):
+            self.archive.remove(conversation_id)
+            deleted = True
+        return deleted
+
+    def load_messages(self, conversation_id: str, limit: int, before: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        page = self.hot.load_messages(conversation_id, limit, before = before)
+        if page is None:
+            page = super().load_messages(conversation_id, limit, before = before)
+        return page
+
+    def get_messages(self, conversation_id: str, seqs: List[int]) -> List[Dict[str, Any]]:
+        if self.hot.get_config(conversation_id) is not None:
+            return self.hot.get_messages(conversation_id, seqs)
+        return super().get_messages(conversation_id, seqs)
+
+    def get_config(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        config = self.hot.get_config(conversation_id)
+        if config is None:
+            config = self.archive.get_config(conversation_id)
+        return config
+
+    def list_conversations(self) -> List[Dict[str, Any]]:
+        return self.hot.list_conversations() + self.archive.list_conversations()
+
+    def iter_summaries(self, after: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate over hot and archived conversations together in id order"""
+        previous = None
+        for summary in heapq.merge(self.hot.iter_summaries(after), self.archive.iter_summaries(after),
+                                   key = lambda x: x['id']):
+            #a conversation being archived can briefly be in both tiers
+            if summary['id'] != previous:
+                yield summary
+            previous = summary['id']
+
+    def compact(self, idle: timedelta, on_archived: Optional[Callable[[str], None]] = None) -> List[str]:
+        """
+        Move conversations idle for longer than a threshold to the archive.
+
+        Only one process compacts at a time; others return immediately. Space
+        left by conversations restored since the last run is reclaimed afterwards.
+
+        Args
+            idle: how long a conversation must go without updates
+            on_archived: called with each archived conversation's id, e.g. to drop derived data
+
+        Returns
+            Ids of the conversations archived
+        """
+        if fcntl is not None:
+            lock_file = open(os.path.join(self.archive.directory, 'compact.lock'), 'a')
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return []
+        else:
+            lock_file = None
+
+        try:
+            cutoff = datetime.now() - idle
+            archived = []
+            for summary in self.hot.list_conversations():
+                #conversations without a readable update time are never known to be idle
+                updated = parse_time(summary.get('update_time'))
+                if updated is None or updated >= cutoff:
+                    continue
+                try:
+                    if self._archive_one(summary['id']):
+                        archived.append(summary['id'])
+                        if on_archived is not None:
+                            on_archived(summary['id'])
+                except Exception as e:
+                    print(f"Error archiving conversation {summary['id']}: {e}")
+
+            metrics.increment('archive.compacted', len(archived))
+
+            try:
+                self.archive.reclaim()
+            except Exception as e:
+                print(f"Error reclaiming archive segments: {e}")
+            return archived
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+    def _archive_one(self, conversation_id: str) -> bool:
+        """Copy a conversation to the archive, then remove it from the hot store if it was not changed meanwhile"""
+        data = self.hot.load(conversation_id)
+        if data is None:
+            return False
+
+        self.archive.add(data)
+        if self.hot.delete(conversation_id, expected_version = data['version']):
+            return True
+
+        #a message arrived while it was being archived, keep the hot copy
+        if self.hot.get_config(conversation_id) is not None:
+            self.archive.remove(conversation_id)
+        return False
@@ -0,0 +1,424 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+
+from resources.conversation_store import generate_conversation_id, is_valid_conversation_id
+from resources.parser import Parser
+
+try:
+    import fcntl
+except ImportError:
+    #without file locks, interrupted jobs are only resumed on request
+    fcntl = None
+
+DEFAULT_INSTRUCTIONS = "Please review my code and give me feedback."
+
+
+class SharedSlots:
+    def __init__(self, directory: str, count: int, poll_interval: float = 0.1):
+        """
+        A limit on concurrent holders shared by every process using the same directory.
+
+        Each slot is a lock file; a holder keeps one of them locked. Threads of
+        one process first take a local semaphore, so only slots that may be free
+        are polled. Without file locks the limit applies per process.
+
+        Args
+            directory: folder for the slot lock files
+            count: holders allowed at once across all processes
+            poll_interval: seconds between attempts while every slot is taken
+        """
+        self.directory = directory
+        self.count = count
+        self.poll_interval = poll_interval
+        os.makedirs(directory, exist_ok = True)
+
+        self._local_slots = threading.BoundedSemaphore(count)
+        self._held = threading.local()
+
+    def _try_lock(self):
+        """Lock a free slot file, or return None when all are taken"""
+        for index in range(self.count):
+            slot_file = open(os.path.join(self.directory, f"slot-{index}.lock"), 'a')
+            try:
+                fcntl.flock(slot_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot_file
+            except OSError:
+                slot_file.close()
+        return None
+
+    def __enter__(self):
+        self._local_slots.acquire()
+        if fcntl is None:
+            return self
+
+        try:
+            slot_file = self._try_lock()
+            while slot_file is None:
+                time.sleep(self.poll_interval)
+                slot_file = self._try_lock()
+        except BaseException:
+            self._local_slots.release()
+            raise
+
+        self._held.slot_file = slot_file
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        slot_file = getattr(self._held, 'slot_file', None)
+        if slot_file is not None:
+            self._held.slot_file = None
+            #closing the file releases its lock
+            slot_file.close()
+        self._local_slots.release()
+
+
+def normalize_submissions(submissions: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Check submissions and bring them into one form.
+
+    Args
+        submissions: code strings, or dicts with a 'code' string and optional 'id'
+
+    Returns
+        Dicts with 'index', 'id' and 'code'
+
+    Raises
+        ValueError: if a submission has another form
+    """
+    items = []
+    for index, submission in enumerate(submissions):
+        if isinstance(submission, str):
+            submission = {'code': submission}
+        if not isinstance(submission, dict) or not isinstance(submission.get('code', ''), str):
+            raise ValueError(f"Submission {index} must be a string or an object with a 'code' string")
+        items.append({'index': index, 'id': submission.get('id', index), 'code': submission.get('code', '')})
+    return items
+
+
+class BatchJob:
+    def __init__(self, job_id: str, directory: str, config: Dict[str, Any]):
+        """
+        In-process state of a running batch job.
+
+        Args
+            job_id: id of the job
+            directory: folder holding the job's files
+            config: language, mode and orchestration the job runs with
+        """
+        self.job_id = job_id
+        self.directory = directory
+        self.config = config
+        self.cancel_event = threading.Event()
+        self.results_lock = threading.Lock()
+        self.pending = 0
+        self.lock_file = None
+
+
+class BatchJobManager:
+    def __init__(self, directory: str, orchestration_factory: Callable[[Dict[str, Any]], Any],
+                 max_workers: int = 8, llm_concurrency: int = 2):
+        """
+        Runs bulk tutoring jobs, such as grading a class's submissions in feedback mode.
+
+        Every submission is sent through the same orchestration the interactive
+        tutor uses. Results are appended to a JSONL file as they finish, so a job
+        interrupted by a restart resumes where it stopped.
+
+        Args
+            directory: folder where job files are kept
+            orchestration_factory: builds an orchestration from a session config
+            max_workers: size of the worker pool shared by all jobs
+            llm_concurrency: maximum submissions sent to the LLM at once across all jobs
+                             and every process sharing the directory
+        """
+        self.directory = directory
+        self.orchestration_factory = orchestration_factory
+        os.makedirs(directory, exist_ok = True)
+
+        self.executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = 'batch')
+        self.llm_slots = SharedSlots(os.path.join(directory, '.llm_slots'), llm_concurrency)
+        self.parser = Parser()
+
+        #jobs running in this process
+        self.running = {}
+        self.running_lock = threading.Lock()
+
+    def _job_dir(self, job_id: str) -> str:
+        if not is_valid_conversation_id(job_id):
+            raise ValueError(f"Invalid job id: {job_id!r}")
+        return os.path.join(self.directory, job_id)
+
+    def _job_ids(self) -> List[str]:
+        """Ids of the jobs in the directory, oldest first"""
+        return sorted(name for name in os.listdir(self.directory) if is_valid_conversation_id(name))
+
+    def _read_manifest(self, job_id: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self._job_dir(job_id), 'job.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _write_manifest(self, job_id: str, manifest: Dict[str, Any]):
+        """Atomically replace a job's manifest"""
+        path = os.path.join(self._job_dir(job_id), 'job.json')
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _set_status(self, job_id: str, status: str):
+        manifest = self._read_manifest(job_id)
+        manifest['status'] = status
+        manifest['update_time'] = datetime.now().isoformat()
+        self._write_manifest(job_id, manifest)
+
+    def _read_results(self, job_id: str) -> List[Dict[str, Any]]:
+        """Read the results written so far, ignoring a partially written last line"""
+        path = os.path.join(self._job_dir(job_id), 'results.jsonl')
+        results = []
+        if not os.path.exists(path):
+            return results
+
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    results.append(json.loads(line))
+                except ValueError:
+                    continue
+        return results
+
+    def _repair_results(self, job_id: str):
+        """Cut off a result line left half written by a crash, so new results start on a line of their own"""
+        path = os.path.join(self._job_dir(job_id), 'results.jsonl')
+        if not os.path.exists(path):
+            return
+
+        with open(path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def results_path(self, job_id: str) -> str:
+        """Location of a job's JSONL results file"""
+        return os.path.join(self._job_dir(job_id), 'results.jsonl')
+
+    def create_job(self, config: Dict[str, Any], submissions: List[Any]) -> str:
+        """
+        Create a job and start running it.
+
+        Args
+            config: dict with 'language', 'mode', 'orchestration_type' and optional 'instructions'
+            submissions: code snippets, either strings or dicts with 'code' and optional 'id'
+
+        Returns
+            The job id
+
+        Raises
+            ValueError: if a submission is neither a string nor a dict with a 'code' string
+        """
+        #check everything before anything is written
+        items = normalize_submissions(submissions)
+
+        job_id = generate_conversation_id()
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir)
+
+        with open(os.path.join(job_dir, 'inputs.jsonl'), 'w') as f:
+            for item in items:
+                f.write(json.dumps(item) + '\n')
+
+        now = datetime.now().isoformat()
+        self._write_manifest(job_id, {
+            'id': job_id,
+            'config': config,
+            'total': len(submissions),
+            'status': 'running',
+            'create_time': now,
+            'update_time': now
+        })
+
+        self.start(job_id)
+        return job_id
+
+    def start(self, job_id: str) -> bool:
+        """
+        Queue every submission of a job that has no result yet.
+
+        Returns
+            False if the job is already running in some process
+
+        Raises
+            Exception: whatever failed while starting, after the job is marked 'failed' and released
+        """
+        manifest = self._read_manifest(job_id)
+        if manifest is None:
+            raise KeyError(job_id)
+
+        job = BatchJob(job_id, self._job_dir(job_id), manifest['config'])
+
+        #only one process may run a job at a time
+        if fcntl is not None:
+            job.lock_file = open(os.path.join(job.directory, 'job.lock'), 'a')
+            try:
+                fcntl.flock(job.lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                job.lock_file.close()
+                return False
+
+        with self.running_lock:
+            if job_id in self.running:
+                if job.lock_file is not None:
+                    job.lock_file.close()
+                return False
+            self.running[job_id] = job
+
+        try:
+            self._repair_results(job_id)
+            done = {result['index'] for result in self._read_results(job_id)}
+            with open(os.path.join(job.directory, 'inputs.jsonl'), 'r') as f:
+                items = [json.loads(line) for line in f if line.strip()]
+            remaining = [item for item in items if item['index'] not in done]
+
+            if manifest['status'] != 'running':
+                self._set_status(job_id, 'running')
+
+            if not remaining:
+                self._finish(job)
+                return True
+
+            orchestrator = self.orchestration_factory(job.config)
+            job.pending = len(remaining)
+            for item in remaining:
+                self.executor.submit(self._run_item, job, orchestrator, item)
+            return True
+        except Exception:
+            #release the job so it can be resumed once the problem is fixed
+            try:
+                self._set_status(job_id, 'failed')
+            except Exception as e:
+                print(f"Error marking batch job {job_id} as failed: {e}")
+            with self.running_lock:
+                self.running.pop(job_id, None)
+            if job.lock_file is not None:
+                job.lock_file.close()
+            raise
+
+    def _run_item(self, job: BatchJob, orchestrator, item: Dict[str, Any]):
+        """Run one submission through the orchestration and append its result"""
+        try:
+            #a cancel request may have been handled by another worker process
+            if not job.cancel_event.is_set() and self._read_manifest(job.job_id)['status'] == 'cancelled':
+                job.cancel_event.set()
+            if job.cancel_event.is_set():
+                return
+
+            instructions = job.config.get('instructions') or DEFAULT_INSTRUCTIONS
+            user_input = f"{instructions}\n\n```\n{item['code']}\n```"
+
+            result = {'index': item['index'], 'id': item['id'], 'response': None, 'error': None}
+            start = time.perf_counter()
+            try:
+                with self.llm_slots:
+                    if job.cancel_event.is_set():
+                        return
+                    state = orchestrator.run_workflow(user_input)
+                result['response'] = self.parser.extract_final_response(state)
+            except Exception as e:
+                result['error'] = str(e)
+            result['duration'] = time.perf_counter() - start
+            result['completed_time'] = datetime.now().isoformat()
+
+            with job.results_lock:
+                with open(os.path.join(job.directory, 'results.jsonl'), 'a') as f:
+                    f.write(json.dumps(result) + '\n')
+        finally:
+            with job.results_lock:
+                job.pending -= 1
+                finished = job.pending == 0
+            if finished:
+                self._finish(job)
+
+    def _finish(self, job: BatchJob):
+        """Record the final status of a job and release it"""
+        try:
+            self._set_status(job.job_id, 'cancelled' if job.cancel_event.is_set() else 'completed')
+        finally:
+            with self.running_lock:
+                self.running.pop(job.job_id, None)
+            if job.lock_file is not None:
+                job.lock_file.close()
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Stop a job. Submissions already sent to the LLM finish, the rest are skipped.
+
+        Returns
+            False if the job does not exist
+        """
+        manifest = self._read_manifest(job_id)
+        if manifest is None:
+            return False
+
+        with self.running_lock:
+            job = self.running.get(job_id)
+        if job is not None:
+            job.cancel_event.set()
+        elif manifest['status'] == 'running':
+            #not running here: mark it so the process running it (or a restart) leaves it alone
+            self._set_status(job_id, 'cancelled')
+        return True
+
+    def resume(self, job_id: str) -> bool:
+        """Continue a cancelled or interrupted job from its last result"""
+        return self.start(job_id)
+
+    def resume_interrupted(self) -> List[str]:
+        """
+        Resume jobs that were still running when a previous process stopped.
+
+        Returns
+            Ids of the jobs resumed by this process
+        """
+        resumed = []
+        for job_id in self._job_ids():
+            try:
+                manifest = self._read_manifest(job_id)
+                if manifest and manifest['status'] == 'running' and self.start(job_id):
+                    resumed.append(job_id)
+            except Exception as e:
+                print(f"Error resuming batch job {job_id}: {e}")
+        return resumed
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Progress of a job.
+
+        Returns
+            Manifest dict with 'completed' and 'failed' counts, or None if the job does not exist
+        """
+        manifest = self._read_manifest(job_id)
+        if manifest is None:
+            return None
+
+        results = self._read_results(job_id)
+        manifest['completed'] = len(results)
+        manifest['failed'] = sum(1 for result in results if result.get('error'))
+        return manifest
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Manifests of every job, newest first"""
+        jobs = []
+        for job_id in reversed(self._job_ids()):
+            try:
+                manifest = self._read_manifest(job_id)
+            except Exception:
+                continue
+            if manifest:
+                jobs.append(manifest)
+        return jobs
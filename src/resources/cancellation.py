@@ -0,0 +1,175 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from resources.conversation_store import is_valid_conversation_id
+
+
+class OperationCancelled(Exception):
+    """Raised when work is abandoned because its result is no longer wanted"""
+    pass
+
+
+class CancellationToken:
+    def __init__(self, check: Optional[Callable[[], bool]] = None):
+        """
+        Cooperative cancellation flag passed down to long-running work.
+
+        Work checks the token between steps (agent stages, streamed chunks) and
+        stops by raising OperationCancelled.
+
+        Args
+            check: optional extra test for cancellation, e.g. a request made in another process
+        """
+        self._event = threading.Event()
+        self._check = check
+        self.reason = None
+
+    def cancel(self, reason: str = 'cancelled'):
+        """Ask the work holding this token to stop"""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether cancellation was requested"""
+        if not self._event.is_set() and self._check is not None and self._check():
+            self.cancel('cancelled by another worker')
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """
+        Raises
+            OperationCancelled: if cancellation was requested
+        """
+        if self.cancelled:
+            raise OperationCancelled(self.reason)
+
+
+class CancellationRegistry:
+    def __init__(self, directory: str, poll_interval: float = 0.25, marker_max_age: float = 3600):
+        """
+        Tracks the running chat turns of each conversation so they can be cancelled.
+
+        A cancel request may reach a different worker process than the one
+        running the turn, so besides cancelling local tokens it leaves a marker
+        file that the running worker notices the next time it checks its token.
+        The marker is removed when the cancelled turn ends. Markers nobody
+        picked up only affect turns started before them, and are pruned once
+        they are older than marker_max_age.
+
+        Args
+            directory: folder for cancellation markers shared by all workers
+            poll_interval: minimum seconds between marker checks for one token
+            marker_max_age: seconds after which an unclaimed marker is deleted
+        """
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.marker_max_age = marker_max_age
+        os.makedirs(directory, exist_ok = True)
+
+        self._lock = threading.Lock()
+        self._tokens = {}
+
+    def _marker(self, key: str) -> str:
+        if not is_valid_conversation_id(key):
+            raise ValueError(f"Invalid conversation id: {key!r}")
+        return os.path.join(self.directory, f"{key}.cancel")
+
+    def _marker_check(self, key: str, started: float) -> Callable[[], bool]:
+        """Build a throttled test for a cancel marker written after a turn started"""
+        marker = self._marker(key)
+        last_check = [0.0]
+
+        def check() -> bool:
+            now = time.monotonic()
+            if now - last_check[0] < self.poll_interval:
+                return False
+            last_check[0] = now
+            try:
+                return os.path.getmtime(marker) >= started
+            except OSError:
+                return False
+
+        return check
+
+    def token(self, key: str) -> CancellationToken:
+        """Create a token for a conversation's next turn, cancelled by cancel() from any worker"""
+        return CancellationToken(self._marker_check(key, time.time()))
+
+    @contextmanager
+    def track(self, key: str, token: Optional[CancellationToken] = None):
+        """
+        Register a running turn for a conversation.
+
+        Args
+            key: the conversation id
+            token: token made with token(), a new one when omitted
+
+        Yields
+            The turn's CancellationToken
+        """
+        token = token or self.token(key)
+        with self._lock:
+            self._tokens.setdefault(key, set()).add(token)
+
+        try:
+            yield token
+        finally:
+            with self._lock:
+                tokens = self._tokens.get(key)
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens[key]
+                last = not tokens
+
+            #the marker has done its job once the turn it cancelled is over
+            if last and token.cancelled:
+                try:
+                    os.remove(self._marker(key))
+                except OSError:
+                    pass
+
+    def cancel(self, key: str, reason: str = 'cancelled') -> bool:
+        """
+        Cancel a conversation's running turns, wherever they run.
+
+        Returns
+            True if a turn was running in this process
+        """
+        #tell the other workers, before local turns can end and clear the marker
+        with open(self._marker(key), 'w') as f:
+            f.write(reason)
+
+        with self._lock:
+            tokens = list(self._tokens.get(key, ()))
+        for token in tokens:
+            token.cancel(reason)
+
+        self.prune()
+        return bool(tokens)
+
+    def prune(self) -> int:
+        """
+        Delete cancel markers older than marker_max_age.
+
+        Returns
+            Number of markers deleted
+        """
+        cutoff = time.time() - self.marker_max_age
+        removed = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.cancel'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                #removed by another worker meanwhile
+                pass
+        return removed
@@ -0,0 +1,205 @@
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Any, List, Optional, Iterator
+
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import PrivateAttr
+
+
+def prompt_key(prompt: str) -> str:
+    """Hash a rendered prompt into the key used to match recorded interactions"""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+def _agent_name(run_manager) -> Optional[str]:
+    """Read the agent name that Agent._invoke_llm attaches to the run metadata"""
+    if run_manager is None:
+        return None
+    return (run_manager.metadata or {}).get('agent_name')
+
+
+class CassetteMissError(KeyError):
+    """Raised when a replayed prompt was never recorded"""
+    pass
+
+
+class Cassette:
+    def __init__(self, path: str):
+        """
+        A cassette file holding recorded LLM interactions.
+
+        Each line is one JSON interaction with the agent name, rendered prompt,
+        response, total latency and, for streamed calls, the time offset of
+        every chunk.
+
+        Args
+            path: location of the JSONL cassette file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, interaction: Dict[str, Any]):
+        """Append an interaction to the cassette"""
+        line = json.dumps(interaction)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Read every interaction from the cassette, in recording order"""
+        interactions = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    interactions.append(json.loads(line))
+        return interactions
+
+
+class RecordingLLM(LLM):
+    """
+    Wraps an LLM and records every call into a cassette.
+
+    Pass it to an orchestration in place of the real LLM; agents behave exactly
+    as before while prompts, responses and timings are captured.
+    """
+    llm: Any
+    cassette: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return 'recording'
+
+    @property
+    def model(self) -> str:
+        """Model name of the wrapped LLM"""
+        return getattr(self.llm, 'model', type(self.llm).__name__)
+
+    def _interaction(self, prompt: str, response: str, latency: float, run_manager,
+                     chunks: Optional[List[List[Any]]] = None) -> Dict[str, Any]:
+        """Build the cassette entry for one call"""
+        return {
+            'agent': _agent_name(run_manager),
+            'model': self.model,
+            'prompt_key': prompt_key(prompt),
+            'prompt': prompt,
+            'response': response,
+            'latency': latency,
+            'chunks': chunks
+        }
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager = None, **kwargs: Any) -> str:
+        """Invoke the wrapped LLM and record the result"""
+        start = time.perf_counter()
+        response = self.llm.invoke(prompt, stop = stop, **kwargs)
+        latency = time.perf_counter() - start
+
+        self.cassette.record(self._interaction(prompt, response, latency, run_manager))
+        return response
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager = None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        """Stream from the wrapped LLM, recording when every chunk arrived"""
+        start = time.perf_counter()
+        chunks = []
+
+        for text in self.llm.stream(prompt, stop = stop, **kwargs):
+            chunks.append([time.perf_counter() - start, text])
+            if run_manager:
+                run_manager.on_llm_new_token(text)
+            yield GenerationChunk(text = text)
+
+        latency = time.perf_counter() - start
+        response = ''.join(text for _, text in chunks)
+        self.cassette.record(self._interaction(prompt, response, latency, run_manager, chunks))
+
+
+class ReplayLLM(LLM):
+    """
+    Serves recorded responses back from a cassette.
+
+    Responses are matched on the rendered prompt. Identical prompts recorded
+    several times are served in recording order, wrapping around. Latency and
+    token pacing follow the recording, multiplied by latency_scale (0 replays
+    instantly).
+    """
+    cassette_path: str
+    latency_scale: float = 1.0
+    #"error" raises on unknown prompts, "cycle" serves recorded interactions in turn
+    fallback: str = 'error'
+    model: str = 'replay'
+
+    _interactions: Dict[str, List[Dict[str, Any]]] = PrivateAttr(default_factory = dict)
+    _positions: Dict[str, int] = PrivateAttr(default_factory = dict)
+    _ordered: List[Dict[str, Any]] = PrivateAttr(default_factory = list)
+    _cycle_position: int = PrivateAttr(default = 0)
+    _lock: Any = PrivateAttr(default_factory = threading.Lock)
+
+    def __init__(self, **kwargs: Any):
+        """Load the cassette named by cassette_path"""
+        super().__init__(**kwargs)
+        self._ordered = Cassette(self.cassette_path).load()
+        for interaction in self._ordered:
+            key = interaction.get('prompt_key') or prompt_key(interaction['prompt'])
+            self._interactions.setdefault(key, []).append(interaction)
+
+    @property
+    def _llm_type(self) -> str:
+        return 'replay'
+
+    def _next_interaction(self, prompt: str) -> Dict[str, Any]:
+        """Pick the interaction to serve for a prompt"""
+        key = prompt_key(prompt)
+
+        with self._lock:
+            matches = self._interactions.get(key)
+            if matches:
+                position = self._positions.get(key, 0)
+                self._positions[key] = position + 1
+                return matches[position % len(matches)]
+
+            if self.fallback == 'cycle' and self._ordered:
+                interaction = self._ordered[self._cycle_position % len(self._ordered)]
+                self._cycle_position += 1
+                return interaction
+
+        raise CassetteMissError(f"No recorded response for prompt {key[:12]}")
+
+    def _chunk_schedule(self, interaction: Dict[str, Any]) -> List[List[Any]]:
+        """
+        Get (offset, text) pairs for streaming an interaction.
+
+        Recordings made without streaming are split into words spread evenly
+        over the recorded latency.
+        """
+        if interaction.get('chunks'):
+            return interaction['chunks']
+
+        words = interaction['response'].split(' ')
+        step = interaction.get('latency', 0.0) / max(len(words), 1)
+        return [[step * (i + 1), word if i == 0 else ' ' + word] for i, word in enumerate(words)]
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager = None, **kwargs: Any) -> str:
+        """Return the recorded response after the scaled recorded latency"""
+        interaction = self._next_interaction(prompt)
+        delay = interaction.get('latency', 0.0) * self.latency_scale
+        if delay > 0:
+            time.sleep(delay)
+        return interaction['response']
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager = None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        """Stream the recorded chunks with the scaled recorded pacing"""
+        interaction = self._next_interaction(prompt)
+        start = time.perf_counter()
+
+        for offset, text in self._chunk_schedule(interaction):
+            delay = offset * self.latency_scale - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+            if run_manager:
+                run_manager.on_llm_new_token(text)
+            yield GenerationChunk(text = text)
@@ -0,0 +1,825 @@
+import os
+import re
+import json
+import time
+import secrets
+import tempfile
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Iterator
+
+try:
+    import fcntl
+except ImportError:
+    #file locks are not available on Windows, fall back to thread locks only
+    fcntl = None
+
+#Crockford base32 alphabet used by ULIDs (no I, L, O or U)
+CROCKFORD_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+#accept ULIDs as well as the legacy timestamp ids ("20250101_1200")
+CONVERSATION_ID_PATTERN = re.compile(r'^[0-9A-Za-z_-]{1,64}$')
+
+_id_lock = threading.Lock()
+_last_timestamp = 0
+_last_randomness = 0
+
+
+def _encode_base32(value: int, length: int) -> str:
+    """Encode an integer as a fixed-length Crockford base32 string"""
+    chars = []
+    for _ in range(length):
+        chars.append(CROCKFORD_ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def generate_conversation_id() -> str:
+    """
+    Generate a sortable, collision-free conversation id.
+
+    Follows the ULID layout: a 48-bit millisecond timestamp followed by 80 bits
+    of randomness, encoded as 26 Crockford base32 characters. Ids generated in
+    the same millisecond by this process increment the random part, so they stay
+    strictly increasing.
+
+    Returns
+        26 character id string
+    """
+    global _last_timestamp, _last_randomness
+
+    with _id_lock:
+        timestamp = int(time.time() * 1000)
+        if timestamp <= _last_timestamp:
+            #same millisecond (or clock went backwards): keep ordering monotonic
+            timestamp = _last_timestamp
+            randomness = (_last_randomness + 1) & ((1 << 80) - 1)
+        else:
+            randomness = secrets.randbits(80)
+
+        _last_timestamp = timestamp
+        _last_randomness = randomness
+
+    return _encode_base32(timestamp, 10) + _encode_base32(randomness, 16)
+
+
+def is_valid_conversation_id(conversation_id: str) -> bool:
+    """Check that an id is safe to use as a file name"""
+    return bool(conversation_id) and bool(CONVERSATION_ID_PATTERN.match(conversation_id))
+
+
+def enable_wal(conn: sqlite3.Connection, timeout: float = 30):
+    """
+    Switch a SQLite database to WAL mode, waiting for other workers opening it at the same time.
+
+    Changing the journal mode fails at once on a busy database instead of
+    using the connection's busy timeout, so workers starting together retry.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            return
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) or time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+class ConflictError(Exception):
+    """Raised when a conversation was modified since it was read"""
+    pass
+
+
+class ConversationStore(ABC):
+    """
+    Shared conversation persistence used by every server worker.
+
+    Implementations must be safe to use from many threads and processes at
+    once, so any worker can serve any request for any conversation.
+    """
+
+    def __init__(self):
+        """Initialize the list of append listeners"""
+        self._listeners = []
+
+    def add_listener(self, listener: Callable[[str, List[Dict[str, Any]], Dict[str, Any]], None]):
+        """
+        Register a function called after messages are appended in this process.
+
+        Listeners receive the conversation id, the appended messages (each with
+        its 'seq') and the conversation's config. Errors in a listener are
+        printed and do not fail the append.
+
+        Args
+            listener: function to call
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, conversation_id: str, messages: List[Dict[str, Any]], start: int, config: Dict[str, Any]):
+        """Tell listeners about appended messages"""
+        if not self._listeners:
+            return
+
+        appended = [dict(message, seq = seq) for seq, message in enumerate(messages, start)]
+        for listener in self._listeners:
+            try:
+                listener(conversation_id, appended, config)
+            except Exception as e:
+                print(f"Error in conversation store listener: {e}")
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]):
+        """
+        Create a store from user-defined config
+
+        Args
+            config: Optional dict with 'backend' ("sqlite" or "json") and 'directory' keys
+
+        Returns
+            ConversationStore object
+        """
+        config = config or {}
+        backend = config.get('backend', 'sqlite')
+        directory = config.get('directory', 'conversations')
+        os.makedirs(directory, exist_ok = True)
+
+        if backend == 'json':
+            return JsonConversationStore(directory)
+        if backend == 'sqlite':
+            return SQLiteConversationStore(os.path.join(directory, 'conversations.db'))
+
+        raise ValueError(f"Unknown conversation store backend: {backend}")
+
+    @abstractmethod
+    def load(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Load a conversation dict, or None if it does not exist"""
+        pass
+
+    @abstractmethod
+    def save(self, conversation_id: str, messages: List[Dict[str, Any]], config: Dict[str, Any],
+             expected_version: Optional[int] = None) -> Dict[str, Any]:
+        """Save a full conversation, raising ConflictError on a version mismatch"""
+        pass
+
+    @abstractmethod
+    def append_messages(self, conversation_id: str, messages: List[Dict[str, Any]],
+                        config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Atomically append messages to a conversation.
+
+        Returns
+            Summary dict with id, config, update_time, version, message_count and
+            start_seq (the sequence number of the first appended message)
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, conversation_id: str, expected_version: Optional[int] = None) -> bool:
+        """
+        Delete a conversation, optionally only if it is still at a version.
+
+        Returns
+            False if the conversation does not exist or has a different version
+        """
+        pass
+
+    @abstractmethod
+    def list_conversations(self) -> List[Dict[str, Any]]:
+        """Summarize all stored conversations"""
+        pass
+
+    def load_messages(self, conversation_id: str, limit: int, before: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Load one page of a conversation's messages, newest page first.
+
+        Backends should override this with a read that does not touch the whole
+        transcript; the default slices a full load.
+
+        Args
+            conversation_id: conversation to read
+            limit: maximum number of messages to return
+            before: only return messages with a sequence number below this cursor
+
+        Returns
+            Dict with the page's 'messages' (oldest first, each with a 'seq'),
+            'message_count' and 'next_cursor' (None when no older messages remain),
+            or None if the conversation does not exist
+        """
+        data = self.load(conversation_id)
+        if data is None:
+            return None
+
+        messages = data['messages']
+        end = len(messages) if before is None else max(0, min(before, len(messages)))
+        start = max(0, end - limit)
+
+        page = [dict(message, seq = seq) for seq, message in enumerate(messages[start:end], start)]
+        return {
+            'messages': page,
+            'message_count': len(messages),
+            'next_cursor': start if start > 0 else None
+        }
+
+    def iter_summaries(self, after: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over conversation summaries in id order, which is creation order.
+
+        Backends should override this to read in pages; the default sorts the
+        full listing.
+
+        Args
+            after: only yield conversations whose id sorts after this cursor
+
+        Yields
+            Dicts with id, config, message_count and update_time
+        """
+        for summary in sorted(self.list_conversations(), key = lambda x: x['id']):
+            if after is None or summary['id'] > after:
+                yield summary
+
+    def get_messages(self, conversation_id: str, seqs: List[int]) -> List[Dict[str, Any]]:
+        """
+        Load specific messages by sequence number.
+
+        Args
+            conversation_id: conversation to read
+            seqs: sequence numbers to load
+
+        Returns
+            The matching messages in sequence order, each with its 'seq'
+        """
+        data = self.load(conversation_id)
+        if data is None:
+            return []
+
+        wanted = set(seqs)
+        return [dict(message, seq = seq) for seq, message in enumerate(data['messages']) if seq in wanted]
+
+    def get_config(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the configuration a conversation was created with.
+
+        Args
+            conversation_id: conversation to look up
+
+        Returns
+            Config dict, or None if the conversation does not exist
+        """
+        data = self.load(conversation_id)
+        return data['config'] if data else None
+
+
+class JsonConversationStore(ConversationStore):
+    def __init__(self, directory: str):
+        """
+        Initialize a file-backed conversation store.
+
+        Every conversation is saved as one JSON file. Writes are serialized per
+        conversation with a thread lock and, where available, an advisory file
+        lock so that several server processes can share the same directory.
+
+        Args
+            directory: folder that holds the conversation files
+        """
+        super().__init__()
+        self.directory = directory
+        self.lock_directory = os.path.join(directory, '.locks')
+        os.makedirs(self.lock_directory, exist_ok = True)
+
+        #one thread lock per conversation id
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, conversation_id: str) -> str:
+        """Resolve the file path of a conversation"""
+        if not is_valid_conversation_id(conversation_id):
+            raise ValueError(f"Invalid conversation id: {conversation_id!r}")
+        return os.path.join(self.directory, f"{conversation_id}.json")
+
+    def _thread_lock(self, conversation_id: str) -> threading.Lock:
+        """Get or create the thread lock for a conversation"""
+        with self._locks_guard:
+            if conversation_id not in self._locks:
+                self._locks[conversation_id] = threading.Lock()
+            return self._locks[conversation_id]
+
+    @contextmanager
+    def lock(self, conversation_id: str):
+        """
+        Hold exclusive access to a conversation across threads and processes.
+
+        Args
+            conversation_id: conversation to lock
+        """
+        self._path(conversation_id)
+        with self._thread_lock(conversation_id):
+            if fcntl is None:
+                yield
+                return
+
+            lock_path = os.path.join(self.lock_directory, f"{conversation_id}.lock")
+            with open(lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _read(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Read a conversation file without locking"""
+        filepath = self._path(conversation_id)
+        if not os.path.exists(filepath):
+            return None
+
+        with open(filepath, 'r') as f:
+            data = json.load(f)
+
+        #files written before versioning was added start at version 0
+        data.setdefault('version', 0)
+        return data
+
+    def _write(self, data: Dict[str, Any]):
+        """Atomically replace a conversation file so readers never see partial JSON"""
+        filepath = self._path(data['id'])
+        fd, tmp_path = tempfile.mkstemp(dir = self.directory, prefix = '.tmp_', suffix = '.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, filepath)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a conversation.
+
+        Args
+            conversation_id: conversation to load
+
+        Returns
+            Conversation dict, or None if it does not exist
+        """
+        if not is_valid_conversation_id(conversation_id):
+            return None
+        return self._read(conversation_id)
+
+    def save(self, conversation_id: str, messages: List[Dict[str, Any]], config: Dict[str, Any],
+             expected_version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Save a full conversation, optionally checking its version first.
+
+        Args
+            conversation_id: conversation to save
+            messages: complete list of messages
+            config: session configuration
+            expected_version: version the caller read, or None to overwrite unconditionally
+
+        Returns
+            The saved conversation dict
+
+        Raises
+            ConflictError: if expected_version does not match the stored version
+        """
+        with self.lock(conversation_id):
+            current = self._read(conversation_id)
+            current_version = current['version'] if current else 0
+
+            if expected_version is not None and expected_version != current_version:
+                raise ConflictError(
+                    f"Conversation {conversation_id} is at version {current_version}, expected {expected_version}")
+
+            data = {
+                'id': conversation_id,
+                'messages': messages,
+                'config': config,
+                'update_time': datetime.now().isoformat(),
+                'version': current_version + 1
+            }
+            self._write(data)
+            return data
+
+    def append_messages(self, conversation_id: str, messages: List[Dict[str, Any]],
+                        config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Append messages to a conversation under its lock.
+
+        Concurrent callers never lose each other's messages because the read and
+        the write happen while holding the conversation lock.
+
+        Args
+            conversation_id: conversation to extend
+            messages: new messages to add
+            config: configuration used if the conversation does not exist yet
+
+        Returns
+            Summary of the saved conversation
+        """
+        with self.lock(conversation_id):
+            current = self._read(conversation_id) or {
+                'id': conversation_id,
+                'messages': [],
+                'config': config or {},
+                'version': 0
+            }
+
+            start = len(current['messages'])
+            current['messages'].extend(messages)
+            current['update_time'] = datetime.now().isoformat()
+            current['version'] += 1
+            self._write(current)
+
+        self._notify(conversation_id, messages, start, current['config'])
+        return {
+            'id': conversation_id,
+            'config': current['config'],
+            'update_time': current['update_time'],
+            'version': current['version'],
+            'message_count': len(current['messages']),
+            'start_seq': start
+        }
+
+    def delete(self, conversation_id: str, expected_version: Optional[int] = None) -> bool:
+        """Delete a conversation file under its lock"""
+        with self.lock(conversation_id):
+            current = self._read(conversation_id)
+            if current is None or (expected_version is not None and current['version'] != expected_version):
+                return False
+
+            os.remove(self._path(conversation_id))
+            return True
+
+    def list_conversations(self) -> List[Dict[str, Any]]:
+        """
+        Summarize all stored conversations.
+
+        Returns
+            List of dicts with id, config, message_count and update_time
+        """
+        conversations = []
+
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json') or filename.startswith('.'):
+                continue
+
+            filepath = os.path.join(self.directory, filename)
+            try:
+                with open(filepath, 'r') as f:
+                    data = json.load(f)
+                    conversations.append({
+                        'id': data['id'],
+                        'config': data['config'],
+                        'message_count': len(data['messages']),
+                        'update_time': data.get('update_time', '')
+                    })
+            except Exception as e:
+                print(f"Error loading conversation {filename}: {e}")
+                continue
+
+        return conversations
+
+
+class SQLiteConversationStore(ConversationStore):
+    def __init__(self, path: str):
+        """
+        Initialize a SQLite-backed conversation store.
+
+        Messages are stored one row per message, so appending a turn never
+        rewrites the transcript. The database runs in WAL mode and every write
+        takes the database write lock, which lets several worker processes on
+        one node share the same file safely.
+
+        Args
+            path: location of the SQLite database file
+        """
+        super().__init__()
+        self.path = path
+
+        #sqlite connections may not be shared across threads
+        self._local = threading.local()
+
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id TEXT PRIMARY KEY,
+                    config TEXT NOT NULL,
+                    update_time TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    message_count INTEGER NOT NULL DEFAULT 0
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    conversation_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    metadata TEXT,
+                    PRIMARY KEY (conversation_id, seq)
+                )""")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection owned by the current thread"""
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            #autocommit mode, transactions are opened explicitly
+            conn = sqlite3.connect(self.path, timeout = 30, isolation_level = None)
+            conn.row_factory = sqlite3.Row
+            enable_wal(conn)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements in a write transaction, holding the database write lock"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _row_to_message(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Rebuild a message dict from its row"""
+        message = json.loads(row['metadata']) if row['metadata'] else {}
+        message['role'] = row['role']
+        message['content'] = row['content']
+        return message
+
+    def _insert_messages(self, conn: sqlite3.Connection, conversation_id: str, start: int,
+                         messages: List[Dict[str, Any]]):
+        """Insert messages with consecutive sequence numbers"""
+        rows = []
+        for offset, message in enumerate(messages):
+            metadata = {k: v for k, v in message.items() if k not in ('role', 'content')}
+            rows.append((conversation_id, start + offset, message.get('role', 'unknown'),
+                         message.get('content', ''), json.dumps(metadata) if metadata else None))
+
+        conn.executemany(
+            'INSERT INTO messages (conversation_id, seq, role, content, metadata) VALUES (?, ?, ?, ?, ?)',
+            rows)
+
+    def load(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a conversation.
+
+        Args
+            conversation_id: conversation to load
+
+        Returns
+            Conversation dict, or None if it does not exist
+        """
+        conn = self._connection()
+        row = conn.execute('SELECT * FROM conversations WHERE id = ?', (conversation_id,)).fetchone()
+        if row is None:
+            return None
+
+        rows = conn.execute(
+            'SELECT role, content, metadata FROM messages WHERE conversation_id = ? ORDER BY seq',
+            (conversation_id,)).fetchall()
+
+        return {
+            'id': row['id'],
+            'messages': [self._row_to_message(r) for r in rows],
+            'config': json.loads(row['config']),
+            'update_time': row['update_time'],
+            'version': row['version']
+        }
+
+    def load_messages(self, conversation_id: str, limit: int, before: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Load one page of messages using the (conversation_id, seq) primary key.
+
+        Args
+            conversation_id: conversation to read
+            limit: maximum number of messages to return
+            before: only return messages with a sequence number below this cursor
+
+        Returns
+            Dict with 'messages', 'message_count' and 'next_cursor', or None if
+            the conversation does not exist
+        """
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT message_count FROM conversations WHERE id = ?', (conversation_id,)).fetchone()
+        if row is None:
+            return None
+
+        if before is None:
+            before = row['message_count']
+
+        rows = conn.execute(
+            'SELECT seq, role, content, metadata FROM messages WHERE conversation_id = ? AND seq < ? '
+            'ORDER BY seq DESC LIMIT ?',
+            (conversation_id, before, limit)).fetchall()
+
+        page = [dict(self._row_to_message(r), seq = r['seq']) for r in reversed(rows)]
+        oldest = page[0]['seq'] if page else 0
+        return {
+            'messages': page,
+            'message_count': row['message_count'],
+            'next_cursor': oldest if oldest > 0 else None
+        }
+
+    def get_messages(self, conversation_id: str, seqs: List[int]) -> List[Dict[str, Any]]:
+        """Load specific messages by sequence number with primary key lookups"""
+        if not seqs:
+            return []
+
+        placeholders = ', '.join('?' for _ in seqs)
+        rows = self._connection().execute(
+            f'SELECT seq, role, content, metadata FROM messages WHERE conversation_id = ? AND seq IN ({placeholders}) '
+            'ORDER BY seq',
+            [conversation_id] + list(seqs)).fetchall()
+        return [dict(self._row_to_message(r), seq = r['seq']) for r in rows]
+
+    def get_config(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Get a conversation's config without reading its messages"""
+        row = self._connection().execute(
+            'SELECT config FROM conversations WHERE id = ?', (conversation_id,)).fetchone()
+        return json.loads(row['config']) if row else None
+
+    def save(self, conversation_id: str, messages: List[Dict[str, Any]], config: Dict[str, Any],
+             expected_version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Save a full conversation, optionally checking its version first.
+
+        Args
+            conversation_id: conversation to save
+            messages: complete list of messages
+            config: session configuration
+            expected_version: version the caller read, or None to overwrite unconditionally
+
+        Returns
+            The saved conversation dict
+
+        Raises
+            ConflictError: if expected_version does not match the stored version
+        """
+        update_time = datetime.now().isoformat()
+
+        with self._transaction() as conn:
+            row = conn.execute('SELECT version FROM conversations WHERE id = ?', (conversation_id,)).fetchone()
+            current_version = row['version'] if row else 0
+
+            if expected_version is not None and expected_version != current_version:
+                raise ConflictError(
+                    f"Conversation {conversation_id} is at version {current_version}, expected {expected_version}")
+
+            conn.execute(
+                'INSERT OR REPLACE INTO conversations (id, config, update_time, version, message_count) VALUES (?, ?, ?, ?, ?)',
+                (conversation_id, json.dumps(config), update_time, current_version + 1, len(messages)))
+            conn.execute('DELETE FROM messages WHERE conversation_id = ?', (conversation_id,))
+            self._insert_messages(conn, conversation_id, 0, messages)
+
+        return {
+            'id': conversation_id,
+            'messages': messages,
+            'config': config,
+            'update_time': update_time,
+            'version': current_version + 1
+        }
+
+    def append_messages(self, conversation_id: str, messages: List[Dict[str, Any]],
+                        config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Append messages to a conversation in a single write transaction.
+
+        Args
+            conversation_id: conversation to extend
+            messages: new messages to add
+            config: configuration used if the conversation does not exist yet
+
+        Returns
+            Summary of the saved conversation
+        """
+        update_time = datetime.now().isoformat()
+
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT config, version, message_count FROM conversations WHERE id = ?', (conversation_id,)).fetchone()
+
+            if row is None:
+                stored_config = config or {}
+                conn.execute(
+                    'INSERT INTO conversations (id, config, update_time, version, message_count) VALUES (?, ?, ?, 0, 0)',
+                    (conversation_id, json.dumps(stored_config), update_time))
+                start = 0
+                version = 0
+            else:
+                stored_config = json.loads(row['config'])
+                start = row['message_count']
+                version = row['version']
+
+            self._insert_messages(conn, conversation_id, start, messages)
+            conn.execute(
+                'UPDATE conversations SET update_time = ?, version = version + 1, message_count = ? WHERE id = ?',
+                (update_time, start + len(messages), conversation_id))
+
+        self._notify(conversation_id, messages, start, stored_config)
+        return {
+            'id': conversation_id,
+            'config': stored_config,
+            'update_time': update_time,
+            'version': version + 1,
+            'message_count': start + len(messages),
+            'start_seq': start
+        }
+
+    def delete(self, conversation_id: str, expected_version: Optional[int] = None) -> bool:
+        """Delete a conversation and its messages in one transaction"""
+        with self._transaction() as conn:
+            row = conn.execute('SELECT version FROM conversations WHERE id = ?', (conversation_id,)).fetchone()
+            if row is None or (expected_version is not None and row['version'] != expected_version):
+                return False
+
+            conn.execute('DELETE FROM messages WHERE conversation_id = ?', (conversation_id,))
+            conn.execute('DELETE FROM conversations WHERE id = ?', (conversation_id,))
+            return True
+
+    def list_conversations(self) -> List[Dict[str, Any]]:
+        """
+        Summarize all stored conversations.
+
+        Returns
+            List of dicts with id, config, message_count and update_time
+        """
+        rows = self._connection().execute(
+            'SELECT id, config, message_count, update_time FROM conversations').fetchall()
+
+        return [{
+            'id': row['id'],
+            'config': json.loads(row['config']),
+            'message_count': row['message_count'],
+            'update_time': row['update_time']
+        } for row in rows]
+
+    def iter_summaries(self, after: Optional[str] = None, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Iterate over conversation summaries in id order, one page of rows at a time"""
+        while True:
+            rows = self._connection().execute(
+                'SELECT id, config, message_count, update_time FROM conversations WHERE id > ? ORDER BY id LIMIT ?',
+                (after or '', page_size)).fetchall()
+
+            for row in rows:
+                yield {
+                    'id': row['id'],
+                    'config': json.loads(row['config']),
+                    'message_count': row['message_count'],
+                    'update_time': row['update_time']
+                }
+
+            if len(rows) < page_size:
+                return
+            after = rows[-1]['id']
+
+    def import_json_directory(self, directory: str) -> int:
+        """
+        Import conversations saved as JSON files by older versions.
+
+        Files whose conversation already exists in the database are skipped,
+        so this is safe to run on every start.
+
+        Args
+            directory: folder containing "<id>.json" conversation files
+
+        Returns
+            Number of conversations imported
+        """
+        imported = 0
+        conn = self._connection()
+
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json') or filename.startswith('.'):
+                continue
+
+            conversation_id = filename[:-len('.json')]
+            if conn.execute('SELECT 1 FROM conversations WHERE id = ?', (conversation_id,)).fetchone():
+                continue
+
+            try:
+                with open(os.path.join(directory, filename), 'r') as f:
+                    data = json.load(f)
+
+                with self._transaction() as tx:
+                    tx.execute(
+                        'INSERT OR IGNORE INTO conversations (id, config, update_time, version, message_count) VALUES (?, ?, ?, 1, ?)',
+                        (conversation_id, json.dumps(data.get('config', {})),
+                         data.get('update_time', datetime.now().isoformat()), len(data.get('messages', []))))
+                    self._insert_messages(tx, conversation_id, 0, data.get('messages', []))
+                imported += 1
+            except sqlite3.IntegrityError:
+                #another worker imported the same file concurrently
+                continue
+            except Exception as e:
+                print(f"Error importing conversation {filename}: {e}")
+                continue
+
+        return imported
@@ -0,0 +1,280 @@
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+from agents.tutor_agent import TutorAgent
+from resources.conversation_store import enable_wal
+from resources.metrics import metrics
+
+DIFFICULTIES = ["beginner", "intermediate", "advanced"]
+
+#topics stocked in the bank, with the words that identify them in a request
+TOPICS = {
+    'variables': ['variable', 'variables', 'data type', 'data types'],
+    'conditionals': ['conditional', 'conditionals', 'if statement', 'if statements', 'if/else', 'branching'],
+    'loops': ['loop', 'loops', 'for loop', 'while loop', 'iteration'],
+    'functions': ['function', 'functions', 'method', 'methods', 'parameters'],
+    'strings': ['string', 'strings', 'text processing'],
+    'arrays': ['array', 'arrays', 'list', 'lists', 'slice', 'slices', 'vector', 'vectors'],
+    'maps': ['dictionary', 'dictionaries', 'map', 'maps', 'hash map', 'hashmap'],
+    'recursion': ['recursion', 'recursive'],
+    'classes': ['class', 'classes', 'object', 'objects', 'oop', 'struct', 'structs'],
+    'error handling': ['error handling', 'exception', 'exceptions', 'errors'],
+    'pointers': ['pointer', 'pointers', 'memory', 'references'],
+    'file io': ['file', 'files', 'file io', 'reading files', 'writing files'],
+    'sorting': ['sort', 'sorting', 'search', 'searching']
+}
+
+DIFFICULTY_WORDS = {
+    'beginner': ['beginner', 'easy', 'simple', 'basic', 'intro', 'introductory'],
+    'intermediate': ['intermediate', 'medium', 'moderate'],
+    'advanced': ['advanced', 'hard', 'difficult', 'challenging', 'expert']
+}
+
+#a request must ask for practice material to be served from the bank
+EXERCISE_REQUEST_PATTERN = re.compile(r'\b(exercises?|practice|problems?|challenges?|quiz|drills?)\b', re.IGNORECASE)
+
+#requests containing code or answers are about the student's own work and always go to the LLM
+NOVEL_REQUEST_PATTERN = re.compile(r'```|\b(my answer|my solution|my code|hint|stuck|solution to)\b', re.IGNORECASE)
+
+#comparisons and references to earlier turns depend on the conversation, which the bank does not see
+FOLLOW_UP_PATTERN = re.compile(
+    r'\b(harder|easier|tougher|simpler|trickier|more|less|(?:a )?(?:little|bit) (?:more|less)|'
+    r'step up|next (?:one|level)|another one|one more|similar|same|again|previous|last one|'
+    r'like (?:that|this|the last)|that one|this one)\b', re.IGNORECASE)
+
+#user input sent to the exercise prompt when stocking the bank
+GENERATION_REQUEST = "Create one {difficulty} practice exercise about {topic} in {language}."
+
+
+def _word_pattern(words: List[str]) -> re.Pattern:
+    return re.compile(r'\b(' + '|'.join(re.escape(w) for w in words) + r')\b', re.IGNORECASE)
+
+_TOPIC_PATTERNS = {topic: _word_pattern(words) for topic, words in TOPICS.items()}
+_DIFFICULTY_PATTERNS = {level: _word_pattern(words) for level, words in DIFFICULTY_WORDS.items()}
+
+
+def match_request(text: str) -> Optional[Tuple[str, str]]:
+    """
+    Decide whether a student's message can be answered from the bank.
+
+    Only plain requests for practice on exactly one known topic match.
+    Requests that compare with or refer back to earlier exercises ("a harder
+    one", "something similar") need the conversation and never match. The
+    difficulty defaults to beginner, as the exercise prompt itself does.
+
+    Args
+        text: the student's message
+
+    Returns
+        (topic, difficulty) tuple, or None for requests that need live generation
+    """
+    if not EXERCISE_REQUEST_PATTERN.search(text) or NOVEL_REQUEST_PATTERN.search(text):
+        return None
+    if FOLLOW_UP_PATTERN.search(text):
+        return None
+
+    topics = [topic for topic, pattern in _TOPIC_PATTERNS.items() if pattern.search(text)]
+    if len(topics) != 1:
+        return None
+
+    levels = [level for level, pattern in _DIFFICULTY_PATTERNS.items() if pattern.search(text)]
+    if len(levels) > 1:
+        return None
+
+    return topics[0], levels[0] if levels else 'beginner'
+
+
+class ExerciseBank:
+    def __init__(self, path: str, llm_factory: Optional[Callable[[], Any]] = None,
+                 low_watermark: int = 3, refill_count: int = 5, refill_workers: int = 1,
+                 llm_slot: Optional[Callable[[], Any]] = None):
+        """
+        Pre-generated exercises per (language, topic, difficulty).
+
+        Each served exercise is removed from the bank so students get different
+        problems. When a key runs low it is queued for a refill, which a small
+        background pool generates using the same exercise prompt as the live tutor.
+
+        Args
+            path: location of the SQLite database file
+            llm_factory: returns the LLM used for refills, refills are disabled without it
+            low_watermark: refill a key once it holds fewer exercises than this
+            refill_count: exercises generated per refill
+            refill_workers: refills generated at once by this process
+            llm_slot: optional context manager factory held around every refill
+                      generation, e.g. the live turns' slots, so refills share their
+                      limit on concurrent LLM calls
+        """
+        self.path = path
+        self.llm_factory = llm_factory
+        self.low_watermark = low_watermark
+        self.refill_count = refill_count
+        self.llm_slot = llm_slot or nullcontext
+
+        #keys currently queued or being refilled by this process
+        self._refilling = set()
+        self._refilling_lock = threading.Lock()
+        self._refill_pool = ThreadPoolExecutor(max_workers = refill_workers, thread_name_prefix = 'exercise-refill')
+        self._local = threading.local()
+
+        #served from request threads concurrently
+        self._counts_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._connection().execute("""
+            CREATE TABLE IF NOT EXISTS exercises (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                language TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                content TEXT NOT NULL,
+                create_time TEXT NOT NULL
+            )""")
+        self._connection().execute(
+            'CREATE INDEX IF NOT EXISTS exercises_key ON exercises (language, topic, difficulty)')
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection owned by the current thread"""
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout = 30, isolation_level = None)
+            enable_wal(conn)
+            self._local.connection = conn
+        return conn
+
+    def add(self, language: str, topic: str, difficulty: str, content: str):
+        """Store a generated exercise"""
+        self._connection().execute(
+            'INSERT INTO exercises (language, topic, difficulty, content, create_time) VALUES (?, ?, ?, ?, ?)',
+            (language, topic, difficulty, content, datetime.now().isoformat()))
+
+    def count(self, language: str, topic: str, difficulty: str) -> int:
+        """Number of stored exercises for a key"""
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM exercises WHERE language = ? AND topic = ? AND difficulty = ?',
+            (language, topic, difficulty)).fetchone()[0]
+
+    def take(self, language: str, topic: str, difficulty: str) -> Optional[str]:
+        """
+        Remove and return the oldest stored exercise for a key.
+
+        Returns
+            Exercise text, or None if the key is empty
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT id, content FROM exercises WHERE language = ? AND topic = ? AND difficulty = ? '
+                'ORDER BY id LIMIT 1',
+                (language, topic, difficulty)).fetchone()
+            if row:
+                conn.execute('DELETE FROM exercises WHERE id = ?', (row[0],))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        return row[1] if row else None
+
+    def generate(self, llm, language: str, topic: str, difficulty: str, count: int) -> int:
+        """
+        Generate exercises with the tutor's exercise prompt and store them.
+
+        Args
+            llm: language model to generate with
+            language: programming language
+            topic: topic from TOPICS
+            difficulty: level from DIFFICULTIES
+            count: number of exercises to generate
+
+        Returns
+            Number of exercises stored
+        """
+        tutor = TutorAgent(llm, mode_config = {'language': language, 'mode': 'exercises'})
+        agent_input = {
+            'user_input': GENERATION_REQUEST.format(difficulty = difficulty, topic = topic, language = language),
+            'conversation_history': ''
+        }
+
+        stored = 0
+        for _ in range(count):
+            with self.llm_slot():
+                response = tutor(agent_input)[tutor.get_agent_name()]
+            content = response.content if hasattr(response, 'content') else str(response)
+            if content.strip():
+                self.add(language, topic, difficulty, content)
+                stored += 1
+        return stored
+
+    def serve(self, language: str, text: str) -> Optional[str]:
+        """
+        Answer an exercise request from the bank when possible.
+
+        Args
+            language: the session's programming language
+            text: the student's message
+
+        Returns
+            A stored exercise, or None when the request needs live generation
+        """
+        key = match_request(text)
+        if key is None:
+            return None
+
+        topic, difficulty = key
+        exercise = self.take(language, topic, difficulty)
+
+        with self._counts_lock:
+            if exercise is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if self.count(language, topic, difficulty) < self.low_watermark:
+            self._refill_in_background(language, topic, difficulty)
+
+        return exercise
+
+    def _refill_in_background(self, language: str, topic: str, difficulty: str):
+        """Queue a refill for a key unless one is already queued or running"""
+        if self.llm_factory is None:
+            return
+
+        key = (language, topic, difficulty)
+        with self._refilling_lock:
+            if key in self._refilling:
+                return
+            self._refilling.add(key)
+
+        def refill():
+            try:
+                stored = self.generate(self.llm_factory(), language, topic, difficulty, self.refill_count)
+                metrics.increment('exercise_bank.refilled', stored)
+            except Exception as e:
+                metrics.increment('exercise_bank.refill_errors')
+                print(f"Error refilling exercise bank for {'/'.join(key)}: {e}")
+            finally:
+                with self._refilling_lock:
+                    self._refilling.discard(key)
+
+        metrics.increment('exercise_bank.refills_queued')
+        self._refill_pool.submit(refill)
+
+    def stats(self) -> Dict[str, Any]:
+        """Stored exercise counts per key and this process's hit/miss counts"""
+        rows = self._connection().execute(
+            'SELECT language, topic, difficulty, COUNT(*) FROM exercises GROUP BY language, topic, difficulty').fetchall()
+        with self._counts_lock:
+            hits, misses = self.hits, self.misses
+        return {
+            'stored': {f"{language}/{topic}/{difficulty}": count for language, topic, difficulty, count in rows},
+            'hits': hits,
+            'misses': misses
+        }
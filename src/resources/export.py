@@ -0,0 +1,86 @@
+import json
+from typing import Dict, Any, Optional, Iterator
+
+#config keys the export can be filtered on
+CONFIG_FILTERS = {
+    'language': 'language',
+    'mode': 'mode',
+    'orchestration': 'orchestration_type'
+}
+
+
+def matches_filters(summary: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """
+    Check a conversation summary against export filters.
+
+    Args
+        summary: dict with 'config' and 'update_time'
+        filters: optional 'since' and 'until' (ISO dates or times, matched against
+                 the last update, until is exclusive) and 'language', 'mode',
+                 'orchestration' values
+
+    Returns
+        True if the conversation should be exported
+    """
+    update_time = summary.get('update_time', '')
+    if filters.get('since') and update_time < filters['since']:
+        return False
+    if filters.get('until') and update_time >= filters['until']:
+        return False
+
+    config = summary.get('config') or {}
+    for name, key in CONFIG_FILTERS.items():
+        if filters.get(name) and config.get(key) != filters[name]:
+            return False
+    return True
+
+
+def export_conversations(store, filters: Optional[Dict[str, Any]] = None, after: Optional[str] = None,
+                         limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream conversations out of a store one at a time, in id order.
+
+    Only one conversation is held in memory at once, however large the store
+    and its archive grow. Each record's 'id' doubles as the cursor: pass the id
+    of the last record received as 'after' to resume an interrupted export.
+
+    Args
+        store: ConversationStore to read
+        filters: see matches_filters
+        after: cursor, only conversations whose id sorts after it are exported
+        limit: maximum number of conversations, None for all
+
+    Yields
+        Dicts with id, config, update_time, message_count, archived and
+        messages (each with its 'seq' and any per-turn metadata such as
+        'stage_timings')
+    """
+    filters = filters or {}
+    exported = 0
+
+    for summary in store.iter_summaries(after):
+        if limit is not None and exported >= limit:
+            return
+        if not matches_filters(summary, filters):
+            continue
+
+        data = store.load(summary['id'])
+        if data is None:
+            #deleted while the export was running
+            continue
+
+        exported += 1
+        yield {
+            'id': summary['id'],
+            'config': data.get('config', {}),
+            'update_time': data.get('update_time'),
+            'message_count': len(data.get('messages', [])),
+            'archived': summary.get('archived', False),
+            'messages': [dict(message, seq = seq) for seq, message in enumerate(data.get('messages', []))]
+        }
+
+
+def to_ndjson(records: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    """Encode records as newline-delimited JSON lines"""
+    for record in records:
+        yield json.dumps(record) + '\n'
@@ -0,0 +1,178 @@
+import re
+import time
+import math
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from resources.metrics import metrics
+
+#specialized tutor modes a turn can be routed to
+INTENTS = ["debug", "examples", "exercises", "fundamentals", "feedback"]
+
+#returned when no specialized mode is confident enough
+FALLBACK_INTENT = "adaptive"
+
+#keyword features, each a regular expression over the lowercased message
+KEYWORD_FEATURES = {
+    'error_words': r"\b(error|errors|exception|traceback|bug|bugs|crash\w*|fails?|failing|broken|wrong|doesn'?t work|not working|segfault|undefined|nullpointer)\b",
+    'fix_words': r"\b(fix|debug|why does|why is|what'?s wrong)\b",
+    'example_words': r"\b(example|examples|show me|demonstrate|sample|snippet|implement\w*|how (do|would|can) i (write|use|make|create))\b",
+    'exercise_words': r"\b(exercises?|practice|quiz|challenges?|problems? to solve|test me|drills?|homework)\b",
+    'fundamental_words': r"\b(what is|what are|explain|concepts?|basics?|fundamentals?|difference between|how does|meaning of|understand)\b",
+    'feedback_words': r"\b(review|feedback|is this (correct|right|good)|did i|my understanding|am i right|check my|improve my|critique|better way)\b",
+    'output_words': r"\b(output|prints?|returns?|result)\b",
+}
+
+#patterns suggesting that a message contains code
+CODE_LINE_PATTERN = re.compile(
+    r"(^\s*(def |class |for |while |if |return |import |#include|func |public |int |fn |let |var |const ))|[;{}]\s*$",
+    re.MULTILINE)
+
+FEATURE_NAMES = ['bias', 'code_fence', 'code_lines', 'question', 'length'] + list(KEYWORD_FEATURES)
+
+_KEYWORD_PATTERNS = [re.compile(pattern) for pattern in KEYWORD_FEATURES.values()]
+
+
+def extract_features(text: str) -> np.ndarray:
+    """
+    Turn a student's message into a small feature vector.
+
+    Args
+        text: the student's message
+
+    Returns
+        Float vector ordered as FEATURE_NAMES
+    """
+    lowered = text.lower()
+    code_lines = len(CODE_LINE_PATTERN.findall(text))
+
+    values = [
+        1.0,
+        1.0 if '```' in text else 0.0,
+        min(code_lines, 5) / 5.0,
+        1.0 if '?' in text else 0.0,
+        min(math.log1p(len(text)) / math.log1p(2000), 1.0)
+    ]
+    values.extend(1.0 if pattern.search(lowered) else 0.0 for pattern in _KEYWORD_PATTERNS)
+    return np.array(values, dtype = np.float64)
+
+
+def _default_weights() -> np.ndarray:
+    """Hand-set weights used until a model is trained on logged turns"""
+    weights = np.zeros((len(INTENTS), len(FEATURE_NAMES)))
+    w = {name: i for i, name in enumerate(FEATURE_NAMES)}
+    row = {intent: i for i, intent in enumerate(INTENTS)}
+
+    weights[row['debug'], [w['error_words'], w['fix_words']]] = [3.0, 2.0]
+    weights[row['debug'], [w['code_fence'], w['code_lines']]] = [1.0, 1.0]
+    weights[row['examples'], w['example_words']] = 3.0
+    weights[row['exercises'], w['exercise_words']] = 4.0
+    weights[row['fundamentals'], [w['fundamental_words'], w['question']]] = [3.0, 0.5]
+    weights[row['fundamentals'], [w['code_fence'], w['code_lines']]] = [-1.0, -1.0]
+    weights[row['feedback'], w['feedback_words']] = 3.5
+    weights[row['feedback'], [w['code_fence'], w['code_lines']]] = [1.0, 0.5]
+    weights[row['feedback'], w['error_words']] = -1.0
+    return weights
+
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    shifted = np.exp(scores - scores.max(axis = -1, keepdims = True))
+    return shifted / shifted.sum(axis = -1, keepdims = True)
+
+
+class IntentRouter:
+    def __init__(self, weights: Optional[np.ndarray] = None, threshold: float = 0.5):
+        """
+        Local linear classifier that picks a specialized tutor mode for a turn.
+
+        Runs in microseconds before the LLM call, so adaptive sessions can send the
+        focused mode prompt instead of the general adaptive one.
+
+        Args
+            weights: (len(INTENTS), len(FEATURE_NAMES)) matrix, hand-set defaults when None
+            threshold: minimum probability to route, otherwise the adaptive prompt is kept
+        """
+        self.weights = weights if weights is not None else _default_weights()
+        self.threshold = threshold
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        Classify a message.
+
+        Returns
+            (intent, probability) tuple, intent is FALLBACK_INTENT when not confident
+        """
+        probabilities = _softmax(self.weights @ extract_features(text))
+        best = int(np.argmax(probabilities))
+
+        if probabilities[best] < self.threshold:
+            return FALLBACK_INTENT, float(probabilities[best])
+        return INTENTS[best], float(probabilities[best])
+
+    def route(self, text: str) -> str:
+        """
+        Pick the tutor mode for a turn, recording the decision and its latency.
+
+        Args
+            text: the student's message
+
+        Returns
+            One of INTENTS, or FALLBACK_INTENT
+        """
+        start = time.perf_counter()
+        intent, _ = self.predict(text)
+        metrics.observe('intent_router.latency', time.perf_counter() - start)
+        metrics.increment(f"intent_router.route.{intent}")
+        return intent
+
+    def train(self, texts: List[str], labels: List[str], epochs: int = 300,
+              learning_rate: float = 0.5, l2: float = 1e-3) -> Dict[str, Any]:
+        """
+        Fit the weights with multinomial logistic regression.
+
+        Args
+            texts: logged student messages
+            labels: the mode each message was answered in, one of INTENTS
+            epochs: full-batch gradient descent steps
+            learning_rate: step size
+            l2: weight decay
+
+        Returns
+            Dict with the training accuracy and example count
+        """
+        features = np.stack([extract_features(text) for text in texts])
+        targets = np.zeros((len(labels), len(INTENTS)))
+        targets[np.arange(len(labels)), [INTENTS.index(label) for label in labels]] = 1.0
+
+        #start from the hand-set weights so sparse classes keep sensible behaviour
+        weights = _default_weights()
+        for _ in range(epochs):
+            probabilities = _softmax(features @ weights.T)
+            gradient = (probabilities - targets).T @ features / len(texts) + l2 * weights
+            weights -= learning_rate * gradient
+
+        self.weights = weights
+        predictions = np.argmax(features @ weights.T, axis = 1)
+        return {
+            'examples': len(texts),
+            'accuracy': float(np.mean(predictions == targets.argmax(axis = 1)))
+        }
+
+    def save(self, path: str):
+        """Save the weights to a .npz file"""
+        np.savez(path, weights = self.weights, feature_names = np.array(FEATURE_NAMES),
+                 intents = np.array(INTENTS), threshold = self.threshold)
+
+    def load(self, path: str):
+        """Load weights saved by save(), ignoring files made for a different feature set"""
+        data = np.load(path)
+        if list(data['feature_names']) != FEATURE_NAMES or list(data['intents']) != INTENTS:
+            print(f"Ignoring intent router model {path}: features have changed since it was trained")
+            return
+        self.weights = data['weights']
+        self.threshold = float(data['threshold'])
+
+
+#router shared by every tutor agent in the process
+default_router = IntentRouter()
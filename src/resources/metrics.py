@@ -0,0 +1,59 @@
+import threading
+from typing import Dict, Any, Optional
+
+
+class Metrics:
+    def __init__(self):
+        """Thread-safe, process-local counters and timing summaries"""
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._observations = {}
+
+    def increment(self, name: str, value: float = 1):
+        """
+        Add to a counter
+        
+        Args
+            name: dotted counter name, e.g. "singleflight.coalesced"
+            value: amount to add
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        """
+        Record one measurement, such as a latency in seconds
+        
+        Args
+            name: dotted measurement name
+            value: measured value
+        """
+        with self._lock:
+            summary = self._observations.setdefault(name, {'count': 0, 'sum': 0.0, 'max': 0.0})
+            summary['count'] += 1
+            summary['sum'] += value
+            summary['max'] = max(summary['max'], value)
+
+    def mean(self, name: str) -> Optional[float]:
+        """Average of a measurement so far, or None if it was never recorded"""
+        with self._lock:
+            summary = self._observations.get(name)
+            return summary['sum'] / summary['count'] if summary and summary['count'] else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Copy the current values
+        
+        Returns
+            Dict with 'counters' and 'observations' (count, sum, mean and max per name)
+        """
+        with self._lock:
+            observations = {
+                name: dict(summary, mean = summary['sum'] / summary['count'] if summary['count'] else 0.0)
+                for name, summary in self._observations.items()
+            }
+            return {'counters': dict(self._counters), 'observations': observations}
+
+
+#shared registry for the whole process
+metrics = Metrics()
@@ -29,12 +29,46 @@ class Parser:
         
         return str(tutor_result)
     
+    def format_conversation_history(self, messages: list) -> str:
+        """
+        Format conversation history for the LLM context
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            
+        Returns:
+            Formatted string with conversation history
+        """
+        if not messages:
+            return ""
+        
+        #format the conversation history for agent consumption
+        history_parts = []
+        previous_seq = None
+        for msg in messages:
+            role = msg.get('role', 'unknown')
+            content = msg.get('content', '')
+
+            #mark where older turns were left out of a selected history
+            seq = msg.get('seq')
+            if seq is not None and previous_seq is not None and seq > previous_seq + 1:
+                history_parts.append("[...]")
+            previous_seq = seq
+            
+            if role == 'user':
+                history_parts.append(f"Student: {content}")
+            elif role == 'tutor':
+                history_parts.append(f"Tutor: {content}")
+        
+        return "\n\n".join(history_parts)
+    
     def extract_code_blocks(self, text: str) -> list:
         """
         Extract code blocks from agent responses.
-        Uses markdown-formatted text to indicate code block locations.
+        Uses markdown-formatted text to indicate code block locations,
+        with or without a language tag (```java, ```c++, ```c#).
         """
         import re
-        pattern = r'```(?:python)?\n(.*?)```'
+        pattern = r'```[\w+#.-]*[ \t]*\n(.*?)```'
         matches = re.findall(pattern, text, re.DOTALL)
         return matches
\ No newline at end of file
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import random
+import cProfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from resources.conversation_store import generate_conversation_id
+from resources.metrics import metrics
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+#the profile being recorded on the current thread, if any
+_active = threading.local()
+
+#cProfile can only run one profiler at a time on newer Pythons
+_profiler_lock = threading.Lock()
+
+#span callers, one per span name
+_named_callers = {}
+
+
+class ActiveProfile:
+    def __init__(self, profile_id: str, name: str):
+        """
+        A request profile being recorded.
+
+        Args
+            profile_id: id used for the profile's files
+            name: what is being profiled, e.g. the route name
+        """
+        self.profile_id = profile_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.profiler = cProfile.Profile()
+
+        #(event, span name, seconds since start) with event "O" (open) or "C" (close)
+        self.events = []
+
+
+def _named_caller(name: str):
+    """
+    Get a function that calls its argument from a frame named after a span.
+
+    Calling through it makes each span show up as its own function in the
+    pstats output, so stages line up with the multi-agent pipeline.
+    """
+    caller = _named_callers.get(name)
+    if caller is None:
+        def caller(fn, *args, **kwargs):
+            return fn(*args, **kwargs)
+        code_name = f"span[{name}]"
+        try:
+            caller.__code__ = caller.__code__.replace(co_name = code_name, co_qualname = code_name)
+        except TypeError:
+            #co_qualname only exists on Python 3.11+
+            caller.__code__ = caller.__code__.replace(co_name = code_name)
+        _named_callers[name] = caller
+    return caller
+
+
+@contextmanager
+def span(name: str):
+    """
+    Mark a named stage in the current request profile.
+
+    Costs one attribute lookup when the request is not being profiled.
+
+    Args
+        name: stage name, e.g. "tutor_agent:initial"
+    """
+    profile = getattr(_active, 'profile', None)
+    if profile is None:
+        yield
+        return
+
+    profile.events.append(('O', name, time.perf_counter() - profile.start))
+    try:
+        yield
+    finally:
+        profile.events.append(('C', name, time.perf_counter() - profile.start))
+
+
+def run_in_span(name: str, fn, *args, **kwargs):
+    """
+    Call fn inside a named span, also visible as a named frame in pstats output.
+
+    Args
+        name: stage name
+        fn: function to call with the remaining arguments
+    """
+    if getattr(_active, 'profile', None) is None:
+        return fn(*args, **kwargs)
+
+    with span(name):
+        return _named_caller(name)(fn, *args, **kwargs)
+
+
+class RequestProfiler:
+    def __init__(self, directory: str, sample_rate: float = 0.0, max_profiles: int = 100,
+                 header: str = 'X-DDT-Profile'):
+        """
+        Opt-in per-request profiling.
+
+        A request is profiled when it carries the profiling header or is picked
+        by the sampling rate. Each profile is written as a pstats file with
+        function-level timings, plus a speedscope file showing the named stage
+        spans. Only the newest max_profiles profiles are kept.
+
+        Args
+            directory: folder where profiles are written
+            sample_rate: fraction of requests profiled without the header (0 to 1)
+            max_profiles: number of profiles kept before the oldest are deleted
+            header: request header that turns profiling on, e.g. "X-DDT-Profile: 1"
+        """
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_profiles = max_profiles
+        self.header = header
+        os.makedirs(directory, exist_ok = True)
+
+    def should_profile(self, headers: Optional[Dict[str, str]] = None) -> bool:
+        """Decide whether to profile a request"""
+        if headers is not None and headers.get(self.header, '').lower() in ('1', 'true', 'yes'):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, name: str, enabled: bool = True):
+        """
+        Profile the enclosed block on the current thread.
+
+        Yields
+            The ActiveProfile, or None when the block is not profiled
+        """
+        if not enabled or getattr(_active, 'profile', None) is not None:
+            yield None
+            return
+
+        #skip rather than wait when another request is already being profiled
+        if not _profiler_lock.acquire(blocking = False):
+            metrics.increment('profiler.skipped_busy')
+            yield None
+            return
+
+        profile = ActiveProfile(generate_conversation_id(), name)
+        _active.profile = profile
+        try:
+            profile.profiler.enable()
+            try:
+                with span(name):
+                    yield profile
+            finally:
+                profile.profiler.disable()
+        finally:
+            _active.profile = None
+            _profiler_lock.release()
+
+        try:
+            self._write(profile)
+        except Exception as e:
+            print(f"Error writing profile {profile.profile_id}: {e}")
+
+    def _write(self, profile: ActiveProfile):
+        """Write a finished profile and rotate old ones"""
+        base = os.path.join(self.directory, profile.profile_id)
+        profile.profiler.dump_stats(f"{base}.pstats")
+
+        with open(f"{base}.speedscope.json", 'w') as f:
+            json.dump(self._speedscope(profile), f)
+
+        metrics.increment('profiler.profiles_written')
+        self._rotate()
+
+    def _speedscope(self, profile: ActiveProfile) -> Dict[str, Any]:
+        """Convert the recorded spans to speedscope's evented format, in milliseconds"""
+        frames = []
+        frame_index = {}
+        events = []
+
+        for event, name, at in profile.events:
+            if name not in frame_index:
+                frame_index[name] = len(frames)
+                frames.append({'name': name})
+            events.append({'type': event, 'frame': frame_index[name], 'at': at * 1000.0})
+
+        end = events[-1]['at'] if events else 0.0
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': f"{profile.name} {datetime.now().isoformat()}",
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'evented',
+                'name': profile.name,
+                'unit': 'milliseconds',
+                'startValue': 0.0,
+                'endValue': end,
+                'events': events
+            }]
+        }
+
+    def _rotate(self):
+        """Delete the oldest profiles beyond max_profiles"""
+        profile_ids = sorted({filename.split('.')[0] for filename in os.listdir(self.directory)
+                              if filename.endswith('.pstats') or filename.endswith('.speedscope.json')})
+
+        for profile_id in profile_ids[:max(0, len(profile_ids) - self.max_profiles)]:
+            for suffix in ('.pstats', '.speedscope.json'):
+                path = os.path.join(self.directory, profile_id + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def list_profiles(self) -> List[str]:
+        """Ids of the stored profiles, newest first"""
+        return sorted({filename.split('.')[0] for filename in os.listdir(self.directory)
+                       if filename.endswith('.pstats')}, reverse = True)
@@ -0,0 +1,232 @@
+import html
+import re
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+from resources.metrics import metrics
+from resources.conversation_store import enable_wal
+
+#snippet markers, swapped for <mark> tags after escaping; they are stripped from indexed text
+_MARK_OPEN = '\x02'
+_MARK_CLOSE = '\x03'
+_MARKERS = str.maketrans('', '', _MARK_OPEN + _MARK_CLOSE)
+
+#bumped when indexed content needs rewriting
+SCHEMA_VERSION = 1
+
+#query terms; FTS5 operators typed by students are treated as plain words
+QUERY_TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+#filters accepted by search(), mapped to their columns
+FILTER_COLUMNS = {
+    'language': 'language',
+    'mode': 'mode',
+    'orchestration': 'orchestration',
+    'role': 'role'
+}
+
+
+def build_match_query(text: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query matching every term, the last one as a prefix.
+
+    Args
+        text: what the user typed
+
+    Returns
+        FTS5 MATCH expression, or None when the text has no searchable terms
+    """
+    terms = QUERY_TERM_PATTERN.findall(text)
+    if not terms:
+        return None
+
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+class SearchIndex:
+    def __init__(self, path: str):
+        """
+        Full-text index over every stored message, backed by SQLite FTS5.
+
+        The index lives in its own database next to the conversations and is
+        updated incrementally as messages are appended, so searching never
+        reads the conversation store. Results are ranked with BM25.
+
+        Args
+            path: location of the index database
+        """
+        self.path = path
+
+        #sqlite connections may not be shared across threads
+        self._local = threading.local()
+
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY,
+                    conversation_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    language TEXT,
+                    mode TEXT,
+                    orchestration TEXT,
+                    UNIQUE (conversation_id, seq)
+                )""")
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                    content,
+                    content = 'documents',
+                    content_rowid = 'id',
+                    tokenize = 'porter unicode61'
+                )""")
+
+            if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                self._strip_markers(conn)
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _strip_markers(self, conn: sqlite3.Connection):
+        """Remove snippet marker characters from documents indexed before they were stripped"""
+        rows = conn.execute(
+            "SELECT id, content FROM documents WHERE instr(content, char(2)) > 0 OR instr(content, char(3)) > 0").fetchall()
+        for row in rows:
+            content = row['content'].translate(_MARKERS)
+            conn.execute("INSERT INTO documents_fts (documents_fts, rowid, content) VALUES ('delete', ?, ?)",
+                         (row['id'], row['content']))
+            conn.execute('UPDATE documents SET content = ? WHERE id = ?', (content, row['id']))
+            conn.execute('INSERT INTO documents_fts (rowid, content) VALUES (?, ?)', (row['id'], content))
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection owned by the current thread"""
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            #autocommit mode, transactions are opened explicitly
+            conn = sqlite3.connect(self.path, timeout = 30, isolation_level = None)
+            conn.row_factory = sqlite3.Row
+            enable_wal(conn)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements in a write transaction, holding the database write lock"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def add_messages(self, conversation_id: str, messages: List[Dict[str, Any]], config: Optional[Dict[str, Any]] = None):
+        """
+        Index newly appended messages. Usable as a ConversationStore listener.
+
+        Messages that are already indexed are skipped, so replays are harmless.
+
+        Args
+            conversation_id: conversation the messages belong to
+            messages: message dicts with 'seq', 'role' and 'content'
+            config: the conversation's config, used for the language/mode/orchestration filters
+        """
+        config = config or {}
+        with self._transaction() as conn:
+            for message in messages:
+                #text containing the snippet markers would otherwise get stray highlights
+                content = (message.get('content') or '').translate(_MARKERS)
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO documents (conversation_id, seq, role, content, language, mode, orchestration) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (conversation_id, message['seq'], message.get('role', 'unknown'), content,
+                     config.get('language'), config.get('mode'), config.get('orchestration_type')))
+
+                #external content tables are kept in sync by hand
+                if cursor.rowcount:
+                    conn.execute('INSERT INTO documents_fts (rowid, content) VALUES (?, ?)', (cursor.lastrowid, content))
+
+    def add_conversation(self, conversation_id: str, messages: List[Dict[str, Any]], config: Dict[str, Any]):
+        """Index a whole stored conversation"""
+        self.add_messages(conversation_id, [dict(message, seq = seq) for seq, message in enumerate(messages)], config)
+
+    def rebuild(self, store) -> int:
+        """
+        Index every conversation in a store, skipping messages already indexed.
+
+        Args
+            store: ConversationStore to read
+
+        Returns
+            Number of conversations read
+        """
+        count = 0
+        for summary in store.list_conversations():
+            data = store.load(summary['id'])
+            if data is None:
+                continue
+            self.add_conversation(summary['id'], data.get('messages', []), data.get('config', {}))
+            count += 1
+        return count
+
+    def is_empty(self) -> bool:
+        """Whether nothing has been indexed yet"""
+        return self._connection().execute('SELECT 1 FROM documents LIMIT 1').fetchone() is None
+
+    def search(self, text: str, filters: Optional[Dict[str, str]] = None,
+               limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        Find messages matching a query, best match first.
+
+        Args
+            text: search terms, all of which must appear (the last may be a prefix)
+            filters: optional 'language', 'mode', 'orchestration' and 'role' values
+            limit: maximum number of results
+            offset: number of results to skip, for paging
+
+        Returns
+            Dict with 'results' (conversation_id, seq, role, language, mode,
+            orchestration, score and an HTML-escaped 'snippet' with matches in
+            <mark> tags) and 'took_ms'
+        """
+        start = time.perf_counter()
+        query = build_match_query(text)
+        if query is None:
+            return {'results': [], 'took_ms': 0.0}
+
+        conditions = ['documents_fts MATCH ?']
+        params = [_MARK_OPEN, _MARK_CLOSE, query]
+        for name, value in (filters or {}).items():
+            if value and name in FILTER_COLUMNS:
+                conditions.append(f"d.{FILTER_COLUMNS[name]} = ?")
+                params.append(value)
+        params.extend([limit, offset])
+
+        rows = self._connection().execute(
+            'SELECT d.conversation_id, d.seq, d.role, d.language, d.mode, d.orchestration, '
+            "snippet(documents_fts, 0, ?, ?, '...', 16) AS snippet, bm25(documents_fts) AS score "
+            'FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid '
+            f"WHERE {' AND '.join(conditions)} "
+            'ORDER BY score LIMIT ? OFFSET ?',
+            params).fetchall()
+
+        results = [{
+            'conversation_id': row['conversation_id'],
+            'seq': row['seq'],
+            'role': row['role'],
+            'language': row['language'],
+            'mode': row['mode'],
+            'orchestration': row['orchestration'],
+            #bm25 is lower for better matches, flipped so higher is better
+            'score': -row['score'],
+            'snippet': html.escape(row['snippet']).replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+        } for row in rows]
+
+        took = time.perf_counter() - start
+        metrics.observe('search.latency', took)
+        return {'results': results, 'took_ms': took * 1000.0}
@@ -0,0 +1,203 @@
+import threading
+from typing import Any, Callable, Hashable, Iterable, Iterator, Optional
+
+from resources.metrics import metrics
+
+
+class _Call:
+    def __init__(self):
+        """One in-flight call shared by a leader and its followers"""
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+        #streamed calls publish chunks as they arrive
+        self.chunks = []
+        self.condition = threading.Condition()
+
+        #callers sharing the leader's call
+        self.followers = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        """
+        Coalesce identical concurrent calls into one execution.
+
+        The first caller for a key (the leader) runs the function; callers that
+        arrive with the same key while it is running wait and receive the same
+        result, exception or stream of chunks. do() and stream() calls are
+        shared separately, a stream never serves a plain call or the reverse.
+
+        Args
+            name: prefix for this group's metric counters
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def _join(self, key: Hashable):
+        """
+        Register interest in a key.
+
+        Returns
+            (call, is_leader) tuple
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                metrics.increment(f"{self.name}.coalesced")
+                return call, False
+
+            call = _Call()
+            self._calls[key] = call
+            metrics.increment(f"{self.name}.executed")
+            return call, True
+
+    def _forget(self, key: Hashable, call: _Call):
+        """Stop sharing a finished call so later callers run a fresh one"""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn once for all concurrent callers with the same key.
+
+        Args
+            key: identity of the call
+            fn: function producing the result
+
+        Returns
+            The shared result
+        """
+        key = ('do', key)
+        call, leader = self._join(key)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._forget(key, call)
+            call.done.set()
+
+    def stream(self, key: Hashable, fn: Callable[[], Iterable[Any]], cancelled: Optional[Callable[[], bool]] = None,
+               poll_interval: float = 0.25) -> Iterator[Any]:
+        """
+        Share one stream among all concurrent callers with the same key.
+
+        Followers first receive the chunks produced so far, then follow along
+        live. If the leader stops early (e.g. its client cancelled) the stream
+        is closed when nobody else shares it, and otherwise keeps generating
+        in the background until the followers have it all or have all left.
+
+        Args
+            key: identity of the call
+            fn: function returning an iterable of chunks
+            cancelled: checked while a follower waits for the next chunk; once it
+                returns True the follower stops without an error
+            poll_interval: seconds between cancelled checks while waiting
+
+        Yields
+            Chunks of the shared stream
+        """
+        key = ('stream', key)
+        call, leader = self._join(key)
+
+        if leader:
+            source = iter(fn())
+            detached = False
+            try:
+                for chunk in source:
+                    self._publish(call, chunk)
+                    yield chunk
+            except GeneratorExit:
+                #the leader stopped reading (e.g. its client cancelled)
+                with self._lock:
+                    shared = call.followers > 0
+                    if not shared and self._calls.get(key) is call:
+                        del self._calls[key]
+
+                if shared:
+                    #others still want the result, finish generating it for them
+                    detached = True
+                    threading.Thread(target = self._drain, args = (key, call, source), daemon = True).start()
+                else:
+                    metrics.increment(f"{self.name}.abandoned")
+                    call.error = GeneratorExit()
+                raise
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                if not detached:
+                    self._finish(key, call, source)
+            return
+
+        try:
+            position = 0
+            while True:
+                with call.condition:
+                    while position >= len(call.chunks) and not call.done.is_set():
+                        if cancelled is not None and cancelled():
+                            return
+                        call.condition.wait(poll_interval if cancelled is not None else None)
+                    pending = call.chunks[position:]
+                    finished = call.done.is_set()
+                for chunk in pending:
+                    yield chunk
+                position += len(pending)
+
+                if finished and position >= len(call.chunks):
+                    break
+        finally:
+            #a leaving follower no longer keeps an abandoned stream running
+            with self._lock:
+                call.followers -= 1
+
+        if call.error is not None and not isinstance(call.error, GeneratorExit):
+            raise call.error
+
+    def _publish(self, call: _Call, chunk: Any):
+        """Hand a streamed chunk to the call's followers"""
+        with call.condition:
+            call.chunks.append(chunk)
+            call.condition.notify_all()
+
+    def _drain(self, key: Hashable, call: _Call, source: Iterator[Any]):
+        """Keep reading a stream its leader abandoned, for as long as it has followers"""
+        try:
+            for chunk in source:
+                self._publish(call, chunk)
+                with self._lock:
+                    if call.followers == 0:
+                        #stop sharing it first so nobody joins a stream about to close
+                        if self._calls.get(key) is call:
+                            del self._calls[key]
+                        metrics.increment(f"{self.name}.abandoned")
+                        call.error = GeneratorExit()
+                        break
+        except BaseException as e:
+            call.error = e
+        finally:
+            self._finish(key, call, source)
+
+    def _finish(self, key: Hashable, call: _Call, source: Iterator[Any]):
+        """Close a stream and wake its followers"""
+        #close the underlying stream right away, ending the model request
+        if hasattr(source, 'close'):
+            source.close()
+        self._forget(key, call)
+        with call.condition:
+            call.done.set()
+            call.condition.notify_all()
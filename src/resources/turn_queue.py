@@ -0,0 +1,87 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from resources.metrics import metrics
+from resources.cancellation import CancellationToken, OperationCancelled
+
+
+class TurnQueue:
+    def __init__(self, max_active: int, poll_interval: float = 0.5):
+        """
+        First-come, first-served admission for chat turns that call the LLM.
+
+        Limits how many turns run agents at once in this process, so a burst
+        of students queues in order instead of overloading Ollama, and lets
+        waiting clients be told where they are in line.
+
+        Args
+            max_active: turns allowed to run at once
+            poll_interval: seconds between cancellation checks while waiting
+        """
+        self.max_active = max_active
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._active = 0
+
+    @contextmanager
+    def slot(self, on_position: Optional[Callable[[int], None]] = None,
+             cancel_token: Optional[CancellationToken] = None):
+        """
+        Wait for a turn slot and hold it for the enclosed block.
+
+        Args
+            on_position: called with the turn's place in line (1 is next) whenever it changes
+            cancel_token: stops waiting when cancelled
+
+        Raises
+            OperationCancelled: if the turn is cancelled before a slot frees up
+        """
+        ticket = object()
+        start = time.perf_counter()
+        reported = None
+
+        with self._condition:
+            self._waiting.append(ticket)
+
+        try:
+            while True:
+                with self._condition:
+                    position = self._waiting.index(ticket)
+                    if position == 0 and self._active < self.max_active:
+                        self._waiting.remove(ticket)
+                        self._active += 1
+                        break
+
+                    if cancel_token is not None and cancel_token.cancelled:
+                        metrics.increment('cancellation.cancelled_while_queued')
+                        raise OperationCancelled(cancel_token.reason)
+
+                    if position == reported or on_position is None:
+                        self._condition.wait(self.poll_interval)
+                        continue
+
+                #report outside the lock, the callback may block on a slow client
+                reported = position
+                on_position(position + 1)
+        except BaseException:
+            with self._condition:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                self._condition.notify_all()
+            raise
+
+        metrics.observe('turn_queue.wait', time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+    def depth(self) -> int:
+        """Number of turns waiting for a slot"""
+        with self._condition:
+            return len(self._waiting)
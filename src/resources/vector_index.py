@@ -0,0 +1,339 @@
+import os
+import re
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    #without file locks, only appends from within one process are serialized
+    fcntl = None
+
+from resources.conversation_store import is_valid_conversation_id
+from resources.parser import Parser
+
+#words, identifiers and numbers; code tokens like "my_list" stay whole
+TOKEN_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+
+#kinds of indexed entries
+KIND_MESSAGE = 0
+KIND_CODE = 1
+KIND_EMPTY = 2
+
+#the agent sees the latest messages plus the most relevant older ones, so prompts stay
+#the same size however long the session gets
+HISTORY_RECENT_MESSAGES = 6
+HISTORY_RETRIEVED_MESSAGES = 4
+HISTORY_MESSAGE_MAX_CHARS = 4000
+
+
+class HashingEmbedder:
+    def __init__(self, dim: int = 512):
+        """
+        CPU-only text embeddings from hashed word and word-pair features.
+
+        Needs no model download and gives the same vector in every process, so
+        indexes written by one worker can be queried by another.
+
+        Args
+            dim: embedding size
+        """
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        """
+        Embed a text as an L2-normalized float32 vector.
+
+        Args
+            text: message or code block
+
+        Returns
+            Vector of length dim
+        """
+        vector = np.zeros(self.dim, dtype = np.float32)
+        tokens = [token.lower() for token in TOKEN_PATTERN.findall(text)]
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+        for feature in features:
+            hashed = zlib.crc32(feature.encode('utf-8'))
+            #the top bit picks a sign so that collisions tend to cancel out
+            vector[hashed % self.dim] += 1.0 if hashed & 0x80000000 else -1.0
+
+        #dampen repeated features
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+class ConversationVectorIndex:
+    def __init__(self, directory: str, embedder: Optional[HashingEmbedder] = None, cache_size: int = 256):
+        """
+        Per-conversation vector index over past messages and the code blocks inside them.
+
+        Each conversation's index is an append-only file of fixed-size records
+        (sequence number, kind, embedding), one per message and per code block.
+        Empty messages get a record without an embedding, so the file also
+        tells which messages have been indexed. New messages are appended to
+        the file, and the loaded index of recently used conversations is kept
+        in memory and only extended with the records added since, by this
+        worker or another one.
+
+        Args
+            directory: folder where index files are kept, next to the conversations
+            embedder: text embedder, a 512-dimensional HashingEmbedder by default
+            cache_size: number of conversations whose index is kept in memory
+        """
+        self.directory = directory
+        self.embedder = embedder or HashingEmbedder()
+        self.parser = Parser()
+        self.cache_size = cache_size
+        self.record = np.dtype([('seq', '<i8'), ('kind', 'i1'), ('vector', '<f4', (self.embedder.dim,))])
+        os.makedirs(directory, exist_ok = True)
+
+        #serializes appends within this process; other processes are kept out by a file lock
+        self._lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def _path(self, conversation_id: str) -> str:
+        if not is_valid_conversation_id(conversation_id):
+            raise ValueError(f"Invalid conversation id: {conversation_id!r}")
+        return os.path.join(self.directory, f"{conversation_id}.vec")
+
+    def _load(self, conversation_id: str) -> Dict[str, Any]:
+        """
+        Get a conversation's index, reading only the records appended since it was last read.
+
+        Returns
+            Dict with vectors, seqs (the message of each vector), covered (set of
+            indexed sequence numbers) and the file position read up to
+        """
+        path = self._path(conversation_id)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+
+        with self._cache_lock:
+            index = self._cache.get(conversation_id)
+            #a deleted or rewritten file is read again from the start
+            if index is None or stat is None or index['inode'] != stat.st_ino or index['offset'] > stat.st_size:
+                index = {
+                    'inode': stat.st_ino if stat else None,
+                    'offset': 0,
+                    'vectors': np.zeros((0, self.embedder.dim), dtype = np.float32),
+                    'seqs': np.zeros(0, dtype = np.int64),
+                    'covered': set()
+                }
+            self._cache[conversation_id] = index
+            self._cache.move_to_end(conversation_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last = False)
+
+        if stat is None or stat.st_size - index['offset'] < self.record.itemsize:
+            return index
+
+        with open(path, 'rb') as f:
+            f.seek(index['offset'])
+            data = f.read(stat.st_size - index['offset'])
+
+        #a record still being written is picked up next time
+        count = len(data) // self.record.itemsize
+        records = np.frombuffer(data, dtype = self.record, count = count)
+        embedded = records[records['kind'] != KIND_EMPTY]
+
+        updated = dict(index,
+                       offset = index['offset'] + count * self.record.itemsize,
+                       vectors = np.concatenate([index['vectors'], embedded['vector']]),
+                       seqs = np.concatenate([index['seqs'], embedded['seq'].astype(np.int64)]),
+                       covered = index['covered'] | set(records['seq'].tolist()))
+
+        with self._cache_lock:
+            #keep whichever thread read further
+            current = self._cache.get(conversation_id)
+            if current is index or current is None or current['offset'] < updated['offset']:
+                self._cache[conversation_id] = updated
+        return updated
+
+    def _append(self, conversation_id: str, records: np.ndarray):
+        """Append records to an index file in one write"""
+        with open(self._path(conversation_id), 'ab') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+            #drop a record cut short by a crash so the ones after it stay aligned
+            size = os.fstat(f.fileno()).st_size
+            if size % self.record.itemsize:
+                f.truncate(size - size % self.record.itemsize)
+
+            f.write(records.tobytes())
+            f.flush()
+
+    def covers(self, conversation_id: str, end: int) -> bool:
+        """
+        Whether every message before a sequence number has been indexed.
+
+        False for conversations saved before the index existed, which can then
+        be indexed by passing their older messages to add_messages.
+        """
+        covered = self._load(conversation_id)['covered']
+        return len(covered) >= end and all(seq in covered for seq in range(end))
+
+    def add_messages(self, conversation_id: str, messages: List[Dict[str, Any]], config: Optional[Dict[str, Any]] = None):
+        """
+        Index newly appended messages. Usable as a ConversationStore listener.
+
+        Messages that are already indexed are skipped, so replays are harmless.
+
+        Args
+            conversation_id: conversation the messages belong to
+            messages: message dicts with 'seq', 'role' and 'content'
+            config: unused, part of the listener signature
+        """
+        with self._lock:
+            covered = self._load(conversation_id)['covered']
+
+            entries = []
+            for message in messages:
+                if message['seq'] in covered:
+                    continue
+                if not message.get('content'):
+                    entries.append((message['seq'], KIND_EMPTY, np.zeros(self.embedder.dim, dtype = np.float32)))
+                    continue
+
+                content = message['content']
+                entries.append((message['seq'], KIND_MESSAGE, self.embedder.embed(content)))
+
+                #code blocks get their own entries so pasted code can be found on its own
+                for block in self.parser.extract_code_blocks(content):
+                    entries.append((message['seq'], KIND_CODE, self.embedder.embed(block)))
+
+            if entries:
+                self._append(conversation_id, np.array(entries, dtype = self.record))
+
+    def search(self, conversation_id: str, text: str, k: int, before: Optional[int] = None) -> List[int]:
+        """
+        Find the messages most similar to a text.
+
+        Args
+            conversation_id: conversation to search
+            text: query text, usually the student's new message
+            k: number of messages to return
+            before: only consider messages with a sequence number below this
+
+        Returns
+            Sequence numbers of the best matching messages, best first
+        """
+        index = self._load(conversation_id)
+        if k <= 0 or len(index['seqs']) == 0:
+            return []
+
+        scores = index['vectors'] @ self.embedder.embed(text)
+        seqs = index['seqs']
+        if before is not None:
+            scores = np.where(seqs < before, scores, -np.inf)
+
+        #a message's score is the best score of its text or any of its code blocks
+        results = []
+        for position in np.argsort(-scores):
+            if not np.isfinite(scores[position]) or scores[position] <= 0:
+                break
+            seq = int(seqs[position])
+            if seq not in results:
+                results.append(seq)
+                if len(results) == k:
+                    break
+        return results
+
+    def delete(self, conversation_id: str):
+        """Remove a conversation's index"""
+        path = self._path(conversation_id)
+        with self._cache_lock:
+            self._cache.pop(conversation_id, None)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def expand_to_turns(store, conversation_id: str, seqs: List[int], before: int) -> List[Dict[str, Any]]:
+    """
+    Load retrieved messages together with the other half of their turn.
+
+    A student message comes with the tutor answer that follows it, and a tutor
+    answer with the student message before it, so neither is seen out of context.
+
+    Args
+        store: ConversationStore holding the conversation
+        conversation_id: conversation the messages belong to
+        seqs: sequence numbers of the retrieved messages
+        before: only messages with a sequence number below this are loaded
+
+    Returns
+        The retrieved messages and their turn partners, in order
+    """
+    if not seqs:
+        return []
+
+    nearby = {seq for hit in seqs for seq in (hit - 1, hit, hit + 1) if 0 <= seq < before}
+    loaded = {message['seq']: message for message in store.get_messages(conversation_id, sorted(nearby))}
+
+    wanted = set()
+    for seq in seqs:
+        message = loaded.get(seq)
+        if message is None:
+            continue
+        wanted.add(seq)
+        if message.get('role') == 'user':
+            partner = loaded.get(seq + 1)
+            if partner is not None and partner.get('role') != 'user':
+                wanted.add(seq + 1)
+        else:
+            partner = loaded.get(seq - 1)
+            if partner is not None and partner.get('role') == 'user':
+                wanted.add(seq - 1)
+
+    return [loaded[seq] for seq in sorted(wanted)]
+
+
+def select_history(store, index: ConversationVectorIndex, conversation_id: str, user_message: str, current_seq: int,
+                   recent: int = HISTORY_RECENT_MESSAGES, retrieved: int = HISTORY_RETRIEVED_MESSAGES,
+                   max_chars: int = HISTORY_MESSAGE_MAX_CHARS) -> List[Dict[str, Any]]:
+    """
+    Select the history sent to the agents for a new message.
+
+    Args
+        store: ConversationStore holding the conversation
+        index: the store's vector index
+        conversation_id: conversation the message belongs to
+        user_message: the student's new message, used to find relevant older turns
+        current_seq: sequence number of the new message, which is left out
+        recent: number of latest messages always included
+        retrieved: number of older turns picked by similarity to the new message
+        max_chars: longest message content kept, longer ones are cut
+
+    Returns
+        Latest messages plus the older turns (question and answer) most similar to the new one, in order
+    """
+    page = store.load_messages(conversation_id, recent, before = current_seq)
+    if page is None:
+        return []
+
+    messages = page['messages']
+    oldest_recent = messages[0]['seq'] if messages else current_seq
+
+    if oldest_recent > 0 and retrieved > 0:
+        #conversations from before the index existed are indexed on first use
+        if not index.covers(conversation_id, oldest_recent):
+            older = store.load_messages(conversation_id, oldest_recent, before = oldest_recent)
+            index.add_messages(conversation_id, older['messages'] if older else [])
+
+        seqs = index.search(conversation_id, user_message, retrieved, before = oldest_recent)
+        messages = expand_to_turns(store, conversation_id, seqs, oldest_recent) + messages
+
+    #a single huge paste should not blow up the prompt either
+    return [dict(message, content = message['content'][:max_chars])
+            if len(message.get('content') or '') > max_chars else message
+            for message in messages]
@@ -1,9 +1,27 @@
 //the current state
 let currentConversationId = null;
 
+//cursor for the next page of older messages (null when all are loaded)
+let olderMessagesCursor = null;
+let loadingOlderMessages = false;
+
+//persistent chat connection for the current conversation, null when unavailable
+let chatSocket = null;
+
+//tutor message element being streamed into during a WebSocket turn
+let streamingMessage = null;
+let turnInProgress = false;
+
 //load all conversations during page loading
 document.addEventListener('DOMContentLoaded', function() {
     loadConversations();
+
+    //leaving the page cancels an answer that is still being generated
+    window.addEventListener('beforeunload', function() {
+        if (turnInProgress) {
+            navigator.sendBeacon('/api/cancel');
+        }
+    });
     
     //add support for the enter key during chat
     const chatInput = document.getElementById('chat-input');
@@ -15,6 +33,16 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     }
+
+    //fetch older messages when the user scrolls to the top of the chat
+    const messagesDiv = document.getElementById('chat-messages');
+    if (messagesDiv) {
+        messagesDiv.addEventListener('scroll', function() {
+            if (messagesDiv.scrollTop < 50) {
+                loadOlderMessages();
+            }
+        });
+    }
 });
 
 //display the configuration screen for the user to make selections
@@ -57,8 +85,10 @@ async function startSession() {
         
         //clear messages from conversation
         document.getElementById('chat-messages').innerHTML = '';
+        olderMessagesCursor = null;
 
         showChat();
+        connectChatSocket();
         
         //reload the conversations list
         loadConversations();
@@ -70,7 +100,7 @@ async function sendMessage() {
     const input = document.getElementById('chat-input');
     const message = input.value.trim();
     
-    if (!message) return;
+    if (!message || turnInProgress) return;
     
     //clear input
     input.value = '';
@@ -79,38 +109,152 @@ async function sendMessage() {
     addMessage('user', message);
     
     //display loading while the agent is processing
-    const loadingDiv = document.createElement('div');
-    loadingDiv.className = 'loading';
-    loadingDiv.id = 'loading';
-    loadingDiv.textContent = 'Loading...';
-    document.getElementById('chat-messages').appendChild(loadingDiv);
-    scrollToBottom();
+    showLoading('Loading...');
+
+    turnInProgress = true;
+    document.getElementById('stop-button').style.display = 'inline-block';
+
+    //stream the answer over the open connection when there is one
+    if (chatSocket && chatSocket.readyState === WebSocket.OPEN) {
+        chatSocket.send(JSON.stringify({type: 'send', message: message}));
+        return;
+    }
     
     //send the user message to the backend for processing
-    const response = await fetch('/api/send_message', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({
-            message: message
-        })
-    });
-    
-    const data = await response.json();
-    
-    //remove loading popup
-    document.getElementById('loading').remove();
-    
-    if (data.success) {
-        addMessage('assistant', data.response);
+    try {
+        const response = await fetch('/api/send_message', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                message: message
+            })
+        });
+        
+        const data = await response.json();
+        
+        if (data.success) {
+            addMessage('assistant', data.response);
+        }
+    } finally {
+        //remove loading popup
+        endTurn();
+    }
+}
+
+//show the loading indicator below the messages, or update its text
+function showLoading(text) {
+    let loadingDiv = document.getElementById('loading');
+    if (!loadingDiv) {
+        loadingDiv = document.createElement('div');
+        loadingDiv.className = 'loading';
+        loadingDiv.id = 'loading';
+        document.getElementById('chat-messages').appendChild(loadingDiv);
+    }
+    loadingDiv.textContent = text;
+    scrollToBottom();
+}
+
+function removeLoading() {
+    const loadingDiv = document.getElementById('loading');
+    if (loadingDiv) loadingDiv.remove();
+}
+
+//open a persistent chat connection for the session's current conversation
+function connectChatSocket() {
+    if (chatSocket) chatSocket.close();
+    chatSocket = null;
+    if (!('WebSocket' in window)) return;
+
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = new WebSocket(`${protocol}//${window.location.host}/ws/chat`);
+
+    socket.onopen = () => { chatSocket = socket; };
+    socket.onmessage = (e) => handleChatEvent(JSON.parse(e.data));
+    socket.onclose = () => {
+        //fall back to plain requests until the next session is opened
+        if (chatSocket === socket) chatSocket = null;
+        if (turnInProgress) endTurn();
+    };
+}
+
+//react to an event pushed by the server during a turn
+function handleChatEvent(event) {
+    switch (event.type) {
+        case 'queued':
+            showLoading(`Waiting for the tutor (position ${event.position} in line)...`);
+            break;
+        case 'stage':
+            if (event.stage.startsWith('tutor_agent')) {
+                //a revision replaces the first draft
+                if (!streamingMessage) {
+                    streamingMessage = createMessageElement('assistant', '');
+                    document.getElementById('chat-messages').insertBefore(streamingMessage, document.getElementById('loading'));
+                }
+                streamingMessage.querySelector('.message-content').textContent = '';
+                showLoading(event.stage.endsWith(':revision') ? 'Revising with feedback...' : 'Writing...');
+            } else {
+                const agent = event.stage.split('_')[0];
+                showLoading(`The ${agent} is reviewing the answer...`);
+            }
+            break;
+        case 'token':
+            if (streamingMessage) {
+                streamingMessage.querySelector('.message-content').textContent += event.text;
+                scrollToBottom();
+            }
+            break;
+        case 'done':
+            if (!streamingMessage) {
+                streamingMessage = createMessageElement('assistant', '');
+                document.getElementById('chat-messages').insertBefore(streamingMessage, document.getElementById('loading'));
+            }
+            streamingMessage.querySelector('.message-content').textContent = event.response;
+            endTurn();
+            break;
+        case 'cancelled':
+            if (streamingMessage && !streamingMessage.querySelector('.message-content').textContent) {
+                streamingMessage.remove();
+            }
+            endTurn();
+            break;
+        case 'error':
+            console.error(event.error);
+            endTurn();
+            break;
+    }
+}
+
+function endTurn() {
+    turnInProgress = false;
+    streamingMessage = null;
+    document.getElementById('stop-button').style.display = 'none';
+    removeLoading();
+    scrollToBottom();
+}
+
+//stop the answer being generated, freeing the model for other students
+function stopGeneration() {
+    if (!turnInProgress) return;
+
+    if (chatSocket && chatSocket.readyState === WebSocket.OPEN) {
+        chatSocket.send(JSON.stringify({type: 'cancel'}));
+    } else {
+        fetch('/api/cancel', {method: 'POST'});
     }
 }
 
 //add agent response to the UI
 function addMessage(role, content) {
     const messagesDiv = document.getElementById('chat-messages');
+    messagesDiv.appendChild(createMessageElement(role, content));
     
+    scrollToBottom();
+}
+
+//build the element for a single chat message
+function createMessageElement(role, content) {
     const messageDiv = document.createElement('div');
     messageDiv.className = `message ${role}`;
     
@@ -124,9 +268,8 @@ function addMessage(role, content) {
     
     messageDiv.appendChild(roleDiv);
     messageDiv.appendChild(contentDiv);
-    messagesDiv.appendChild(messageDiv);
     
-    scrollToBottom();
+    return messageDiv;
 }
 
 function scrollToBottom() {
@@ -177,11 +320,46 @@ async function loadConversation(conversationId) {
         const messagesDiv = document.getElementById('chat-messages');
         messagesDiv.innerHTML = '';
         
+        //render only the most recent page, older pages load on scroll
+        const fragment = document.createDocumentFragment();
         data.messages.forEach(msg => {
-            addMessage(msg.role, msg.content);
+            fragment.appendChild(createMessageElement(msg.role, msg.content));
         });
+        messagesDiv.appendChild(fragment);
+        olderMessagesCursor = data.next_cursor;
         
         showChat();
+        connectChatSocket();
+        scrollToBottom();
         loadConversations();
     }
+}
+
+//prepend the previous page of messages, keeping the current view in place
+async function loadOlderMessages() {
+    if (loadingOlderMessages || olderMessagesCursor === null || !currentConversationId) return;
+    loadingOlderMessages = true;
+    
+    const conversationId = currentConversationId;
+    try {
+        const response = await fetch(`/api/load_conversation/${conversationId}/messages?before=${olderMessagesCursor}`);
+        const result = await response.json();
+        
+        //ignore the page if the user switched conversations meanwhile
+        if (!result.success || conversationId !== currentConversationId) return;
+        
+        const messagesDiv = document.getElementById('chat-messages');
+        const previousHeight = messagesDiv.scrollHeight;
+        
+        const fragment = document.createDocumentFragment();
+        result.data.messages.forEach(msg => {
+            fragment.appendChild(createMessageElement(msg.role, msg.content));
+        });
+        messagesDiv.insertBefore(fragment, messagesDiv.firstChild);
+        olderMessagesCursor = result.data.next_cursor;
+        
+        messagesDiv.scrollTop += messagesDiv.scrollHeight - previousHeight;
+    } finally {
+        loadingOlderMessages = false;
+    }
 }
\ No newline at end of file
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+import requests
+
+#tests import the app's packages the same way app.py does, relative to the src directory
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from tools.fake_ollama import FakeOllamaSettings, start_server
+from tools.load_test import free_port
+
+
+@pytest.fixture
+def fake_ollama():
+    """Factory starting fake Ollama servers, returning their base URLs"""
+    servers = []
+
+    def start(token_ms: float = 0.0) -> str:
+        server = start_server(FakeOllamaSettings(prefill_ms_per_1k_chars = 0, token_ms = token_ms), port = 0)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def app_workers(tmp_path):
+    """Factory starting app worker processes that share one data directory, returning their base URLs"""
+    processes = []
+
+    def start(ollama_url: str, count: int = 1, **env_overrides) -> list:
+        env = dict(os.environ,
+                   PYTHONPATH = SRC_DIR,
+                   DDT_CONVERSATIONS_DIR = str(tmp_path / 'conversations'),
+                   DDT_BATCH_JOBS_DIR = str(tmp_path / 'batch_jobs'),
+                   DDT_PROFILE_DIR = str(tmp_path / 'profiles'),
+                   DDT_OLLAMA_BASE_URL = ollama_url,
+                   DDT_SECRET_KEY = '',
+                   **env_overrides)
+
+        #all workers start at once, as under a multi-process server
+        ports = [free_port() for _ in range(count)]
+        for port in ports:
+            processes.append(subprocess.Popen(
+                [sys.executable, '-c', f"import app; app.app.run(port={port}, threaded=True)"],
+                cwd = str(tmp_path), env = env, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL))
+
+        urls = [f"http://127.0.0.1:{port}" for port in ports]
+        for url in urls:
+            wait_for(f"{url}/api/conversations")
+        return urls
+
+    yield start
+    for process in processes:
+        process.terminate()
+        process.wait()
+
+
+def wait_for(url: str, timeout: float = 60):
+    """Wait until a URL accepts connections"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout = 1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not start")
@@ -0,0 +1,129 @@
+"""Idle conversations moving to the compressed archive and back"""
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from resources.archive import ConversationArchive, TieredConversationStore
+from resources.conversation_store import ConversationStore, generate_conversation_id
+
+CONFIG = {'language': 'Python', 'mode': 'debug', 'orchestration_type': 'single'}
+
+
+def make_store(directory, max_segment_bytes = 64 * 1024 * 1024):
+    hot = ConversationStore.from_config({'backend': 'sqlite', 'directory': str(directory)})
+    archive = ConversationArchive(os.path.join(str(directory), 'archive'), max_segment_bytes = max_segment_bytes)
+    return TieredConversationStore(hot, archive)
+
+
+def add_conversation(store, turns = 3):
+    conversation_id = generate_conversation_id()
+    for turn in range(turns):
+        store.append_messages(conversation_id, [
+            {'role': 'user', 'content': f'{conversation_id} question {turn} ' + 'x' * 200},
+            {'role': 'tutor', 'content': f'{conversation_id} answer {turn} ' + 'y' * 200}
+        ], CONFIG)
+    return conversation_id
+
+
+def test_archived_conversation_loads_and_is_restored_on_append(tmp_path):
+    store = make_store(tmp_path)
+    conversation_id = add_conversation(store)
+    before = store.load(conversation_id)['messages']
+
+    assert store.compact(timedelta(0)) == [conversation_id]
+    assert store.hot.load(conversation_id) is None
+    assert store.load(conversation_id)['messages'] == before
+    assert [c['id'] for c in store.list_conversations() if c.get('archived')] == [conversation_id]
+
+    store.append_messages(conversation_id, [{'role': 'user', 'content': 'back again'}])
+    assert not store.archive.contains(conversation_id)
+    messages = store.hot.load(conversation_id)['messages']
+    assert [m['content'] for m in messages] == [m['content'] for m in before] + ['back again']
+
+
+def test_only_conversations_known_to_be_idle_are_archived(tmp_path):
+    store = make_store(tmp_path)
+    legacy, unreadable, old, recent = [add_conversation(store) for _ in range(4)]
+
+    #conversations saved before update times were kept, and stamps from other writers
+    conn = sqlite3.connect(str(tmp_path / 'conversations.db'), isolation_level = None)
+    for conversation_id, update_time in [(legacy, ''), (unreadable, 'yesterday'),
+                                         (old, (datetime.now() - timedelta(days = 40)).astimezone().isoformat())]:
+        conn.execute('UPDATE conversations SET update_time = ? WHERE id = ?', (update_time, conversation_id))
+    conn.close()
+
+    assert store.compact(timedelta(days = 30)) == [old]
+
+
+def test_raw_bytes_count_compact_json(tmp_path):
+    store = make_store(tmp_path)
+    conversation_id = add_conversation(store)
+    data = store.hot.load(conversation_id)
+    store.compact(timedelta(0))
+
+    assert store.archive.stats()['raw_bytes'] == len(json.dumps(data).encode('utf-8'))
+
+
+def test_reclaim_rewrites_mostly_dead_segments(tmp_path):
+    #a few conversations per segment
+    store = make_store(tmp_path, max_segment_bytes = 2000)
+    ids = [add_conversation(store) for _ in range(12)]
+    store.compact(timedelta(0))
+    before = store.archive.stats()
+
+    #restoring most of them leaves their records dead
+    for conversation_id in ids[:9]:
+        store.append_messages(conversation_id, [{'role': 'user', 'content': 'restored'}])
+
+    freed = store.archive.reclaim()
+    after = store.archive.stats()
+    assert freed > 0
+    assert after['segment_bytes'] == before['segment_bytes'] - freed
+    assert after['segments'] < before['segments']
+    assert after['conversations'] == 3
+
+    for conversation_id in ids[9:]:
+        assert len(store.load(conversation_id)['messages']) == 6
+
+    #nothing left to reclaim
+    assert store.archive.reclaim() == 0
+
+
+def test_loads_during_reclaim_always_find_the_record(tmp_path):
+    store = make_store(tmp_path, max_segment_bytes = 2000)
+    ids = [add_conversation(store) for _ in range(20)]
+    store.compact(timedelta(0))
+    kept = ids[::4]
+
+    errors = []
+    stop = threading.Event()
+
+    def read():
+        #a separate archive instance, as in another worker
+        other = make_store(tmp_path, max_segment_bytes = 2000)
+        while not stop.is_set():
+            for conversation_id in kept:
+                try:
+                    data = other.load(conversation_id)
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if data is None or len(data['messages']) != 6:
+                    errors.append(conversation_id)
+
+    readers = [threading.Thread(target = read, daemon = True) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+
+    for conversation_id in ids:
+        if conversation_id not in kept:
+            store.append_messages(conversation_id, [{'role': 'user', 'content': 'restored'}])
+            store.archive.reclaim()
+
+    stop.set()
+    for reader in readers:
+        reader.join(timeout = 10)
+    assert errors == []
+    assert store.archive.stats()['conversations'] == len(kept)
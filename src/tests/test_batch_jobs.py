@@ -0,0 +1,100 @@
+"""Batch jobs: validation, resuming after a crash and the shared LLM limit"""
+import os
+import json
+import time
+import threading
+
+import pytest
+
+from resources.batch_jobs import BatchJobManager, SharedSlots, normalize_submissions
+
+
+class EchoOrchestration:
+    """Stands in for an orchestration, answering with the prompt it was given"""
+
+    def run_workflow(self, user_input, context = None):
+        return {'tutor_agent_result': user_input}
+
+
+def wait_until_done(manager, job_id, timeout = 10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get_job(job_id)
+        if job['status'] != 'running':
+            return job
+        time.sleep(0.02)
+    raise AssertionError('job did not finish')
+
+
+def test_invalid_submissions_are_rejected_before_anything_is_written(tmp_path):
+    manager = BatchJobManager(str(tmp_path), lambda config: EchoOrchestration())
+    for submissions in [[42], [['print(1)']], [{'code': 7}]]:
+        with pytest.raises(ValueError):
+            manager.create_job({'language': 'Python'}, submissions)
+    assert manager.list_jobs() == []
+
+
+def test_job_whose_orchestration_cannot_be_built_is_released(tmp_path):
+    def broken_factory(config):
+        raise RuntimeError('model not available')
+
+    manager = BatchJobManager(str(tmp_path), broken_factory)
+    with pytest.raises(RuntimeError):
+        manager.create_job({'language': 'Python'}, ['print(1)', 'print(2)'])
+
+    [job] = manager.list_jobs()
+    assert job['status'] == 'failed'
+    assert manager.running == {}
+
+    #once the problem is fixed the job can be resumed, here or in another process
+    manager.orchestration_factory = lambda config: EchoOrchestration()
+    assert manager.resume(job['id'])
+    assert wait_until_done(manager, job['id'])['completed'] == 2
+
+
+def test_interrupted_job_resumes_without_losing_or_repeating_results(tmp_path):
+    #the files a worker leaves behind when it dies while writing its third result
+    job_id = '01JOBINTERRUPTED0000000000'
+    job_dir = tmp_path / job_id
+    job_dir.mkdir()
+    items = normalize_submissions([f"print({index})" for index in range(6)])
+    (job_dir / 'inputs.jsonl').write_text(''.join(json.dumps(item) + '\n' for item in items))
+    done = [{'index': index, 'id': index, 'response': f"print({index})", 'error': None} for index in range(2)]
+    (job_dir / 'results.jsonl').write_text(''.join(json.dumps(result) + '\n' for result in done) + '{"index": 2, "id"')
+    (job_dir / 'job.json').write_text(json.dumps({'id': job_id, 'config': {}, 'total': 6, 'status': 'running'}))
+
+    manager = BatchJobManager(str(tmp_path), lambda config: EchoOrchestration())
+    assert manager.resume_interrupted() == [job_id]
+    job = wait_until_done(manager, job_id)
+
+    assert job['status'] == 'completed'
+    with open(manager.results_path(job_id)) as f:
+        results = [json.loads(line) for line in f]
+    assert sorted(result['index'] for result in results) == list(range(6))
+    assert all(f"print({result['index']})" in result['response'] for result in results)
+
+
+def test_llm_limit_is_shared_between_managers_on_one_directory(tmp_path):
+    #two SharedSlots on one directory behave like two worker processes
+    slots = [SharedSlots(str(tmp_path), 1, poll_interval = 0.005) for _ in range(2)]
+    holders = {'active': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    def hold(slot):
+        for _ in range(5):
+            with slot:
+                with lock:
+                    holders['active'] += 1
+                    holders['peak'] = max(holders['peak'], holders['active'])
+                time.sleep(0.005)
+                with lock:
+                    holders['active'] -= 1
+
+    threads = [threading.Thread(target = hold, args = (slot,)) for slot in slots for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    expected_peak = 1 if os.name == 'posix' else 2
+    assert holders['peak'] == expected_peak
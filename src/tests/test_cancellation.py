@@ -0,0 +1,40 @@
+"""Cancelling a conversation's running turn from any worker"""
+import os
+import time
+
+from resources.cancellation import CancellationRegistry
+
+CONVERSATION_ID = '0123456789abcdef0123456789abcdef'
+
+
+def test_cancel_reaches_a_turn_running_in_another_worker(tmp_path):
+    running = CancellationRegistry(str(tmp_path), poll_interval = 0)
+    other = CancellationRegistry(str(tmp_path), poll_interval = 0)
+
+    with running.track(CONVERSATION_ID) as token:
+        assert not token.cancelled
+        #the request reaches a worker that is not running the turn
+        assert other.cancel(CONVERSATION_ID) is False
+        assert token.cancelled
+        assert token.reason == 'cancelled by another worker'
+
+    #the marker goes away with the turn it cancelled
+    assert os.listdir(str(tmp_path)) == []
+
+    #and does not cancel turns started later
+    with running.track(CONVERSATION_ID) as token:
+        assert not token.cancelled
+
+
+def test_unclaimed_markers_are_pruned(tmp_path):
+    registry = CancellationRegistry(str(tmp_path), marker_max_age = 60)
+
+    #no turn was running anywhere, the marker stays for a while
+    registry.cancel(CONVERSATION_ID)
+    marker = os.path.join(str(tmp_path), f'{CONVERSATION_ID}.cancel')
+    assert os.path.exists(marker)
+
+    old = time.time() - 120
+    os.utime(marker, (old, old))
+    assert registry.prune() == 1
+    assert os.listdir(str(tmp_path)) == []
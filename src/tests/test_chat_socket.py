@@ -0,0 +1,61 @@
+"""The streaming /ws/chat transport"""
+import json
+
+import pytest
+import requests
+
+simple_websocket = pytest.importorskip('simple_websocket')
+
+
+def open_session(url: str, orchestration: str = 'single'):
+    """Start a conversation and open its chat socket"""
+    client = requests.Session()
+    client.post(f"{url}/api/configure", json = {'language': 'Python', 'orchestration_type': orchestration, 'mode': 'debug'})
+    cookies = '; '.join(f"{name}={value}" for name, value in client.cookies.items())
+    ws = simple_websocket.Client.connect(url.replace('http://', 'ws://') + '/ws/chat', headers = {'Cookie': cookies})
+    return client, ws
+
+
+def receive_until_final(ws, timeout: float = 30):
+    """Collect events up to and including the turn's final one"""
+    events = []
+    while True:
+        raw = ws.receive(timeout = timeout)
+        assert raw is not None, 'no final event'
+        events.append(json.loads(raw))
+        if events[-1]['type'] in ('done', 'cancelled', 'error'):
+            return events
+
+
+def test_messages_sent_right_after_done_are_answered(fake_ollama, app_workers):
+    url, = app_workers(fake_ollama())
+    client, ws = open_session(url)
+    try:
+        for step in range(3):
+            ws.send(json.dumps({'type': 'send', 'message': f'question {step}'}))
+            events = receive_until_final(ws)
+            assert events[-1]['type'] == 'done', events[-1]
+            assert any(event['type'] == 'token' for event in events)
+    finally:
+        ws.close()
+
+
+def test_cancel_stops_a_streaming_turn(fake_ollama, app_workers):
+    #slow tokens so the turn is still generating when the cancel arrives
+    url, = app_workers(fake_ollama(token_ms = 50))
+    client, ws = open_session(url, orchestration = 'multi-agent')
+    try:
+        ws.send(json.dumps({'type': 'send', 'message': 'question'}))
+        while json.loads(ws.receive(timeout = 30))['type'] != 'token':
+            pass
+        ws.send(json.dumps({'type': 'cancel'}))
+        assert receive_until_final(ws)[-1]['type'] == 'cancelled'
+
+        #the conversation keeps the question but no answer, and the next turn works
+        ws.send(json.dumps({'type': 'send', 'message': 'again'}))
+        assert receive_until_final(ws)[-1]['type'] == 'done'
+    finally:
+        ws.close()
+
+    metrics = client.get(f"{url}/api/metrics").json()
+    assert metrics['counters']['cancellation.cancelled_workflows'] >= 1
@@ -0,0 +1,52 @@
+"""Matching requests to the exercise bank and refilling it"""
+import time
+import threading
+
+from langchain_core.language_models.fake import FakeListLLM
+
+from resources.exercise_bank import ExerciseBank, TOPICS, DIFFICULTIES, match_request
+
+
+def test_plain_requests_match_and_follow_ups_do_not():
+    assert match_request("Give me a beginner exercise on loops") == ('loops', 'beginner')
+    assert match_request("I want an advanced recursion problem") == ('recursion', 'advanced')
+
+    for text in ["Give me a harder loops problem", "Can I have a similar exercise on lists?",
+                 "One more recursion exercise like that", "Here is my answer to the loops exercise"]:
+        assert match_request(text) is None, text
+
+
+#calls made by SlowLLM that are running right now, and the most seen at once
+calls = {'active': 0, 'peak': 0}
+calls_lock = threading.Lock()
+
+
+class SlowLLM(FakeListLLM):
+    """Fake LLM tracking how many calls run at once"""
+
+    def _call(self, *args, **kwargs):
+        with calls_lock:
+            calls['active'] += 1
+            calls['peak'] = max(calls['peak'], calls['active'])
+        time.sleep(0.01)
+        with calls_lock:
+            calls['active'] -= 1
+        return super()._call(*args, **kwargs)
+
+
+def test_refills_are_bounded_and_share_the_llm_slots(tmp_path):
+    slots = threading.BoundedSemaphore(1)
+    bank = ExerciseBank(str(tmp_path / 'bank.db'), llm_factory = lambda: SlowLLM(responses = ['exercise']),
+                        refill_count = 2, refill_workers = 2, llm_slot = lambda: slots)
+
+    #a miss on every key queues one refill per key, not one thread per key
+    before = threading.active_count()
+    keys = [(topic, difficulty) for topic in list(TOPICS)[:6] for difficulty in DIFFICULTIES]
+    for topic, difficulty in keys:
+        bank.serve('Python', f"Give me a {difficulty} exercise on {TOPICS[topic][0]}")
+        bank.serve('Python', f"Give me a {difficulty} exercise on {TOPICS[topic][0]}")
+    assert threading.active_count() - before <= 2
+
+    bank._refill_pool.shutdown(wait = True)
+    assert calls['peak'] == 1
+    assert all(bank.count('Python', topic, difficulty) == 2 for topic, difficulty in keys)
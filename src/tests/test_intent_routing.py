@@ -0,0 +1,35 @@
+"""Adaptive turns routed to a specialized tutor prompt"""
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.fake import FakeListLLM
+
+from orchestrations.factory import build_orchestration
+from resources.metrics import metrics
+
+
+class PromptRecorder(BaseCallbackHandler):
+    def __init__(self):
+        self.prompts = []
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.prompts.extend(prompts)
+
+
+def routed_turns():
+    return sum(count for name, count in metrics.snapshot()['counters'].items() if name.startswith('intent_router.route.'))
+
+
+def test_multi_agent_turn_is_routed_once():
+    recorder = PromptRecorder()
+    llm = FakeListLLM(responses = ['A short answer.'], callbacks = [recorder])
+    orchestrator = build_orchestration(llm, {'language': 'Python', 'mode': 'adaptive', 'orchestration_type': 'multi-agent'})
+
+    before = routed_turns()
+    latency_before = metrics.snapshot()['observations'].get('intent_router.latency', {}).get('count', 0)
+    orchestrator.run_workflow('my code crashes with a TypeError, how do I fix this error?')
+
+    assert routed_turns() == before + 1
+    assert metrics.snapshot()['observations']['intent_router.latency']['count'] == latency_before + 1
+
+    #the revision uses the same specialized prompt as the first draft
+    [initial, _, _, revision] = recorder.prompts
+    assert 'debugging' in initial and 'debugging' in revision
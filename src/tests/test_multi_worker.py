@@ -0,0 +1,64 @@
+"""Several worker processes serving one conversation store"""
+import os
+import sys
+import subprocess
+
+import pytest
+import requests
+
+from resources.conversation_store import ConversationStore, generate_conversation_id
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#appends a tagged message pair per step to one conversation, from its own process
+APPEND_SCRIPT = """
+import sys
+from resources.conversation_store import ConversationStore
+backend, directory, conversation_id, worker, steps = sys.argv[1:]
+store = ConversationStore.from_config({'backend': backend, 'directory': directory})
+for step in range(int(steps)):
+    store.append_messages(conversation_id, [
+        {'role': 'user', 'content': f'{worker}:{step}:question'},
+        {'role': 'tutor', 'content': f'{worker}:{step}:answer'}
+    ], {'language': 'Python'})
+"""
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'json'])
+def test_two_processes_append_to_one_store(tmp_path, backend):
+    conversation_id = generate_conversation_id()
+    steps = 30
+
+    workers = [subprocess.Popen([sys.executable, '-c', APPEND_SCRIPT, backend, str(tmp_path), conversation_id, worker, str(steps)],
+                                cwd = SRC_DIR)
+               for worker in ('a', 'b')]
+    assert [worker.wait(timeout = 60) for worker in workers] == [0, 0]
+
+    store = ConversationStore.from_config({'backend': backend, 'directory': str(tmp_path)})
+    messages = store.load(conversation_id)['messages']
+    assert len(messages) == 2 * 2 * steps
+
+    #no append was lost or interleaved, and each worker's turns kept their order
+    for worker in ('a', 'b'):
+        contents = [m['content'] for m in messages if m['content'].startswith(worker + ':')]
+        assert contents == [f'{worker}:{step}:{part}' for step in range(steps) for part in ('question', 'answer')]
+
+
+def test_two_app_workers_serve_one_session(fake_ollama, app_workers):
+    #both workers start at once, racing to create the shared session key
+    urls = app_workers(fake_ollama(), count = 2)
+
+    #the session starts on the first worker
+    client = requests.Session()
+    response = client.post(f"{urls[0]}/api/configure",
+                           json = {'language': 'Python', 'orchestration_type': 'single', 'mode': 'debug'})
+    conversation_id = response.json()['conversation_id']
+    assert client.post(f"{urls[0]}/api/send_message", json = {'message': 'first'}).json()['success']
+
+    #the same cookie continues it on the second worker, which rebuilds the orchestrator from the store
+    response = client.post(f"{urls[1]}/api/send_message", json = {'message': 'second'})
+    assert response.json()['success']
+
+    for url in urls:
+        data = client.get(f"{url}/api/load_conversation/{conversation_id}").json()['data']
+        assert [m['content'] for m in data['messages'] if m['role'] == 'user'] == ['first', 'second']
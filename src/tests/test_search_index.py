@@ -0,0 +1,34 @@
+"""Full-text search over stored messages"""
+import sqlite3
+
+from resources.search_index import SearchIndex
+
+CONVERSATION_ID = '0123456789abcdef0123456789abcdef'
+#a pasted terminal capture with stray control characters
+CONTENT = 'before \x02 not highlighted \x03 after: the recursion needs a base case'
+
+
+def test_marker_characters_in_messages_are_not_highlighted(tmp_path):
+    index = SearchIndex(str(tmp_path / 'search.db'))
+    index.add_messages(CONVERSATION_ID, [{'seq': 0, 'role': 'user', 'content': CONTENT}], {'language': 'Python'})
+
+    [result] = index.search('recursion')['results']
+    assert result['snippet'].count('<mark>') == result['snippet'].count('</mark>') == 1
+    assert '<mark>recursion</mark>' in result['snippet']
+    assert '\x02' not in result['snippet'] and '\x03' not in result['snippet']
+
+
+def test_indexes_written_before_are_cleaned_on_open(tmp_path):
+    path = str(tmp_path / 'search.db')
+    SearchIndex(path)
+
+    #what an older version stored
+    conn = sqlite3.connect(path, isolation_level = None)
+    conn.execute("INSERT INTO documents (id, conversation_id, seq, role, content) VALUES (1, ?, 0, 'user', ?)",
+                 (CONVERSATION_ID, CONTENT))
+    conn.execute('INSERT INTO documents_fts (rowid, content) VALUES (1, ?)', (CONTENT,))
+    conn.execute('PRAGMA user_version = 0')
+    conn.close()
+
+    [result] = SearchIndex(path).search('recursion')['results']
+    assert result['snippet'].count('<mark>') == 1
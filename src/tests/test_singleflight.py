@@ -0,0 +1,130 @@
+"""Coalescing identical in-flight calls"""
+import time
+import threading
+
+from resources.singleflight import SingleFlight
+
+
+def slow_stream(chunks, delay = 0.01):
+    def generate():
+        for chunk in chunks:
+            time.sleep(delay)
+            yield chunk
+    return generate
+
+
+def run_in_threads(*targets):
+    #daemon threads, so a caller stuck forever fails the test instead of hanging the run
+    threads = [threading.Thread(target = target, daemon = True) for target in targets]
+    for thread in threads:
+        thread.start()
+        #the first target becomes the leader
+        time.sleep(0.005)
+    for thread in threads:
+        thread.join(timeout = 5)
+    assert not any(thread.is_alive() for thread in threads), 'a caller never returned'
+
+
+def test_identical_calls_share_one_execution():
+    flight = SingleFlight('test')
+    executions = []
+    results = []
+
+    def fn():
+        executions.append(1)
+        time.sleep(0.05)
+        return 'answer'
+
+    run_in_threads(*[lambda: results.append(flight.do('key', fn)) for _ in range(4)])
+    assert results == ['answer'] * 4
+    assert len(executions) == 1
+
+
+def test_stream_followers_receive_the_whole_stream():
+    flight = SingleFlight('test')
+    outputs = []
+    source = slow_stream(['a', 'b', 'c', 'd'])
+
+    run_in_threads(*[lambda: outputs.append(''.join(flight.stream('key', source))) for _ in range(3)])
+    assert outputs == ['abcd'] * 3
+
+
+def test_plain_and_streamed_calls_with_one_key_do_not_share():
+    flight = SingleFlight('test')
+    results = {}
+
+    #a streamed call joining a plain call's key used to wait forever, and the reverse got None
+    def plain():
+        time.sleep(0.05)
+        return 'plain answer'
+
+    run_in_threads(lambda: results.update(do = flight.do('key', plain)),
+                   lambda: results.update(stream = ''.join(flight.stream('key', slow_stream(['streamed'])))))
+    assert results == {'do': 'plain answer', 'stream': 'streamed'}
+
+    run_in_threads(lambda: results.update(stream = ''.join(flight.stream('key', slow_stream(['x', 'y'], 0.03)))),
+                   lambda: results.update(do = flight.do('key', lambda: 'plain again')))
+    assert results == {'do': 'plain again', 'stream': 'xy'}
+
+
+def test_abandoned_stream_stops_once_its_followers_leave():
+    flight = SingleFlight('test')
+    produced = []
+    closed = threading.Event()
+
+    def source():
+        try:
+            for i in range(200):
+                time.sleep(0.01)
+                produced.append(i)
+                yield str(i)
+        finally:
+            closed.set()
+
+    def leader():
+        stream = flight.stream('key', source)
+        next(stream)
+        #the leader's client cancels while a follower still shares the call
+        time.sleep(0.05)
+        stream.close()
+
+    def follower():
+        stream = flight.stream('key', source)
+        for i, _ in enumerate(stream):
+            if i == 10:
+                break
+        stream.close()
+
+    run_in_threads(leader, follower)
+    assert closed.wait(1), 'the stream kept generating for nobody'
+    assert len(produced) < 200
+
+
+def test_cancelled_follower_stops_waiting_for_the_leader():
+    flight = SingleFlight('test')
+    release = threading.Event()
+    cancelled = threading.Event()
+    received = []
+
+    def source():
+        #a long prefill before the first token
+        release.wait(5)
+        yield 'late'
+
+    def follower():
+        received.extend(flight.stream('key', source, cancelled = cancelled.is_set, poll_interval = 0.01))
+        received.append('stopped')
+
+    leader = threading.Thread(target = lambda: list(flight.stream('key', source)), daemon = True)
+    leader.start()
+    time.sleep(0.02)
+    waiting = threading.Thread(target = follower, daemon = True)
+    waiting.start()
+
+    cancelled.set()
+    waiting.join(timeout = 1)
+    assert not waiting.is_alive(), 'the cancelled follower kept waiting'
+    assert received == ['stopped']
+
+    release.set()
+    leader.join(timeout = 5)
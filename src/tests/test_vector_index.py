@@ -0,0 +1,77 @@
+from resources.conversation_store import ConversationStore
+from resources.vector_index import ConversationVectorIndex, select_history
+
+CONVERSATION_ID = '0123456789abcdef0123456789abcdef'
+
+
+def message(seq, content):
+    return {'seq': seq, 'role': 'user', 'content': content}
+
+
+def test_code_blocks_with_any_language_tag_are_indexed(tmp_path):
+    index = ConversationVectorIndex(str(tmp_path))
+    index.add_messages(CONVERSATION_ID, [
+        message(0, "Why does this not compile?\n```java\nint total = items.size()\n```"),
+        message(1, "Thanks, that helped with my homework question."),
+    ])
+
+    assert index.search(CONVERSATION_ID, 'int total = items.size()', 1) == [0]
+    #the message and its code block
+    assert len(index._load(CONVERSATION_ID)['seqs']) == 3
+
+
+def test_appends_are_read_incrementally_across_indexes(tmp_path):
+    writer = ConversationVectorIndex(str(tmp_path))
+    reader = ConversationVectorIndex(str(tmp_path))
+
+    writer.add_messages(CONVERSATION_ID, [message(0, 'for loops in python'), message(1, '')])
+    assert reader.covers(CONVERSATION_ID, 2)
+    offset = reader._load(CONVERSATION_ID)['offset']
+
+    #another worker appends; the reader only reads the new record
+    writer.add_messages(CONVERSATION_ID, [message(2, 'recursion and base cases')])
+    assert reader.covers(CONVERSATION_ID, 3)
+    assert reader._load(CONVERSATION_ID)['offset'] == offset + reader.record.itemsize
+    assert reader.search(CONVERSATION_ID, 'recursion base case', 1) == [2]
+
+    #replays append nothing
+    writer.add_messages(CONVERSATION_ID, [message(2, 'recursion and base cases')])
+    assert reader._load(CONVERSATION_ID)['offset'] == offset + reader.record.itemsize
+
+
+def test_torn_record_is_skipped_and_replaced(tmp_path):
+    index = ConversationVectorIndex(str(tmp_path))
+    index.add_messages(CONVERSATION_ID, [message(0, 'while loops')])
+    with open(index._path(CONVERSATION_ID), 'ab') as f:
+        f.write(b'\x01\x02\x03')
+
+    fresh = ConversationVectorIndex(str(tmp_path))
+    assert fresh.covers(CONVERSATION_ID, 1)
+    fresh.add_messages(CONVERSATION_ID, [message(1, 'dictionaries and keys')])
+
+    assert ConversationVectorIndex(str(tmp_path)).search(CONVERSATION_ID, 'dictionary keys', 1) == [1]
+
+    index.delete(CONVERSATION_ID)
+    assert not index.covers(CONVERSATION_ID, 1)
+
+
+def test_retrieved_messages_come_with_the_rest_of_their_turn(tmp_path):
+    store = ConversationStore.from_config({'backend': 'sqlite', 'directory': str(tmp_path)})
+    index = ConversationVectorIndex(str(tmp_path / 'vectors'))
+    store.add_listener(index.add_messages)
+
+    turns = [('How do I reverse a list?', 'Use slicing with a negative step.'),
+             ('What is a dictionary?', 'A mapping from keys to values, for example ages by name.'),
+             ('Explain recursion', 'A function that calls itself until it reaches a base case.')]
+    turns += [(f'Filler question {i}', f'Filler answer {i}') for i in range(4)]
+    for question, answer in turns:
+        store.append_messages(CONVERSATION_ID, [{'role': 'user', 'content': question},
+                                                {'role': 'tutor', 'content': answer}], {'language': 'Python'})
+    current = store.append_messages(CONVERSATION_ID, [{'role': 'user', 'content': 'values stored by keys again'}])
+
+    history = select_history(store, index, CONVERSATION_ID, 'values stored by keys again', current['start_seq'],
+                             recent = 4, retrieved = 1)
+
+    #the match is the tutor's answer, and the question it answered comes with it
+    assert [message['content'] for message in history[:2]] == list(turns[1])
+    assert len(history) == 6
@@ -0,0 +1,60 @@
+"""
+Pre-generate the exercise bank served in exercises mode.
+
+Stocks every (language, topic, difficulty) key with exercises generated by
+the tutor's own exercise prompt, so matching student requests are answered
+without an LLM call. Keys that already hold enough exercises are skipped,
+so the job can be re-run to top the bank up.
+
+    cd src
+    python -m tools.build_exercise_bank --per-key 5 --workers 2
+"""
+import os
+import argparse
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from langchain_community.llms import Ollama
+
+from resources.exercise_bank import ExerciseBank, TOPICS, DIFFICULTIES
+
+LANGUAGES = ["Python", "Java", "C++", "Go", "C"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Pre-generate exercises for the exercise bank')
+    parser.add_argument('--bank', default = os.path.join('conversations', 'exercise_bank.db'))
+    parser.add_argument('--per-key', type = int, default = 5, help = 'exercises to stock per language/topic/difficulty')
+    parser.add_argument('--languages', nargs = '+', default = LANGUAGES)
+    parser.add_argument('--topics', nargs = '+', default = list(TOPICS))
+    parser.add_argument('--difficulties', nargs = '+', default = DIFFICULTIES)
+    parser.add_argument('--workers', type = int, default = 1, help = 'concurrent Ollama requests')
+    parser.add_argument('--model', default = 'llama3.2:3b')
+    parser.add_argument('--base-url', default = 'http://localhost:11434')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.bank) or '.', exist_ok = True)
+    bank = ExerciseBank(args.bank)
+    llm = Ollama(model = args.model, base_url = args.base_url, temperature = 0.7)
+
+    #only generate what each key is missing
+    jobs = []
+    for language, topic, difficulty in itertools.product(args.languages, args.topics, args.difficulties):
+        missing = args.per_key - bank.count(language, topic, difficulty)
+        if missing > 0:
+            jobs.append((language, topic, difficulty, missing))
+
+    print(f"Generating exercises for {len(jobs)} keys")
+
+    with ThreadPoolExecutor(max_workers = args.workers) as executor:
+        futures = {executor.submit(bank.generate, llm, *job): job for job in jobs}
+        for future in as_completed(futures):
+            language, topic, difficulty, _ = futures[future]
+            try:
+                print(f"{language} / {topic} / {difficulty}: stored {future.result()}")
+            except Exception as e:
+                print(f"{language} / {topic} / {difficulty}: failed ({e})")
+
+
+if __name__ == '__main__':
+    main()
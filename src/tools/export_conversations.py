@@ -0,0 +1,91 @@
+"""
+Export stored conversations as NDJSON for analytics.
+
+Reads the conversation store directly (including archived conversations),
+one conversation at a time, so memory use stays flat however large the
+store is. Each line is one conversation with its messages and per-turn
+metadata such as agent stage timings.
+
+    cd src
+    python -m tools.export_conversations --output export.ndjson --since 2025-01-01 --language Python
+    python -m tools.export_conversations --output export.ndjson --resume
+
+--resume continues an interrupted export after the last complete line of
+the output file.
+"""
+import os
+import sys
+import json
+import argparse
+
+from resources.conversation_store import ConversationStore
+from resources.archive import ConversationArchive, TieredConversationStore
+from resources.export import export_conversations, to_ndjson
+
+
+def last_exported_id(path: str):
+    """Id of the last complete line of a previous export, dropping a partially written line"""
+    if not os.path.exists(path):
+        return None
+
+    last_id = None
+    complete_bytes = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                last_id = json.loads(line)['id']
+            except (ValueError, KeyError):
+                break
+            complete_bytes += len(line)
+
+    #cut off whatever was being written when the export stopped
+    with open(path, 'ab') as f:
+        f.truncate(complete_bytes)
+    return last_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Stream conversations out of the store as NDJSON')
+    parser.add_argument('--conversations', default = os.environ.get('DDT_CONVERSATIONS_DIR', 'conversations'))
+    parser.add_argument('--backend', default = os.environ.get('DDT_STORE_BACKEND', 'sqlite'), choices = ['sqlite', 'json'])
+    parser.add_argument('--output', help = 'file to write, stdout when omitted')
+    parser.add_argument('--resume', action = 'store_true', help = 'continue after the last line already in --output')
+    parser.add_argument('--after', help = 'only export conversations whose id sorts after this cursor')
+    parser.add_argument('--since', help = 'last updated on or after this ISO date')
+    parser.add_argument('--until', help = 'last updated before this ISO date')
+    parser.add_argument('--language')
+    parser.add_argument('--mode')
+    parser.add_argument('--orchestration')
+    parser.add_argument('--limit', type = int)
+    args = parser.parse_args()
+
+    after = args.after
+    if args.resume:
+        if not args.output:
+            parser.error('--resume needs --output')
+        after = last_exported_id(args.output) or after
+
+    store = ConversationStore.from_config({'backend': args.backend, 'directory': args.conversations})
+    store = TieredConversationStore(store, ConversationArchive(os.path.join(args.conversations, 'archive')))
+
+    filters = {'since': args.since, 'until': args.until, 'language': args.language,
+               'mode': args.mode, 'orchestration': args.orchestration}
+    records = export_conversations(store, filters, after = after, limit = args.limit)
+
+    output = open(args.output, 'a' if args.resume else 'w') if args.output else sys.stdout
+    count = 0
+    try:
+        for line in to_ndjson(records):
+            output.write(line)
+            count += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"Exported {count} conversations", file = sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+A local stand-in for the Ollama HTTP API, for load testing without a GPU.
+
+Implements the streaming /api/generate endpoint used by the app's Ollama
+client. Each request waits a simulated prefill time proportional to the
+prompt length, then streams tokens at a fixed pace. Responses are canned
+text, or are replayed from a cassette when one is given.
+
+    cd src
+    python -m tools.fake_ollama --port 11434 --token-ms 20
+"""
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, List
+
+from resources.cassette import ReplayLLM
+
+DEFAULT_RESPONSE = ("Great question! Here is a short explanation with an example.\n\n"
+                    "```python\nfor i in range(3):\n    print(i)\n```\n\n"
+                    "This loop prints 0, 1 and 2. Try changing the range to see what happens.")
+
+
+class FakeOllamaSettings:
+    def __init__(self, prefill_ms_per_1k_chars: float = 50.0, token_ms: float = 20.0,
+                 response: str = DEFAULT_RESPONSE, replay: Optional[ReplayLLM] = None,
+                 max_concurrency: int = 0):
+        """
+        Timing model of the fake server.
+
+        Args
+            prefill_ms_per_1k_chars: simulated prompt processing time per 1000 prompt characters
+            token_ms: delay between streamed tokens
+            response: canned response text
+            replay: optional cassette replayer used instead of the canned text
+            max_concurrency: generations served at once, 0 for unlimited (Ollama defaults to a few)
+        """
+        self.prefill_ms_per_1k_chars = prefill_ms_per_1k_chars
+        self.token_ms = token_ms
+        self.response = response
+        self.replay = replay
+        self.slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+
+    def tokens_for(self, prompt: str) -> List[str]:
+        """Split the response to a prompt into streamed tokens"""
+        text = self.replay.invoke(prompt) if self.replay else self.response
+        words = text.split(' ')
+        return [word if i == 0 else ' ' + word for i, word in enumerate(words)]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    settings = FakeOllamaSettings()
+
+    def log_message(self, format, *args):
+        """Silence per-request logging"""
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        """Health checks and model listing"""
+        if self.path in ('/', '/api/tags'):
+            self._send_json(200, {'models': [{'name': 'fake'}]})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        """Serve /api/generate as a stream of NDJSON lines"""
+        if self.path != '/api/generate':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        prompt = request.get('prompt', '')
+        model = request.get('model', 'fake')
+
+        settings = self.settings
+        if settings.slots:
+            settings.slots.acquire()
+        try:
+            self._generate(settings, model, prompt, request.get('stream', True))
+        except (BrokenPipeError, ConnectionResetError):
+            #client went away mid-stream
+            pass
+        finally:
+            if settings.slots:
+                settings.slots.release()
+
+    def _generate(self, settings: FakeOllamaSettings, model: str, prompt: str, stream: bool):
+        """Simulate prefill and token generation for one request"""
+        start = time.perf_counter()
+        time.sleep(settings.prefill_ms_per_1k_chars * len(prompt) / 1000.0 / 1000.0)
+        tokens = settings.tokens_for(prompt)
+
+        if not stream:
+            time.sleep(settings.token_ms * len(tokens) / 1000.0)
+            self._send_json(200, self._line(model, ''.join(tokens), True, start, len(prompt), len(tokens)))
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+
+        for token in tokens:
+            time.sleep(settings.token_ms / 1000.0)
+            self._write_line(self._line(model, token, False, start))
+        self._write_line(self._line(model, '', True, start, len(prompt), len(tokens)))
+
+    def _write_line(self, body: Dict[str, Any]):
+        self.wfile.write((json.dumps(body) + '\n').encode('utf-8'))
+        self.wfile.flush()
+
+    def _line(self, model: str, text: str, done: bool, start: float,
+              prompt_chars: int = 0, token_count: int = 0) -> Dict[str, Any]:
+        """Build one response object in Ollama's format"""
+        line = {
+            'model': model,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'response': text,
+            'done': done
+        }
+        if done:
+            line.update({
+                'total_duration': int((time.perf_counter() - start) * 1e9),
+                'prompt_eval_count': prompt_chars // 4,
+                'eval_count': token_count
+            })
+        return line
+
+
+def start_server(settings: FakeOllamaSettings, host: str = '127.0.0.1', port: int = 11434) -> ThreadingHTTPServer:
+    """
+    Start the fake server on a background thread.
+
+    Returns
+        The running server, stop it with shutdown()
+    """
+    handler = type('ConfiguredFakeOllamaHandler', (FakeOllamaHandler,), {'settings': settings})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Run a fake Ollama server for load testing')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 11434)
+    parser.add_argument('--prefill-ms-per-1k-chars', type = float, default = 50.0)
+    parser.add_argument('--token-ms', type = float, default = 20.0)
+    parser.add_argument('--max-concurrency', type = int, default = 0)
+    parser.add_argument('--cassette', help = 'replay responses from a recorded cassette')
+    args = parser.parse_args()
+
+    replay = None
+    if args.cassette:
+        replay = ReplayLLM(cassette_path = args.cassette, latency_scale = 0, fallback = 'cycle')
+
+    settings = FakeOllamaSettings(args.prefill_ms_per_1k_chars, args.token_ms, replay = replay,
+                                  max_concurrency = args.max_concurrency)
+    server = start_server(settings, args.host, args.port)
+    print(f"Fake Ollama listening on http://{args.host}:{args.port}")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
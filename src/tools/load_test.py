@@ -0,0 +1,374 @@
+"""
+Simulate many concurrent students against the tutoring HTTP API.
+
+Every simulated student starts a session with /api/configure and then works
+through a multi-turn script with /api/send_message. Sessions rotate through
+the supported languages, modes and orchestrations. The run is summarized as
+throughput, latency percentiles, time to first byte and error rates, and
+saved as JSON so capacity can be compared across releases.
+
+With --transport ws, students send their messages over the streaming
+/ws/chat WebSocket instead of /api/send_message, and time to first byte is
+the time until the first token of the answer arrives:
+
+    python -m tools.load_test --start-fake-ollama --start-app --students 50 --transport ws
+
+Run against an already running app,
+
+    cd src
+    python -m tools.load_test --url http://localhost:5000 --students 20
+
+or let the tool start a fake Ollama server and the app itself,
+
+    python -m tools.load_test --start-fake-ollama --start-app --students 50 --turns 4
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import itertools
+import subprocess
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import requests
+
+try:
+    from simple_websocket import Client as WebSocketClient
+except ImportError:
+    #only needed for --transport ws
+    WebSocketClient = None
+
+from tools.fake_ollama import FakeOllamaSettings, start_server
+from tools.stats import summarize_latencies
+
+LANGUAGES = ["Python", "Java", "C++", "Go", "C"]
+MODES = ["adaptive", "debug", "fundamentals", "examples", "exercises", "feedback"]
+ORCHESTRATIONS = ["single", "multi-agent"]
+
+#endpoint labels of samples that are chat turns
+TURN_ENDPOINTS = ('send_message', 'ws_chat')
+
+#turns sent by each student, in order
+SCRIPTS = {
+    'adaptive': ["What is a variable in {language}?", "Can you show me an example?", "How would I use that in a loop?",
+                 "Thanks, can you give me a short exercise?"],
+    'debug': ["Why does this {language} code fail?\n```\nfor i in range(10)\n    print(i)\n```",
+              "I fixed that, now I get an index error.", "Why did that happen?", "How can I avoid it next time?"],
+    'fundamentals': ["Explain functions in {language}.", "What is a return value?", "What about default arguments?",
+                     "How does scope work?"],
+    'examples': ["Show me an example of reading a file in {language}.", "Now show it with error handling.",
+                 "Can you make it a function?", "How would I test it?"],
+    'exercises': ["Give me a beginner exercise on loops in {language}.", "Here is my answer: I used a while loop.",
+                  "Can I have a harder one?", "Can you give me a hint?"],
+    'feedback': ["Can you review my {language} code?\n```\ndef add(a, b):\n    return a+b\n```",
+                 "Is my naming good?", "How could I make it more efficient?", "Did I understand recursion correctly?"]
+}
+
+
+class Results:
+    def __init__(self):
+        """Thread-safe collection of request samples"""
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def add(self, sample: Dict[str, Any]):
+        with self._lock:
+            self.samples.append(sample)
+
+
+def timed_post(http: requests.Session, url: str, body: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """
+    POST a JSON body and time it.
+
+    Returns
+        Sample dict with latency, time to first byte, status and error
+    """
+    start = time.perf_counter()
+    sample = {'ttfb': None, 'status': None, 'error': None, 'body': None}
+    try:
+        with http.post(url, json = body, timeout = timeout, stream = True) as response:
+            sample['status'] = response.status_code
+            chunks = []
+            for chunk in response.iter_content(chunk_size = None):
+                if sample['ttfb'] is None:
+                    sample['ttfb'] = time.perf_counter() - start
+                chunks.append(chunk)
+            raw = b''.join(chunks)
+
+        sample['body'] = json.loads(raw) if raw else None
+        if response.status_code >= 400 or not (sample['body'] or {}).get('success'):
+            sample['error'] = f"HTTP {response.status_code}"
+    except Exception as e:
+        sample['error'] = type(e).__name__
+
+    sample['latency'] = time.perf_counter() - start
+    return sample
+
+
+def timed_ws_turn(ws, message: str, timeout: float) -> Dict[str, Any]:
+    """
+    Send one message over the chat WebSocket and time its streamed answer.
+
+    Returns
+        Sample dict with latency, time to first token (as ttfb), status and error
+    """
+    start = time.perf_counter()
+    sample = {'ttfb': None, 'status': None, 'error': None, 'body': None}
+    try:
+        ws.send(json.dumps({'type': 'send', 'message': message}))
+        while True:
+            raw = ws.receive(timeout = max(0.0, timeout - (time.perf_counter() - start)))
+            if raw is None:
+                sample['error'] = 'Timeout'
+                break
+
+            event = json.loads(raw)
+            if event['type'] == 'token' and sample['ttfb'] is None:
+                sample['ttfb'] = time.perf_counter() - start
+            elif event['type'] == 'done':
+                sample['status'] = 'done'
+                sample['body'] = {'success': True, 'response': event.get('response', '')}
+                break
+            elif event['type'] in ('error', 'cancelled'):
+                sample['status'] = event['type']
+                sample['error'] = 'WebSocketError' if event['type'] == 'error' else 'Cancelled'
+                break
+    except Exception as e:
+        sample['error'] = type(e).__name__
+
+    sample['latency'] = time.perf_counter() - start
+    return sample
+
+
+def connect_chat_socket(http: requests.Session, base_url: str):
+    """Open the session's chat WebSocket, sending the session cookie"""
+    cookies = '; '.join(f"{name}={value}" for name, value in http.cookies.items())
+    url = base_url.replace('http://', 'ws://', 1).replace('https://', 'wss://', 1) + '/ws/chat'
+    return WebSocketClient.connect(url, headers = {'Cookie': cookies})
+
+
+def run_student(index: int, base_url: str, turns: int, timeout: float, results: Results, transport: str = 'rest'):
+    """Run one simulated student's session over the REST routes or the chat WebSocket"""
+    config = {
+        'language': LANGUAGES[index % len(LANGUAGES)],
+        'mode': MODES[(index // len(LANGUAGES)) % len(MODES)],
+        'orchestration_type': ORCHESTRATIONS[index % len(ORCHESTRATIONS)]
+    }
+    labels = {'student': index, 'orchestration': config['orchestration_type'], 'mode': config['mode']}
+
+    #each student keeps their own session cookie
+    http = requests.Session()
+
+    sample = timed_post(http, f"{base_url}/api/configure", config, timeout)
+    results.add(dict(labels, endpoint = 'configure', **{k: v for k, v in sample.items() if k != 'body'}))
+    if sample['error']:
+        return
+
+    ws = None
+    if transport == 'ws':
+        try:
+            ws = connect_chat_socket(http, base_url)
+        except Exception as e:
+            results.add(dict(labels, endpoint = 'ws_chat', ttfb = None, status = None, error = type(e).__name__, latency = 0.0))
+            return
+
+    try:
+        script = itertools.cycle(SCRIPTS[config['mode']])
+        for _ in range(turns):
+            message = next(script).format(language = config['language'])
+            if ws is not None:
+                sample = timed_ws_turn(ws, message, timeout)
+            else:
+                sample = timed_post(http, f"{base_url}/api/send_message", {'message': message}, timeout)
+
+            #the app answers with an apology when the workflow itself fails
+            response = (sample['body'] or {}).get('response', '')
+            if not sample['error'] and response.startswith('I apologize, but I encountered an error'):
+                sample['error'] = 'WorkflowError'
+
+            endpoint = 'ws_chat' if ws is not None else 'send_message'
+            results.add(dict(labels, endpoint = endpoint, **{k: v for k, v in sample.items() if k != 'body'}))
+    finally:
+        if ws is not None:
+            ws.close()
+
+
+def summarize(samples: List[Dict[str, Any]], duration: float) -> Dict[str, Any]:
+    """Aggregate request samples into throughput, latency and error statistics"""
+    ok = [s for s in samples if not s['error']]
+    errors = {}
+    for s in samples:
+        if s['error']:
+            errors[s['error']] = errors.get(s['error'], 0) + 1
+
+    return {
+        'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'error_rate': (len(samples) - len(ok)) / len(samples) if samples else 0.0,
+        'error_types': errors,
+        'throughput_rps': len(ok) / duration if duration else 0.0,
+        'latency': summarize_latencies([s['latency'] for s in ok]),
+        #the REST routes answer in one piece, over the WebSocket this is the time to the first token
+        'time_to_first_byte': summarize_latencies([s['ttfb'] for s in ok if s['ttfb'] is not None])
+    }
+
+
+def group_by(samples: List[Dict[str, Any]], key: str, duration: float) -> Dict[str, Any]:
+    """Summarize samples separately for every value of a label"""
+    groups = {}
+    for s in samples:
+        groups.setdefault(str(s[key]), []).append(s)
+    return {name: summarize(group, duration) for name, group in sorted(groups.items())}
+
+
+def free_port() -> int:
+    """Find an unused local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_app(port: int, ollama_url: str) -> subprocess.Popen:
+    """Start the Flask app in a subprocess with a throwaway conversation store"""
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ,
+               DDT_OLLAMA_BASE_URL = ollama_url,
+               DDT_CONVERSATIONS_DIR = tempfile.mkdtemp(prefix = 'ddt_load_'))
+    process = subprocess.Popen(
+        [sys.executable, '-c', f"import app; app.app.run(port={port}, threaded=True)"],
+        cwd = src_dir, env = env, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+
+    #wait for the app to accept connections
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/conversations", timeout = 1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.2)
+
+    process.terminate()
+    raise RuntimeError('The app did not start within 30 seconds')
+
+
+def run_load_test(base_url: str, students: int, turns: int, ramp_up: float, timeout: float,
+                  transport: str = 'rest') -> Dict[str, Any]:
+    """
+    Run every simulated student concurrently and summarize the run.
+
+    Args
+        base_url: address of the app
+        students: number of concurrent students
+        turns: messages sent by each student
+        ramp_up: seconds over which student start times are spread
+        timeout: per-request timeout in seconds
+        transport: "rest" for /api/send_message, "ws" for the streaming /ws/chat
+
+    Returns
+        Report dict
+    """
+    results = Results()
+    threads = []
+    start = time.perf_counter()
+
+    for index in range(students):
+        thread = threading.Thread(target = run_student, args = (index, base_url, turns, timeout, results, transport))
+        thread.start()
+        threads.append(thread)
+        if ramp_up and students > 1:
+            time.sleep(ramp_up / (students - 1))
+
+    for thread in threads:
+        thread.join()
+
+    duration = time.perf_counter() - start
+    samples = results.samples
+
+    return {
+        'overall': summarize(samples, duration),
+        'by_endpoint': group_by(samples, 'endpoint', duration),
+        'by_orchestration': group_by([s for s in samples if s['endpoint'] in TURN_ENDPOINTS], 'orchestration', duration),
+        'by_mode': group_by([s for s in samples if s['endpoint'] in TURN_ENDPOINTS], 'mode', duration),
+        'duration': duration
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Load test the tutoring API with concurrent simulated students')
+    parser.add_argument('--url', default = 'http://localhost:5000', help = 'address of a running app')
+    parser.add_argument('--students', type = int, default = 10)
+    parser.add_argument('--turns', type = int, default = 3, help = 'messages sent by each student')
+    parser.add_argument('--ramp-up', type = float, default = 0.0, help = 'seconds to spread student starts over')
+    parser.add_argument('--timeout', type = float, default = 300.0)
+    parser.add_argument('--transport', default = 'rest', choices = ['rest', 'ws'],
+                        help = 'send messages with /api/send_message or over the /ws/chat WebSocket')
+    parser.add_argument('--start-fake-ollama', action = 'store_true', help = 'serve a fake Ollama from this process')
+    parser.add_argument('--fake-ollama-port', type = int, default = 0)
+    parser.add_argument('--token-ms', type = float, default = 20.0)
+    parser.add_argument('--prefill-ms-per-1k-chars', type = float, default = 50.0)
+    parser.add_argument('--max-concurrency', type = int, default = 4, help = 'generations the fake Ollama serves at once')
+    parser.add_argument('--start-app', action = 'store_true', help = 'start the app in a subprocess')
+    parser.add_argument('--output', help = 'report file, defaults to load_results/load_<timestamp>.json')
+    args = parser.parse_args()
+
+    if args.transport == 'ws' and WebSocketClient is None:
+        parser.error('--transport ws needs the simple-websocket package (installed with flask-sock)')
+
+    fake_server = None
+    app_process = None
+    base_url = args.url.rstrip('/')
+
+    try:
+        ollama_url = None
+        if args.start_fake_ollama:
+            settings = FakeOllamaSettings(args.prefill_ms_per_1k_chars, args.token_ms,
+                                          max_concurrency = args.max_concurrency)
+            fake_server = start_server(settings, port = args.fake_ollama_port)
+            ollama_url = f"http://127.0.0.1:{fake_server.server_address[1]}"
+
+        if args.start_app:
+            port = free_port()
+            app_process = start_app(port, ollama_url or 'http://localhost:11434')
+            base_url = f"http://127.0.0.1:{port}"
+
+        report = run_load_test(base_url, args.students, args.turns, args.ramp_up, args.timeout, args.transport)
+    finally:
+        if app_process:
+            app_process.terminate()
+            app_process.wait()
+        if fake_server:
+            fake_server.shutdown()
+
+    report['run'] = {
+        'time': datetime.now().isoformat(),
+        'url': base_url,
+        'students': args.students,
+        'turns': args.turns,
+        'transport': args.transport,
+        'ramp_up': args.ramp_up,
+        'fake_ollama': {'token_ms': args.token_ms, 'prefill_ms_per_1k_chars': args.prefill_ms_per_1k_chars,
+                        'max_concurrency': args.max_concurrency} if args.start_fake_ollama else None
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs('load_results', exist_ok = True)
+        output = os.path.join('load_results', f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    overall = report['overall']
+    print(f"{overall['requests']} requests in {report['duration']:.1f}s, "
+          f"{overall['throughput_rps']:.2f} req/s, error rate {overall['error_rate']:.1%}")
+    print(f"latency p50 {overall['latency']['p50']:.3f}s  p95 {overall['latency']['p95']:.3f}s  "
+          f"p99 {overall['latency']['p99']:.3f}s")
+    print(f"Report saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
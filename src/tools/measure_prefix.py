@@ -0,0 +1,154 @@
+"""
+Measure how much prompt prefill the agents of one turn can share.
+
+Runs a script of student messages through an orchestration, capturing every
+rendered prompt, and reports per turn how many leading tokens all of the
+turn's prompts have in common and how many tokens a model server that keeps
+the previous prompt's cache (as Ollama does) would not have to prefill again:
+
+    cd src
+    python -m tools.measure_prefix --script turns.txt --orchestration multi-agent
+    python -m tools.measure_prefix --script turns.txt --cassette cassette.jsonl --per-turn
+
+Without a cassette every agent answers with the same placeholder text.
+Token counts are estimated with a word and punctuation split, close to but
+not exactly what the model's tokenizer produces.
+"""
+import re
+import json
+import argparse
+import tempfile
+from typing import Dict, Any, List
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.fake import FakeListLLM
+
+from orchestrations.factory import build_orchestration
+from resources.cassette import ReplayLLM
+from tools.replay_benchmark import ScriptedConversation
+
+#a word or a punctuation mark with its leading whitespace, roughly one BPE token
+TOKEN_PATTERN = re.compile(r"\s*\w+|\s*[^\w\s]|\s+")
+
+PLACEHOLDER_RESPONSE = ("Here is an explanation with an example:\n```\nprint('hello')\n```\n"
+                        "Try changing the message and running it again.")
+
+
+class PromptRecorder(BaseCallbackHandler):
+    """Keeps every prompt sent to the LLM, in call order"""
+
+    def __init__(self):
+        self.prompts = []
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.prompts.extend(prompts)
+
+
+def estimate_tokens(text: str) -> List[str]:
+    """Split text into approximate model tokens"""
+    return TOKEN_PATTERN.findall(text)
+
+
+def common_prefix_length(a: List[str], b: List[str]) -> int:
+    """Number of leading tokens two token lists share"""
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+def measure_turn(prompts: List[str]) -> Dict[str, Any]:
+    """
+    Measure prefix sharing between the prompts of one turn.
+
+    Args
+        prompts: rendered prompts in the order they were sent
+
+    Returns
+        Dict with calls, prompt_tokens, shared_prefix_tokens (common to every
+        prompt), reused_tokens (each prompt's prefix in common with the one
+        before it, summed) and prefill_tokens (what is left to prefill)
+    """
+    tokens = [estimate_tokens(prompt) for prompt in prompts]
+    prompt_tokens = sum(len(t) for t in tokens)
+
+    #a prefix is only shared when there is more than one prompt
+    shared = len(tokens[0]) if len(tokens) > 1 else 0
+    for t in tokens[1:]:
+        shared = min(shared, common_prefix_length(tokens[0], t))
+
+    reused = sum(common_prefix_length(previous, current) for previous, current in zip(tokens, tokens[1:]))
+
+    return {
+        'calls': len(prompts),
+        'prompt_tokens': prompt_tokens,
+        'shared_prefix_tokens': shared,
+        'reused_tokens': reused,
+        'prefill_tokens': prompt_tokens - reused
+    }
+
+
+def run_script(orchestrator, recorder: PromptRecorder, turns: List[str]) -> List[Dict[str, Any]]:
+    """Send each turn through the orchestration with the app's history selection and measure its prompts"""
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        conversation = ScriptedConversation(directory)
+        for turn in turns:
+            context = conversation.add_student_message(turn)
+
+            recorder.prompts = []
+            state = orchestrator.run_workflow(turn, context=context)
+            results.append(measure_turn(recorder.prompts))
+
+            conversation.add_tutor_message(state)
+
+    return results
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals over all turns and the share of prompt tokens that need no prefill"""
+    totals = {key: sum(result[key] for result in results)
+              for key in ('calls', 'prompt_tokens', 'shared_prefix_tokens', 'reused_tokens', 'prefill_tokens')}
+    totals['turns'] = len(results)
+    totals['mean_shared_prefix_tokens'] = totals['shared_prefix_tokens'] / len(results) if results else 0.0
+    totals['prefill_savings'] = totals['reused_tokens'] / totals['prompt_tokens'] if totals['prompt_tokens'] else 0.0
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Report the prompt prefix shared by a turn's agents")
+    parser.add_argument('--script', required = True, help = 'text file with one student message per line')
+    parser.add_argument('--language', default = 'Python')
+    parser.add_argument('--mode', default = 'adaptive')
+    parser.add_argument('--orchestration', default = 'multi-agent', choices = ['single', 'multi-agent'])
+    parser.add_argument('--cassette', help = 'replay recorded responses instead of a placeholder')
+    parser.add_argument('--per-turn', action = 'store_true', help = 'include the numbers for every turn')
+    args = parser.parse_args()
+
+    with open(args.script, 'r') as f:
+        turns = [line.strip() for line in f if line.strip()]
+
+    recorder = PromptRecorder()
+    if args.cassette:
+        llm = ReplayLLM(cassette_path = args.cassette, latency_scale = 0.0, fallback = 'cycle', callbacks = [recorder])
+    else:
+        llm = FakeListLLM(responses = [PLACEHOLDER_RESPONSE], callbacks = [recorder])
+
+    config = {
+        'language': args.language,
+        'mode': args.mode,
+        'orchestration_type': args.orchestration
+    }
+    results = run_script(build_orchestration(llm, config), recorder, turns)
+
+    report = {'config': config, 'summary': summarize(results)}
+    if args.per_turn:
+        report['turns'] = results
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
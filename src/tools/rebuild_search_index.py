@@ -0,0 +1,44 @@
+"""
+Build or refresh the full-text search index from the conversation store,
+archived conversations included.
+
+The app keeps the index up to date as messages are saved and builds it once
+when it is first created. Run this after restoring conversations from a
+backup, or with --reset to rebuild the index from scratch.
+
+    cd src
+    python -m tools.rebuild_search_index --reset
+"""
+import os
+import time
+import argparse
+
+from resources.conversation_store import ConversationStore
+from resources.archive import ConversationArchive, TieredConversationStore
+from resources.search_index import SearchIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Rebuild the full-text search index over stored conversations')
+    parser.add_argument('--conversations', default = os.environ.get('DDT_CONVERSATIONS_DIR', 'conversations'))
+    parser.add_argument('--backend', default = os.environ.get('DDT_STORE_BACKEND', 'sqlite'), choices = ['sqlite', 'json'])
+    parser.add_argument('--reset', action = 'store_true', help = 'delete the existing index first')
+    args = parser.parse_args()
+
+    path = os.path.join(args.conversations, 'search.db')
+    if args.reset:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    store = ConversationStore.from_config({'backend': args.backend, 'directory': args.conversations})
+    store = TieredConversationStore(store, ConversationArchive(os.path.join(args.conversations, 'archive')))
+    index = SearchIndex(path)
+
+    start = time.perf_counter()
+    count = index.rebuild(store)
+    print(f"Indexed {count} conversations in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark the orchestrations offline by replaying a recorded cassette.
+
+Record a cassette once against a live Ollama server, then replay it on any
+machine to get reproducible timings:
+
+    cd src
+    python -m tools.replay_benchmark cassette.jsonl --script turns.txt --record
+    python -m tools.replay_benchmark cassette.jsonl --script turns.txt --latency-scale 1.0
+
+The script file holds one student message per line. Turns are sent in order
+and saved to a throwaway conversation store, and each turn's history is
+selected from it exactly as in the Flask app (latest messages plus the most
+similar older ones, long messages cut), so a replay renders exactly the
+prompts that were recorded. Timings cover run_workflow only, not the
+history lookup or saving.
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+from typing import Dict, Any, List
+
+from orchestrations.factory import build_orchestration
+from resources.cassette import Cassette, RecordingLLM, ReplayLLM
+from resources.conversation_store import ConversationStore, generate_conversation_id
+from resources.vector_index import ConversationVectorIndex, select_history
+from resources.parser import Parser
+from tools.stats import summarize_latencies
+
+
+class ScriptedConversation:
+    def __init__(self, directory: str):
+        """
+        One conversation kept in a throwaway store, giving each turn the history the app would.
+
+        Args
+            directory: empty folder for the store and its vector index
+        """
+        self.store = ConversationStore.from_config({'backend': 'sqlite', 'directory': directory})
+        self.vector_index = ConversationVectorIndex(os.path.join(directory, 'vectors'))
+        self.store.add_listener(self.vector_index.add_messages)
+        self.conversation_id = generate_conversation_id()
+        self.parser = Parser()
+
+    def add_student_message(self, text: str) -> str:
+        """
+        Save a student message.
+
+        Returns
+            The formatted conversation history the agents get with it
+        """
+        saved = self.store.append_messages(self.conversation_id, [{'role': 'user', 'content': text}])
+        history = select_history(self.store, self.vector_index, self.conversation_id, text, saved['start_seq'])
+        return self.parser.format_conversation_history(history)
+
+    def add_tutor_message(self, state: Dict[str, Any]):
+        """Save the tutor's final response from a workflow state"""
+        response = self.parser.extract_final_response(state)
+        self.store.append_messages(self.conversation_id, [{'role': 'tutor', 'content': response}])
+
+
+def run_script(orchestrator, turns: List[str]) -> List[float]:
+    """
+    Send each turn through the orchestration, like the app's send_message route.
+
+    Returns
+        Wall-clock seconds spent in run_workflow for every turn
+    """
+    timings = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        conversation = ScriptedConversation(directory)
+        for turn in turns:
+            context = conversation.add_student_message(turn)
+
+            start = time.perf_counter()
+            state = orchestrator.run_workflow(turn, context=context)
+            timings.append(time.perf_counter() - start)
+
+            conversation.add_tutor_message(state)
+
+    return timings
+
+
+def summarize(timings: List[float]) -> Dict[str, Any]:
+    """Summarize per-turn timings"""
+    summary = summarize_latencies(timings)
+    summary['total'] = sum(timings)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Replay a cassette through an orchestration and report timings')
+    parser.add_argument('cassette', help = 'cassette file to record into or replay from')
+    parser.add_argument('--script', required = True, help = 'text file with one student message per line')
+    parser.add_argument('--language', default = 'Python')
+    parser.add_argument('--mode', default = 'adaptive')
+    parser.add_argument('--orchestration', default = 'single', choices = ['single', 'multi-agent'])
+    parser.add_argument('--iterations', type = int, default = 1, help = 'number of times to run the script')
+    parser.add_argument('--latency-scale', type = float, default = 1.0,
+                        help = 'multiplier for recorded latency, 0 replays instantly')
+    parser.add_argument('--cycle', action = 'store_true',
+                        help = 'serve recorded responses in turn when a prompt was never recorded')
+    parser.add_argument('--record', action = 'store_true', help = 'record against a live Ollama server instead')
+    parser.add_argument('--model', default = 'llama3.2:3b')
+    parser.add_argument('--base-url', default = 'http://localhost:11434')
+    args = parser.parse_args()
+
+    with open(args.script, 'r') as f:
+        turns = [line.strip() for line in f if line.strip()]
+
+    if args.record:
+        from langchain_community.llms import Ollama
+        llm = RecordingLLM(llm = Ollama(model = args.model, base_url = args.base_url, temperature = 0.7),
+                           cassette = Cassette(args.cassette))
+    else:
+        llm = ReplayLLM(cassette_path = args.cassette, latency_scale = args.latency_scale,
+                        fallback = 'cycle' if args.cycle else 'error')
+
+    config = {
+        'language': args.language,
+        'mode': args.mode,
+        'orchestration_type': args.orchestration
+    }
+
+    timings = []
+    for _ in range(args.iterations):
+        #a fresh orchestration per iteration, as for a new session
+        orchestrator = build_orchestration(llm, config)
+        timings.extend(run_script(orchestrator, turns))
+
+    print(json.dumps({'config': config, 'latency_scale': args.latency_scale, 'timings': summarize(timings)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+"""Summary statistics shared by the benchmarking tools"""
+from typing import Dict, Any, List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize_latencies(values: List[float]) -> Dict[str, Any]:
+    """Count, mean, percentiles and max of a list of latencies in seconds"""
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else 0.0,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else 0.0
+    }
@@ -0,0 +1,55 @@
+"""
+Train the adaptive-mode intent router on logged conversations.
+
+Student messages from sessions that used a specialized mode (debug, examples,
+exercises, fundamentals or feedback) are labelled with that mode and used to
+fit the router's linear model. The app loads the saved model on start.
+
+    cd src
+    python -m tools.train_intent_router --output conversations/intent_router.npz
+"""
+import os
+import argparse
+
+from resources.conversation_store import ConversationStore
+from resources.archive import ConversationArchive, TieredConversationStore
+from resources.intent_router import IntentRouter, INTENTS
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Train the adaptive-mode intent router on logged turns')
+    parser.add_argument('--conversations-dir', default = os.environ.get('DDT_CONVERSATIONS_DIR', 'conversations'))
+    parser.add_argument('--backend', default = os.environ.get('DDT_STORE_BACKEND', 'sqlite'))
+    parser.add_argument('--output', default = os.path.join('conversations', 'intent_router.npz'))
+    parser.add_argument('--epochs', type = int, default = 300)
+    args = parser.parse_args()
+
+    store = ConversationStore.from_config({'backend': args.backend, 'directory': args.conversations_dir})
+    store = TieredConversationStore(store, ConversationArchive(os.path.join(args.conversations_dir, 'archive')))
+
+    texts, labels = [], []
+    for summary in store.list_conversations():
+        mode = summary['config'].get('mode')
+        if mode not in INTENTS:
+            continue
+        data = store.load(summary['id'])
+        for message in data['messages']:
+            if message.get('role') == 'user' and message.get('content', '').strip():
+                texts.append(message['content'])
+                labels.append(mode)
+
+    if not texts:
+        print('No logged turns from specialized modes found, nothing to train on')
+        return
+
+    router = IntentRouter()
+    result = router.train(texts, labels, epochs = args.epochs)
+    router.save(args.output)
+
+    counts = {intent: labels.count(intent) for intent in INTENTS}
+    print(f"Trained on {result['examples']} turns {counts}, training accuracy {result['accuracy']:.1%}")
+    print(f"Model saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()